@@ -363,6 +363,145 @@ int ai_run(ai_float *in_data, ai_float *out_data, float *data, int length)
   return 0; // success;
 }
 
+/* ---- UART image frame (see frame_codec.py) ---------------------------------
+ * header (14 bytes, little-endian):
+ *   magic[2] = A5 5A, fmt u8, flags u8, height u16, width u16,
+ *   length u16, crc32 u32 (payload, IEEE 802.3)
+ */
+#define FRAME_MAGIC0      0xA5
+#define FRAME_MAGIC1      0x5A
+#define FRAME_HEADER_SIZE 14
+#define FRAME_FMT_F32       0
+#define FRAME_FMT_U8        1
+#define FRAME_FMT_I8        2
+#define FRAME_FMT_RLE       3
+#define FRAME_FMT_DELTA_RLE 4
+#define FRAME_PIXELS      4096
+
+static uint8_t frame_rx[FRAME_PIXELS * 4];
+static uint8_t frame_pixels[FRAME_PIXELS];
+
+static uint32_t frame_crc32(const uint8_t *buf, uint32_t len)
+{
+  uint32_t crc = 0xFFFFFFFFu;
+  for (uint32_t i = 0; i < len; i++)
+  {
+    crc ^= buf[i];
+    for (int k = 0; k < 8; k++)
+    {
+      crc = (crc >> 1) ^ (0xEDB88320u & (0u - (crc & 1u)));
+    }
+  }
+  return ~crc;
+}
+
+static int frame_rle_decode(const uint8_t *src, uint32_t len, uint8_t *dst, uint32_t size)
+{
+  uint32_t n = 0;
+  if (len & 1u)
+  {
+    return -1;
+  }
+  for (uint32_t i = 0; i < len; i += 2)
+  {
+    uint32_t count = src[i];
+    if (count == 0 || n + count > size)
+    {
+      return -1;
+    }
+    memset(&dst[n], src[i + 1], count);
+    n += count;
+  }
+  return (n == size) ? 0 : -1;
+}
+
+/* Block until one valid frame arrives on huart, then expand it to float pixels.
+ * Returns 0 on success, -1 if the frame was rejected (bad size / CRC). */
+int receive_frame(UART_HandleTypeDef *huart, float *pixels)
+{
+  uint8_t header[FRAME_HEADER_SIZE];
+  uint8_t byte = 0;
+
+  /* resync on the magic word so a dropped byte only costs one frame */
+  __HAL_UART_CLEAR_OREFLAG(huart);
+  do
+  {
+    header[0] = byte;
+    HAL_UART_Receive(huart, &byte, 1, HAL_MAX_DELAY);
+  } while (header[0] != FRAME_MAGIC0 || byte != FRAME_MAGIC1);
+  header[1] = byte;
+  HAL_UART_Receive(huart, &header[2], FRAME_HEADER_SIZE - 2, HAL_MAX_DELAY);
+
+  uint8_t fmt = header[2];
+  uint16_t height = header[4] | (header[5] << 8);
+  uint16_t width = header[6] | (header[7] << 8);
+  uint16_t length = header[8] | (header[9] << 8);
+  uint32_t crc = header[10] | (header[11] << 8) | (header[12] << 16) | ((uint32_t)header[13] << 24);
+
+  if ((uint32_t)height * width != FRAME_PIXELS || length > sizeof(frame_rx))
+  {
+    return -1;
+  }
+  if (HAL_UART_Receive(huart, frame_rx, length, 5000) != HAL_OK)
+  {
+    return -1;
+  }
+  if (frame_crc32(frame_rx, length) != crc)
+  {
+    return -1;
+  }
+
+  switch (fmt)
+  {
+  case FRAME_FMT_F32:
+    if (length != FRAME_PIXELS * 4)
+    {
+      return -1;
+    }
+    memcpy(pixels, frame_rx, FRAME_PIXELS * 4);
+    return 0;
+  case FRAME_FMT_U8:
+  case FRAME_FMT_I8:
+    if (length != FRAME_PIXELS)
+    {
+      return -1;
+    }
+    for (int i = 0; i < FRAME_PIXELS; i++)
+    {
+      /* int8 uses zero point 128: flipping the top bit restores uint8 */
+      pixels[i] = (float)(fmt == FRAME_FMT_I8 ? (frame_rx[i] ^ 0x80u) : frame_rx[i]);
+    }
+    return 0;
+  case FRAME_FMT_RLE:
+  case FRAME_FMT_DELTA_RLE:
+    if (frame_rle_decode(frame_rx, length, frame_pixels, FRAME_PIXELS) != 0)
+    {
+      return -1;
+    }
+    for (int y = 0; y < height; y++)
+    {
+      uint8_t acc = 0;
+      for (int x = 0; x < width; x++)
+      {
+        uint8_t v = frame_pixels[y * width + x];
+        /* delta rows restart at the first pixel of every row (mod 256) */
+        if (fmt == FRAME_FMT_DELTA_RLE && x > 0)
+        {
+          acc = (uint8_t)(acc + v);
+        }
+        else
+        {
+          acc = v;
+        }
+        pixels[y * width + x] = (float)acc;
+      }
+    }
+    return 0;
+  default:
+    return -1;
+  }
+}
+
 /* USER CODE END PD */
 
 /* Private macro -------------------------------------------------------------*/
@@ -500,10 +639,12 @@ int main(void)
     /* USER CODE END WHILE */
 
     /* USER CODE BEGIN 3 */
-	 HAL_UART_Receive(&huart4, data, 4096*4, HAL_MAX_DELAY);
+	 if (receive_frame(&huart4, data) != 0)
+	 {
+	   continue;
+	 }
 	 ai_run(in_data, out_data, data, AI_NETWORK_IN_1_SIZE);
 	 printf("%.6f,%.6f,%.6f\r\n",out_data[0],out_data[1],out_data[2]);
-	 HAL_Delay(1000);
   }
   /* USER CODE END 3 */
 }
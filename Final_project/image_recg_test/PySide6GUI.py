@@ -1,14 +1,194 @@
+import argparse
+import collections
 import sys
 import random
 import socket, threading, queue
 import time
 import re
+from collections import namedtuple
 from PySide6 import QtCore, QtWidgets
 
 from PySide6.QtCore import Qt, QRunnable, QThreadPool, QTimer, Slot, QRect, Signal, QObject, QIODevice
 from PySide6.QtSerialPort import QSerialPort, QSerialPortInfo
 from PySide6.QtGui import QAction, QFont
-from PySide6.QtWidgets import QApplication, QMainWindow, QMenu, QFrame, QWidget, QTextEdit
+from PySide6.QtWidgets import QApplication, QMainWindow, QMenu, QFrame, QWidget, QTextEdit, QPlainTextEdit
+
+from elevator_commands import CommandQueue, DOOR_COMMAND, FLOOR_COMMANDS
+from gesture_decision import DecisionEngine, LineClock, add_decision_args, engine_from_args
+
+LOG_LINES = 500          # the log view keeps only the most recent lines
+BATCH_INTERVAL = 0.05    # the serial worker hands lines to the GUI at most every 50 ms
+
+# One parsed serial line; probs is (a, b, c) and command the per-line argmax 'K' / 'L' / 'O', both None
+# for invalid lines. decision is set only on the line where the decision engine commits a new gesture.
+SerialLine = namedtuple("SerialLine", "t text probs command decision")
+
+
+def extract_command(text):
+    """'a,b,c' probabilities -> ((a, b, c), command); (None, None) if the line is not valid."""
+    try:
+        a, b, c = map(float, text.strip().split(','))
+    except ValueError:
+        return None, None
+
+    if a>= b and a>=c:
+        command = 'K'
+    elif b>=c:
+        command = 'L'
+    else:
+        command = 'O'
+
+    return (a, b, c), command
+
+
+class WorkerSignals(QObject):
+    batch = Signal(list)      # [SerialLine, ...]
+    status = Signal(bool, str)
+    finished = Signal()
+
+
+class SerialWorker(QRunnable):
+    """Reads and parses serial lines on a thread-pool thread.
+
+    Lines are collected into batches and sent to the GUI thread at most every BATCH_INTERVAL,
+    so the GUI handles a few signals per second no matter how fast the STM32 sends.
+    simulate > 0 generates random probability lines at that rate instead of opening the port.
+    Every valid line goes through the decision engine here, so smoothing sees all lines even
+    when the GUI is busy. Lines that arrive in one read are spread over the estimated line
+    period (LineClock) before they reach the engine, so a burst still counts toward dwell.
+    """
+
+    def __init__(self, port, baud=115200, simulate=0.0, broker=None, engine=None):
+        super().__init__()
+        self.port = port
+        self.baud = baud
+        self.simulate = simulate
+        self.broker = broker
+        self.engine = engine if engine is not None else DecisionEngine()
+        self.clock = LineClock()
+        self.signals = WorkerSignals()
+        self.running = True
+        self.lines = 0
+
+    @Slot()
+    def run(self):
+        try:
+            if self.simulate:
+                self.run_simulated()
+            elif self.broker:
+                self.run_broker()
+            else:
+                self.run_serial()
+        finally:
+            self.signals.finished.emit()
+
+    def run_serial(self):
+        # The port object has to be created in the thread that reads it
+        serial = QSerialPort()
+        serial.setPortName(self.port)
+        serial.setBaudRate(self.baud)
+        serial.setDataBits(QSerialPort.Data8)
+        serial.setParity(QSerialPort.NoParity)
+        serial.setStopBits(QSerialPort.OneStop)
+        serial.setFlowControl(QSerialPort.NoFlowControl)
+
+        if not serial.open(QIODevice.ReadWrite):
+            self.signals.status.emit(False, f"--- Error: {serial.errorString()} ---")
+            return
+        self.signals.status.emit(True, "--- Port Opened Successfully ---")
+
+        pending = []
+        last_emit = time.perf_counter()
+        while self.running:
+            # Blocks this worker thread only; returns False after 20 ms without data
+            if serial.waitForReadyRead(20):
+                lines = []
+                while serial.canReadLine():
+                    lines.append(serial.readLine().data())
+                self.parse(lines, pending)
+            elif serial.error() == QSerialPort.ResourceError:
+                self.signals.status.emit(False, f"--- Error: {serial.errorString()} ---")
+                break
+            last_emit = self.flush(pending, last_emit)
+        self.flush(pending, 0.0)
+        serial.close()
+
+    def run_broker(self):
+        # serial_broker.py owns the port and forwards each line; other tools can read it at the same time
+        from serial import SerialException
+        from serial_broker import BrokerClient
+        try:
+            client = BrokerClient(self.broker, timeout=0.02)
+        except OSError as e:
+            self.signals.status.emit(False, f"--- Error: broker {self.broker}: {e} ---")
+            return
+        self.signals.status.emit(True, f"--- Connected to broker {self.broker} ---")
+
+        pending = []
+        last_emit = time.perf_counter()
+        try:
+            while self.running:
+                try:
+                    # Waits at most 20 ms; returns only complete lines
+                    lines = client.read_lines()
+                except SerialException:
+                    self.signals.status.emit(False, "--- Broker closed the connection ---")
+                    break
+                except OSError as e:
+                    self.signals.status.emit(False, f"--- Error: {e} ---")
+                    break
+                if lines:
+                    self.parse(lines, pending)
+                last_emit = self.flush(pending, last_emit)
+        finally:
+            client.close()
+        self.flush(pending, 0.0)
+
+    def run_simulated(self):
+        self.signals.status.emit(True, f"--- Simulating {self.simulate:g} lines/s ---")
+        rng = random.Random(0)
+        period = 1.0 / self.simulate
+        pending = []
+        t_next = last_emit = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            lines = []
+            while t_next <= now:
+                # the held gesture changes every 2 s, like a hand in front of the camera
+                p = [rng.random() for _ in range(3)]
+                p[int(t_next / 2.0) % 3] += 2.0
+                total = sum(p)
+                lines.append(b"%.6f,%.6f,%.6f\r\n" % tuple(v / total for v in p))
+                t_next += period
+            self.parse(lines, pending)
+            last_emit = self.flush(pending, last_emit)
+            time.sleep(0.005)
+
+    def parse(self, lines, pending):
+        # All lines from one read get spaced-out times ending at the arrival time
+        arrival = time.perf_counter()
+        parsed = []
+        for data in lines:
+            text = bytes(data).decode('utf-8', errors='replace').strip()
+            if text:
+                parsed.append((text, *extract_command(text)))
+        stamps = iter(self.clock.stamps(sum(probs is not None for _, probs, _ in parsed), arrival))
+        for text, probs, command in parsed:
+            t = next(stamps) if probs is not None else arrival
+            decision = self.engine.update(probs, t) if probs is not None else None
+            pending.append(SerialLine(t, text, probs, command, decision))
+            self.lines += 1
+
+    def flush(self, pending, last_emit):
+        now = time.perf_counter()
+        if pending and now - last_emit >= BATCH_INTERVAL:
+            self.signals.batch.emit(pending[:])
+            pending.clear()
+            return now
+        return last_emit
+
+    def stop(self):
+        self.running = False
 
 
 class MyWidget(QtWidgets.QWidget):
@@ -23,8 +203,10 @@ class MyWidget(QtWidgets.QWidget):
         self.command_list = QtWidgets.QLabel("Next Command Coming Up: ", alignment=QtCore.Qt.AlignCenter)
         self.command_list.setFont(QFont("Arial", 20))
         self.command_list.hide()
-        self.display = QTextEdit()
+        # Plain-text log capped at LOG_LINES: the oldest lines are dropped as new batches arrive
+        self.display = QPlainTextEdit()
         self.display.setReadOnly(True)
+        self.display.setMaximumBlockCount(LOG_LINES)
         self.display.setFixedWidth(400)
         self.display.hide()
 
@@ -61,6 +243,16 @@ class MyWidget(QtWidgets.QWidget):
         self.current_floor = 1
         self.target_y = self.FLOOR_POSITIONS[self.current_floor]
 
+        # --- Command pipeline ---
+        # Every recognized line becomes a command in a bounded, coalescing queue.
+        # The elevator runs one command at a time: idle -> moving / door_open -> door_closing -> idle,
+        # and only takes the next command when it is idle again.
+        self.commands = CommandQueue()
+        self.state = "idle"
+        self.active_command = None
+        self.lines_received = 0
+        self.invalid_lines = 0
+
         # --- GUI Setup ---
         central_widget = QWidget()
         
@@ -85,6 +277,10 @@ class MyWidget(QtWidgets.QWidget):
         self.status_label = QtWidgets.QLabel(f"Current Floor: {self.current_floor}")
         self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.status_label.setFont(QFont("Arial", 20))
+
+        self.counter_label = QtWidgets.QLabel()
+        self.counter_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.update_counters()
         
         self.move_button = QtWidgets.QPushButton("Move Up to Floor 3")
         self.move_button.clicked.connect(self.request_move)
@@ -95,11 +291,21 @@ class MyWidget(QtWidgets.QWidget):
         self.move_timer.setInterval(self.TIMER_INTERVAL)
         self.move_timer.timeout.connect(self.update_elevator_position)
 
-        # 1. Setup the Serial Port object
-        self.serial = QSerialPort()
-        
-        # Important: Connect the readyRead signal to our handler
-        self.serial.readyRead.connect(self.receive_data)
+        # 1. Serial reading and parsing run in a SerialWorker on this pool, not on the GUI thread
+        self.threadpool = QThreadPool()
+        self.worker = None
+
+        # --- Frame-time metric ---
+        # A timer at the animation interval records how late the GUI thread runs it;
+        # if serial traffic blocked the GUI, the cab animation would stutter by the same amount.
+        self.frame_times = collections.deque(maxlen=200)
+        self.last_frame = None
+        self.frames = 0
+        self.frame_label = QtWidgets.QLabel(alignment=QtCore.Qt.AlignCenter)
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setInterval(self.TIMER_INTERVAL)
+        self.frame_timer.timeout.connect(self.measure_frame)
+        self.frame_timer.start()
 
         ################################################
         self.layout = QtWidgets.QVBoxLayout(self)
@@ -111,6 +317,8 @@ class MyWidget(QtWidgets.QWidget):
         self.status_and_command_layout = QtWidgets.QVBoxLayout()
         self.status_and_command_layout.addStretch(1)
         self.status_and_command_layout.addWidget(self.status_label)
+        self.status_and_command_layout.addWidget(self.counter_label)
+        self.status_and_command_layout.addWidget(self.frame_label)
         self.status_and_command_layout.addStretch(1)
         self.status_and_command_layout.addWidget(self.command_list)
         self.status_and_command_layout.addWidget(self.display)
@@ -163,37 +371,45 @@ class MyWidget(QtWidgets.QWidget):
         app.processEvents()  # forces the GUI to update
 
 
-    def extract_command(self, text):
-        try:
-            a, b, c = map(float, text.strip().split(','))
-        except ValueError:
-            self.text.setText("Invalid data")
-            return None
-
-        print(a, b, c)
-
-        # Example usage
-
-        command = ""
-        if a>= b and a>=c:
-            command = 'K'
-        elif b>=c:
-            command = 'L'
-        else:
-            command = 'O'
-    
-        print(command)
-
-        return command
-    
     @Slot(int) # Expects the integer interval from the signal
     def start_main_timer_safely(self, interval):
         """Safely starts the QTimer on the main GUI thread."""
         self.move_timer.setInterval(interval)
         self.move_timer.start()
 
-    def move(self, command):
+    def current_command(self):
+        """The command the elevator is executing, or the one matching where it rests when idle."""
+        if self.active_command is not None:
+            return self.active_command
+        return next(c for c, floor in FLOOR_COMMANDS.items() if floor == self.current_floor)
+
+    def queue_command(self, command):
+        self.commands.push(command, self.current_command())
+        self.process_next_command()
+
+    def process_next_command(self):
+        """Start the next queued command if the elevator is idle."""
+        if self.state == "idle":
+            command = self.commands.pop()
+            if command is not None:
+                self.move(command)
+        self.update_counters()
+
+    def command_finished(self):
+        self.state = "idle"
+        self.active_command = None
+        self.process_next_command()
+
+    def update_counters(self):
+        q = self.commands
+        self.counter_label.setText(
+            f"Lines: {self.lines_received} (invalid {self.invalid_lines})\n"
+            f"Commands: {q.received}  coalesced {q.coalesced}  dropped {q.dropped}  "
+            f"executed {q.executed}  queued {len(q)}")
 
+    def move(self, command):
+        """Execute one command; called by process_next_command only when the elevator is idle."""
+        self.active_command = command
         next_floor = self.current_floor
 
         # K = move to the 3rd floor
@@ -207,14 +423,13 @@ class MyWidget(QtWidgets.QWidget):
             self.status_label.setText(f"Moving to Floor: {next_floor}")
 
         # O = open the door
-        elif command == 'O':
+        elif command == DOOR_COMMAND:
+            self.state = "door_open"
             self.open_door_sequence()
             # We return here because the sequence will handle re-enabling the button
             return
 
-        elif command == '\0':
-            pass
-            
+        self.state = "moving"
         self.target_y = self.FLOOR_POSITIONS[next_floor]
         self.current_floor = next_floor
 
@@ -225,65 +440,71 @@ class MyWidget(QtWidgets.QWidget):
 
 
     def ConnectPort(self):
-        # 2. Configure Port Settings
-        # Replace 'COM3' or '/dev/ttyACM0' with your STM32's port
-        self.serial.setPortName("COM6") 
-        self.serial.setBaudRate(QSerialPort.Baud115200)
-        self.serial.setDataBits(QSerialPort.Data8)
-        self.serial.setParity(QSerialPort.NoParity)
-        self.serial.setStopBits(QSerialPort.OneStop)
-        self.serial.setFlowControl(QSerialPort.NoFlowControl)
-
-        if self.serial.open(QIODevice.ReadWrite):
-            self.display.append("--- Port Opened Successfully ---\n")
-            self.text_message.setText("Connected")
-            print("serial port connected")
-        else:
-            self.display.append(f"--- Error: {self.serial.errorString()} ---")
-            self.text_message.setText("Error")
-
-        app.processEvents()  # forces the GUI to update
-
-    def receive_data(self):
-        # 3. Read the data
-        # readAll() returns a QByteArray
-        message=""
-        while self.serial.canReadLine():
-            data = self.serial.readLine()
-            print("data received")
-        
-            # Convert bytes to string (handling potential decoding errors)
-            message = data.data().decode('utf-8').strip('\n')
-        
-            # Display the message
-            self.display.insertPlainText(message)
-        
-             # Auto-scroll to bottom
-        self.display.ensureCursorVisible()
-
-        command = self.extract_command(message)
-        self.move(command)
+        # 2. Start the serial worker; it reports back through signals (queued to the GUI thread)
+        # Replace 'COM6' or '/dev/ttyACM0' with your STM32's port (--port)
+        self.worker = SerialWorker(args.port, args.baud, args.simulate, args.broker,
+                                   engine_from_args(args))
+        self.worker.signals.batch.connect(self.receive_data)
+        self.worker.signals.status.connect(self.serial_status)
+        self.worker.signals.finished.connect(self.serial_finished)
+        self.threadpool.start(self.worker)
+
+    @Slot(bool, str)
+    def serial_status(self, ok, message):
+        self.display.appendPlainText(message)
+        self.text_message.setText("Connected" if ok else "Error")
+        print(message)
+
+    @Slot()
+    def serial_finished(self):
+        self.worker = None
+        self.button_2.setEnabled(True)
+        self.button_2.setText("Connect to serial port")
+
+    @Slot(list)
+    def receive_data(self, batch):
+        # 3. A batch of parsed lines from the worker
+        # Every committed decision is queued as a command, not only the last one;
+        # the log gets one append per batch.
+        self.lines_received += len(batch)
+        self.display.appendPlainText("\n".join(line.text for line in batch[-LOG_LINES:]))
+
+        for line in batch:
+            if line.probs is None:
+                self.invalid_lines += 1
+                self.text.setText("Invalid data")
+            elif line.decision is not None:
+                self.commands.push(line.decision, self.current_command())
+
+        self.process_next_command()
+
+    def measure_frame(self):
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.frame_times.append(now - self.last_frame)
+        self.last_frame = now
+        self.frames += 1
+        if self.frames % 20 == 0:
+            times = sorted(self.frame_times)
+            avg = sum(times) / len(times)
+            p99 = times[min(int(len(times) * 0.99), len(times) - 1)]
+            self.frame_label.setText(
+                f"GUI frame: avg {avg * 1e3:.1f} ms  p99 {p99 * 1e3:.1f} ms  max {times[-1] * 1e3:.1f} ms"
+                f"  (target {self.TIMER_INTERVAL} ms)")
+
+    def closeEvent(self, event):
+        if self.worker is not None:
+            self.worker.stop()
+        self.threadpool.waitForDone(1000)
+        super().closeEvent(event)
     
     def request_move(self):
-        """Determines the next target floor and starts the timer."""
+        """Determines the next target floor and queues the move like a received command."""
         # Simple logic: Toggle between Floor 1 and Floor 3
-        if self.current_floor == 1:
-            next_floor = 3
-        else:
-            next_floor = 1
-            
-        self.target_y = self.FLOOR_POSITIONS[next_floor]
-        self.current_floor = next_floor
-        
-        self.status_label.setText(f"Moving to Floor: {self.current_floor}")
-        self.move_button.setDisabled(True)
-        
-        # Start the movement timer
-        self.move_timer.start()
+        self.queue_command('K' if self.current_floor == 1 else 'L')
 
     def request_move2(self):
-        command = 'O'
-        self.move(command)
+        self.queue_command(DOOR_COMMAND)
     
     def update_elevator_position(self):
         """Called by QTimer to move the elevator cab one step."""
@@ -295,6 +516,7 @@ class MyWidget(QtWidgets.QWidget):
             self.status_label.setText(f"Arrived at Floor: {self.current_floor}")
             self.move_button.setText(f"Move {'Down' if self.current_floor == 3 else 'Up'} to Floor {'1' if self.current_floor == 3 else '3'}")
             self.move_button.setDisabled(False)
+            self.command_finished()
             return
             
         # Determine direction and step size
@@ -330,6 +552,7 @@ class MyWidget(QtWidgets.QWidget):
         """
         Step 2: Start the Door Closing phase.
         """
+        self.state = "door_closing"
         self.status_label.setText("Door Closing")
         
         # Use QTimer.singleShot to schedule the final step (finish_door_sequence) 
@@ -341,11 +564,23 @@ class MyWidget(QtWidgets.QWidget):
         """
         self.status_label.setText(f"Currently at Floor: {self.current_floor}")
         self.move_button.setDisabled(False) # Re-enable the button
+        self.command_finished()
+
+
 
 
+parser = argparse.ArgumentParser(description="Elevator GUI driven by STM32 gesture results")
+parser.add_argument("--port", default="COM6", help="serial port of the STM32 (e.g. /dev/ttyACM0)")
+parser.add_argument("--baud", type=int, default=115200)
+parser.add_argument("--broker", nargs="?", const="127.0.0.1:8765", metavar="HOST:PORT",
+                    help="read from serial_broker.py instead of opening the port")
+parser.add_argument("--simulate", type=float, default=0.0, metavar="RATE",
+                    help="generate RATE random probability lines/s instead of opening the port")
+add_decision_args(parser)
 
 
 if __name__ == "__main__":
+    args = parser.parse_args()
     app = QtWidgets.QApplication([])
     widget = MyWidget()
     widget.resize(800, 600)
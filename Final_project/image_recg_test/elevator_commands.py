@@ -0,0 +1,95 @@
+from collections import deque
+
+# ===================================================
+# 電梯指令佇列：STM32 連續送出辨識結果時的合併 / 上限策略
+# ===================================================
+#
+# 指令：K = 到 3 樓，L = 到 1 樓，O = 開門
+#   - 跟前一個指令相同就合併 (連續好幾幀都是同一個手勢)；
+#     「前一個」是佇列最後一筆，佇列空的時候是電梯正在執行 / 已經停好的狀態
+#   - 樓層指令只保留最新的目標：佇列裡還沒執行的樓層指令直接換成新的 (位置不變，
+#     所以「先到某樓再開門」的順序不會亂)
+#   - 佇列滿了丟掉最舊的一筆
+# 電梯本身 (PySide6GUI.py) 一次只執行一個指令，做完才從佇列取下一個。
+
+FLOOR_COMMANDS = {"K": 3, "L": 1}
+DOOR_COMMAND = "O"
+COMMANDS = ("K", "L", "O")
+
+
+class CommandQueue:
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.items = deque()
+        self.received = 0         # push 的次數
+        self.coalesced = 0        # 被合併 / 取代掉的
+        self.dropped = 0          # 佇列滿被丟掉的
+        self.executed = 0         # pop 出去執行的
+
+    def __len__(self):
+        return len(self.items)
+
+    def push(self, command, current=None):
+        """current：電梯正在執行的指令，閒置時是代表目前樓層的指令 (例如停在 3 樓就是 "K")
+
+        回傳 True 表示佇列多了一筆。
+        """
+        if command not in COMMANDS:
+            raise ValueError(f"未知的指令: {command!r}")
+        self.received += 1
+        if command == (self.items[-1] if self.items else current):
+            self.coalesced += 1
+            return False
+        if command in FLOOR_COMMANDS:
+            for i, queued in enumerate(self.items):
+                if queued not in FLOOR_COMMANDS:
+                    continue
+                self.coalesced += 1
+                before = self.items[i - 1] if i else current
+                if before == command:
+                    del self.items[i]          # 換掉之後跟前一個一樣，等於不用動
+                else:
+                    self.items[i] = command
+                return False
+        if len(self.items) >= self.maxsize:
+            self.items.popleft()
+            self.dropped += 1
+        self.items.append(command)
+        return True
+
+    def pop(self):
+        """取出下一個要執行的指令；沒有回傳 None"""
+        if not self.items:
+            return None
+        self.executed += 1
+        return self.items.popleft()
+
+    def clear(self):
+        self.items.clear()
+
+    def __str__(self):
+        return (f"received {self.received}  coalesced {self.coalesced}  dropped {self.dropped}  "
+                f"executed {self.executed}  queued {len(self.items)}")
+
+
+if __name__ == "__main__":
+    # 自我檢查：停在 1 樓時來了一段突發的辨識結果
+    q = CommandQueue()
+    for c in "KKKK":
+        q.push(c, current="L")
+    assert list(q.items) == ["K"] and q.coalesced == 3      # 重複的 K 合併
+    q.push("O", current="L")
+    q.push("L", current="L")
+    assert list(q.items) == ["O"], q.items                  # 最新目標是 1 樓 = 不用動
+    q.push("K", current="L")
+    q.push("O", current="L")
+    q.push("L", current="L")
+    assert list(q.items) == ["O", "L", "O"], q.items        # 取代 K，位置不變
+    assert q.pop() == "O" and q.executed == 1
+
+    # 合併之後佇列最多是「開門、樓層、開門」三筆；上限比 3 小才會丟
+    small = CommandQueue(maxsize=2)
+    for c in "OKO":
+        small.push(c, current="L")
+    assert list(small.items) == ["K", "O"] and small.dropped == 1
+    print(f"ok  {q}")
@@ -0,0 +1,222 @@
+import struct
+import zlib
+import numpy as np
+
+# ===================================================
+# 64x64 影像 UART 封包格式
+# ===================================================
+#
+# Header (14 bytes, little-endian):
+#   magic   : 2 bytes  0xA5 0x5A
+#   fmt     : 1 byte   payload 格式 (見下方 FMT_*)
+#   flags   : 1 byte   保留，目前為 0
+#   height  : uint16
+#   width   : uint16
+#   length  : uint16   payload 長度 (bytes)
+#   crc32   : uint32   payload 的 CRC32 (zlib / IEEE 802.3)
+#
+# STM32 端依 fmt 解回 uint8 像素，再展開成模型輸入 f32(1x64x64x1)。
+
+MAGIC = b"\xA5\x5A"
+HEADER_FMT = "<2sBBHHHI"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+
+FMT_F32 = 0         # 舊格式：float32 像素 (16384 bytes)
+FMT_U8 = 1          # 原始 uint8 像素 (4096 bytes)
+FMT_I8 = 2          # int8 量化：q = pixel - 128 (zero point 128, scale 1，無損)
+FMT_RLE = 3         # uint8 像素的 (count, value) run-length 編碼
+FMT_DELTA_RLE = 4   # 逐列差分 (mod 256) 後再做 run-length 編碼
+FMT_AUTO = 255      # 僅供編碼端使用：自動挑選最小的無損格式
+
+FORMAT_NAMES = {
+    FMT_F32: "f32",
+    FMT_U8: "u8",
+    FMT_I8: "i8",
+    FMT_RLE: "rle",
+    FMT_DELTA_RLE: "delta-rle",
+    FMT_AUTO: "auto",
+}
+FORMAT_IDS = {name: fmt for fmt, name in FORMAT_NAMES.items()}
+
+
+class FrameError(ValueError):
+    """封包格式錯誤 (magic / 長度 / CRC 不符)"""
+
+
+# ---------------------------------------------------
+# Run-length / 差分 編碼
+# ---------------------------------------------------
+
+def rle_encode(data):
+    """將 uint8 陣列編成 (count, value) 配對，count 範圍 1..255"""
+    flat = np.ascontiguousarray(data, dtype=np.uint8).ravel()
+    if flat.size == 0:
+        return b""
+
+    # 找出數值改變的位置，切成一段一段的 run
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    starts = np.concatenate(([0], change))
+    lengths = np.diff(np.concatenate((starts, [flat.size])))
+    values = flat[starts]
+
+    # 超過 255 的 run 拆成多段
+    pieces = (lengths + 254) // 255
+    counts = np.full(int(pieces.sum()), 255, dtype=np.uint8)
+    last = np.cumsum(pieces) - 1
+    counts[last] = lengths - (pieces - 1) * 255
+
+    out = np.empty(counts.size * 2, dtype=np.uint8)
+    out[0::2] = counts
+    out[1::2] = np.repeat(values, pieces)
+    return out.tobytes()
+
+
+def rle_decode(payload, size):
+    """rle_encode 的反運算，回傳長度為 size 的 uint8 陣列"""
+    buf = np.frombuffer(payload, dtype=np.uint8)
+    if buf.size % 2:
+        raise FrameError("RLE payload 長度必須為偶數")
+    counts = buf[0::2].astype(np.intp)
+    if counts.sum() != size or (counts == 0).any():
+        raise FrameError("RLE 展開後長度不符")
+    return np.repeat(buf[1::2], counts)
+
+
+def delta_encode(img):
+    """逐列差分：每列第一個像素保留原值，其餘存與左邊像素的差 (mod 256)"""
+    img = np.ascontiguousarray(img, dtype=np.uint8)
+    out = img.copy()
+    out[:, 1:] = img[:, 1:] - img[:, :-1]
+    return out
+
+
+def delta_decode(deltas):
+    """delta_encode 的反運算 (uint8 累加本身就是 mod 256)"""
+    return np.cumsum(deltas, axis=1, dtype=np.uint8)
+
+
+# ---------------------------------------------------
+# 編碼 / 解碼
+# ---------------------------------------------------
+
+def _encode_payload(img, fmt):
+    if fmt == FMT_F32:
+        return img.astype(np.float32).tobytes()
+    if fmt == FMT_U8:
+        return img.tobytes()
+    if fmt == FMT_I8:
+        return (img.astype(np.int16) - 128).astype(np.int8).tobytes()
+    if fmt == FMT_RLE:
+        return rle_encode(img)
+    if fmt == FMT_DELTA_RLE:
+        return rle_encode(delta_encode(img))
+    raise ValueError(f"未知的格式: {fmt}")
+
+
+def encode_frame(img, fmt=FMT_U8):
+    """將 HxW uint8 灰階影像包成 [header + payload]"""
+    img = np.ascontiguousarray(img, dtype=np.uint8)
+    if img.ndim != 2:
+        raise ValueError("encode_frame 只接受 2D 灰階影像")
+
+    if fmt == FMT_AUTO:
+        # 壓縮失敗 (比原始還大) 時退回 U8
+        candidates = [(FMT_U8, img.tobytes())]
+        for f in (FMT_RLE, FMT_DELTA_RLE):
+            candidates.append((f, _encode_payload(img, f)))
+        fmt, payload = min(candidates, key=lambda c: len(c[1]))
+    else:
+        payload = _encode_payload(img, fmt)
+
+    if len(payload) > 0xFFFF:
+        raise ValueError("payload 超過 65535 bytes")
+
+    h, w = img.shape
+    header = struct.pack(HEADER_FMT, MAGIC, fmt, 0, h, w, len(payload),
+                         zlib.crc32(payload) & 0xFFFFFFFF)
+    return header + payload
+
+
+def parse_header(header):
+    """解析 header，回傳 (fmt, height, width, length, crc32)"""
+    if len(header) < HEADER_SIZE:
+        raise FrameError("header 長度不足")
+    magic, fmt, _flags, h, w, length, crc = struct.unpack_from(HEADER_FMT, header)
+    if magic != MAGIC:
+        raise FrameError("magic 不符")
+    if fmt not in FORMAT_NAMES or fmt == FMT_AUTO:
+        raise FrameError(f"未知的格式: {fmt}")
+    return fmt, h, w, length, crc
+
+
+def decode_frame(frame):
+    """解回 HxW uint8 影像，回傳 (img, fmt)"""
+    fmt, h, w, length, crc = parse_header(frame)
+    payload = bytes(frame[HEADER_SIZE:HEADER_SIZE + length])
+    if len(payload) != length:
+        raise FrameError("payload 長度不足")
+    if zlib.crc32(payload) & 0xFFFFFFFF != crc:
+        raise FrameError("CRC 錯誤")
+
+    n = h * w
+    if fmt == FMT_F32:
+        if length != n * 4:
+            raise FrameError("F32 payload 長度不符")
+        img = np.frombuffer(payload, dtype=np.float32).clip(0, 255).astype(np.uint8)
+    elif fmt in (FMT_U8, FMT_I8):
+        if length != n:
+            raise FrameError("payload 長度不符")
+        img = np.frombuffer(payload, dtype=np.uint8)
+        if fmt == FMT_I8:
+            img = img ^ 0x80   # int8 + 128 == 翻轉最高位元
+    elif fmt == FMT_RLE:
+        img = rle_decode(payload, n)
+    else:
+        img = delta_decode(rle_decode(payload, n).reshape(h, w))
+    return img.reshape(h, w), fmt
+
+
+def to_model_input(img):
+    """展開成 X-CUBE-AI 模型輸入 f32(1x64x64x1)，與 STM32 端相同"""
+    h, w = img.shape
+    return img.astype(np.float32).reshape(1, h, w, 1)
+
+
+def link_time(n_bytes, baud=115200):
+    """8N1 下傳送 n_bytes 需要的秒數"""
+    return n_bytes * 10 / baud
+
+
+# ===================================================
+# 自我檢查：各格式來回編解碼 + 傳輸時間比較
+# ===================================================
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+
+    # 模擬 resize_and_pad_gray 的輸出：中間是手，左右補黑邊
+    sample = np.zeros((64, 64), dtype=np.uint8)
+    yy, xx = np.mgrid[0:64, 0:44]
+    sample[:, 10:54] = (120 + 60 * np.sin(xx / 7.0) * np.cos(yy / 9.0)).astype(np.uint8)
+    noisy = rng.integers(0, 256, size=(64, 64), dtype=np.uint8)
+
+    base = link_time(HEADER_SIZE + 64 * 64 * 4)
+    for name, img in (("padded hand", sample), ("random noise", noisy)):
+        print(f"--- {name} ---")
+        for fmt in (FMT_F32, FMT_U8, FMT_I8, FMT_RLE, FMT_DELTA_RLE, FMT_AUTO):
+            frame = encode_frame(img, fmt)
+            out, used = decode_frame(frame)
+            assert np.array_equal(out, img), FORMAT_NAMES[fmt]
+            t = link_time(len(frame))
+            print(f"{FORMAT_NAMES[fmt]:>9} -> {FORMAT_NAMES[used]:>9}: "
+                  f"{len(frame):6d} bytes, {t * 1000:7.1f} ms @115200 ({base / t:4.1f}x)")
+
+    # CRC 必須擋下單一位元錯誤
+    bad = bytearray(encode_frame(sample, FMT_U8))
+    bad[HEADER_SIZE + 100] ^= 0x01
+    try:
+        decode_frame(bytes(bad))
+    except FrameError:
+        print("✅ CRC 檢查正常")
+    else:
+        raise AssertionError("CRC 未偵測到錯誤")
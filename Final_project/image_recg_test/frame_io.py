@@ -0,0 +1,349 @@
+import glob
+import os
+import select
+import threading
+import time
+
+import cv2
+
+import frame_codec
+
+# ===================================================
+# 影像來源 (source) 與 UART 輸出端 (sink)
+# ===================================================
+#
+# source.read() 一律回傳 RGB (HxWx3, uint8)，來源結束時回傳 None。
+# sink.write(data) / sink.flush() 與 serial.Serial 相同，可直接取代 ser；
+# serial 與 pty 也支援 read(n)，可以跑 common/uart_link.py 的 ACK/重傳協定。
+#
+#   --source picamera2          RPi 相機 (預設)
+#   --source clip.mp4           影片檔
+#   --source frames/            圖片資料夾 (依檔名排序)
+#
+#   --sink /dev/serial0         實體 UART (預設)
+#   --sink pty                  建立虛擬序列埠，印出 slave 路徑給接收端連線
+#   --sink loopback             pty 並在內部把資料讀掉 (只量吞吐量)
+#   --sink file:frames.bin      寫進檔案
+#   --sink none                 丟掉資料
+#   --sink local[:results.txt]  不送出，直接在本機用 gesture_cnn.py 分類 (可把機率行寫進檔案)
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+# ---------------------------------------------------
+# Sources
+# ---------------------------------------------------
+
+class Picamera2Source:
+    def __init__(self, width, height, fps):
+        from picamera2 import Picamera2   # 只有真的用相機時才需要
+
+        self.picam2 = Picamera2()
+        # Picamera2 的 "BGR888" 在記憶體中是 [R, G, B] 順序，可以直接餵給 MediaPipe
+        self.picam2.configure(self.picam2.create_preview_configuration(
+            main={"size": (width, height), "format": "BGR888"}, raw=None, controls={"FrameRate": fps}
+        ))
+        self.picam2.start()
+        time.sleep(1)
+
+    def read(self):
+        return self.picam2.capture_array()
+
+    def close(self):
+        self.picam2.stop()
+
+
+class _FileSource:
+    """影片 / 圖片來源共用：縮放到指定大小，可選擇依 fps 節流或循環播放"""
+
+    def __init__(self, width, height, fps=None, loop=False):
+        self.size = (width, height)
+        self.period = 1.0 / fps if fps else 0.0
+        self.loop = loop
+        self._next = time.perf_counter()
+
+    def _to_rgb(self, bgr):
+        if (bgr.shape[1], bgr.shape[0]) != self.size:
+            bgr = cv2.resize(bgr, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+    def _pace(self):
+        if self.period:
+            delay = self._next - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next = max(self._next + self.period, time.perf_counter())
+
+
+class VideoFileSource(_FileSource):
+    def __init__(self, path, width, height, fps=None, loop=False):
+        super().__init__(width, height, fps, loop)
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"無法開啟影片: {path}")
+
+    def read(self):
+        ok, bgr = self.cap.read()
+        if not ok and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, bgr = self.cap.read()
+        if not ok:
+            return None
+        self._pace()
+        return self._to_rgb(bgr)
+
+    def close(self):
+        self.cap.release()
+
+
+class ImageDirSource(_FileSource):
+    def __init__(self, path, width, height, fps=None, loop=False):
+        super().__init__(width, height, fps, loop)
+        self.files = sorted(f for f in glob.glob(os.path.join(path, "*"))
+                            if f.lower().endswith(IMAGE_EXTS))
+        if not self.files:
+            raise IOError(f"資料夾內沒有圖片: {path}")
+        self.index = 0
+
+    def read(self):
+        # 讀不到的圖片跳過；最多試一輪，全部都壞掉時 loop 也回傳 None 結束
+        for _ in range(len(self.files)):
+            if self.index >= len(self.files):
+                if not self.loop:
+                    return None
+                self.index = 0
+            bgr = cv2.imread(self.files[self.index], cv2.IMREAD_COLOR)
+            self.index += 1
+            if bgr is not None:
+                self._pace()
+                return self._to_rgb(bgr)
+        return None
+
+    def close(self):
+        pass
+
+
+def open_source(spec, width, height, fps, realtime=False, loop=False):
+    """依 --source 參數建立影像來源"""
+    if spec == "picamera2":
+        return Picamera2Source(width, height, fps)
+    pace = fps if realtime else None
+    if os.path.isdir(spec):
+        return ImageDirSource(spec, width, height, pace, loop)
+    return VideoFileSource(spec, width, height, pace, loop)
+
+
+# ---------------------------------------------------
+# Sinks
+# ---------------------------------------------------
+
+class _ThrottledSink:
+    """pty / 檔案沒有實際鮑率；給 baud 時依 8N1 的傳輸時間 sleep，模擬 UART"""
+
+    def __init__(self, baud=None):
+        self.baud = baud
+        self.bytes_written = 0
+
+    def _throttle(self, n):
+        if self.baud:
+            time.sleep(n * 10 / self.baud)
+
+    def flush(self):
+        pass
+
+
+class SerialSink:
+    def __init__(self, port, baud):
+        import serial
+        # read timeout 要短，uart_link 才能邊等 ACK 邊處理逾時
+        self.ser = serial.Serial(port, baud, timeout=0.02)
+        self.bytes_written = 0
+
+    def write(self, data):
+        n = self.ser.write(data)
+        self.bytes_written += n
+        return n
+
+    def read(self, n):
+        return self.ser.read(n)
+
+    @property
+    def in_waiting(self):
+        return self.ser.in_waiting
+
+    def flush(self):
+        self.ser.flush()
+
+    def close(self):
+        self.ser.close()
+
+    def __str__(self):
+        return f"{self.ser.port} @ {self.ser.baudrate} bps"
+
+
+class PtySink(_ThrottledSink):
+    """虛擬序列埠：寫入 master 端，接收程式開 slave_name；drain=True 時內部自己讀掉"""
+
+    def __init__(self, baud=None, drain=False):
+        import pty
+        import tty
+        super().__init__(baud)
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)
+        self.slave_name = os.ttyname(self.slave)
+        self.received = 0
+        self._closed = False
+        if drain:
+            threading.Thread(target=self._drain, daemon=True).start()
+
+    def _drain(self):
+        while not self._closed:
+            try:
+                self.received += len(os.read(self.slave, 65536))
+            except OSError:
+                return
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            n = os.write(self.master, view)
+            view = view[n:]
+        self.bytes_written += len(data)
+        self._throttle(len(data))
+        return len(data)
+
+    def read(self, n, timeout=0.02):
+        r, _, _ = select.select([self.master], [], [], timeout)
+        return os.read(self.master, n) if r else b""
+
+    def close(self):
+        self._closed = True
+        os.close(self.master)
+        os.close(self.slave)
+
+    def __str__(self):
+        return f"pty {self.slave_name}"
+
+
+class FileSink(_ThrottledSink):
+    def __init__(self, path, baud=None):
+        super().__init__(baud)
+        self.path = path
+        self.f = open(path, "wb")
+
+    def write(self, data):
+        self.f.write(data)
+        self.bytes_written += len(data)
+        self._throttle(len(data))
+        return len(data)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+    def __str__(self):
+        return f"file {self.path}"
+
+
+class NullSink(_ThrottledSink):
+    def write(self, data):
+        self.bytes_written += len(data)
+        self._throttle(len(data))
+        return len(data)
+
+    def close(self):
+        pass
+
+    def __str__(self):
+        return "none"
+
+
+class LocalInferenceSink(_ThrottledSink):
+    """把寫進來的 frame_codec 封包解開，用 gesture_cnn.py 在本機分類 (代替 STM32)
+
+    每張輸出一行跟 STM32 printf 相同格式的機率；給 path 時也寫進檔案，
+    可以給 gesture_decision.py 重播。封包被切成好幾次 write 也可以。
+    """
+
+    def __init__(self, path=None, baud=None, verbose=True):
+        from gesture_cnn import GestureCNN, LABELS   # 第一次用才讀權重
+        super().__init__(baud)
+        self.model = GestureCNN()
+        self.labels = LABELS
+        self.path = path
+        self.out = open(path, "wb") if path else None
+        self.verbose = verbose
+        self.buf = bytearray()
+        self.frames = 0
+        self.errors = 0           # 解不開的封包 (magic / 長度 / CRC)
+        self.last = None          # 最後一張的機率
+
+    def write(self, data):
+        self.buf += data
+        self.bytes_written += len(data)
+        self._throttle(len(data))
+        self._consume()
+        return len(data)
+
+    def _consume(self):
+        while True:
+            start = self.buf.find(frame_codec.MAGIC)
+            if start < 0:
+                del self.buf[:-1]                 # 留最後一個 byte，magic 可能被切開
+                return
+            del self.buf[:start]
+            if len(self.buf) < frame_codec.HEADER_SIZE:
+                return
+            try:
+                length = frame_codec.parse_header(self.buf)[3]
+                if len(self.buf) < frame_codec.HEADER_SIZE + length:
+                    return
+                img, _ = frame_codec.decode_frame(self.buf)
+            except frame_codec.FrameError:
+                self.errors += 1
+                del self.buf[:1]                  # 從下一個 byte 重新找 magic
+                continue
+            del self.buf[:frame_codec.HEADER_SIZE + length]
+            self.classify(img)
+
+    def classify(self, img):
+        """直接分類一張 64x64 灰階 (不經過封包)，回傳機率"""
+        probs = self.model.predict(img)[0]
+        self.frames += 1
+        self.last = probs
+        line = b"%.6f,%.6f,%.6f\r\n" % tuple(probs)
+        if self.out:
+            self.out.write(line)
+        if self.verbose:
+            print(f"🧠 [本機推論] {self.labels[int(probs.argmax())]}  "
+                  + "  ".join(f"{k}={v * 100:.1f}%" for k, v in zip(self.labels, probs)))
+        return probs
+
+    def flush(self):
+        if self.out:
+            self.out.flush()
+
+    def close(self):
+        if self.out:
+            self.out.close()
+
+    def __str__(self):
+        return f"local {self.path}" if self.path else "local"
+
+
+def open_sink(spec, baud, throttle=False):
+    """依 --sink 參數建立輸出端；throttle=True 時非實體 UART 也模擬 baud 的傳輸時間"""
+    sim_baud = baud if throttle else None
+    if spec == "pty":
+        return PtySink(sim_baud)
+    if spec == "loopback":
+        return PtySink(sim_baud, drain=True)
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):], sim_baud)
+    if spec == "none":
+        return NullSink(sim_baud)
+    if spec == "local" or spec.startswith("local:"):
+        return LocalInferenceSink(spec[len("local:"):] or None, sim_baud)
+    return SerialSink(spec, baud)
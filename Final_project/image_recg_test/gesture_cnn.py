@@ -0,0 +1,229 @@
+import os
+import re
+
+import numpy as np
+
+# ===================================================
+# model_64_gray_float 的 NumPy 推論 (主機端參考實作)
+# ===================================================
+#
+# 跟 STM32 上跑的是同一個網路、同一份權重 (直接讀 X-CUBE-AI 產生的 C 檔)，
+# 不用來回板子就能驗證前處理、整理資料集，傳輸忙碌時也能在 RPi 上自己分類。
+#
+#   輸入 f32(Nx64x64x1)，像素 0..255 不做正規化 (同 frame_codec.to_model_input)
+#   conv 3x3 16 + ReLU + maxpool 2x2   -> 32x32x16
+#   conv 3x3 32 + ReLU + maxpool 2x2   -> 16x16x32
+#   conv 3x3 64 + ReLU + maxpool 2x2   ->  8x8x64
+#   global average pool -> dense 3 -> softmax (K, L, O)
+#
+# conv 用 im2col：每個 3x3 視窗攤平成一列，整批影像一次做一個大矩陣乘法 (BLAS)。
+# im2col 暫存很大 (batch 64 時第二層就要 38 MB)，受記憶體頻寬限制；所以大 batch
+# 切成 chunk 張一組、暫存重複使用 (邊界的 0 只填一次)，整批留在 cache 裡比較快。
+# max pool 先做再加 bias + ReLU (兩者都是單調的，結果相同，計算量少 4 倍)。
+# 權重排列跟 TFLite 一樣是 OHWI；dense 權重被 X-CUBE-AI 壓成 4-bit LUT
+# (16 個 float + 每個權重一個 nibble，高 nibble 在前，依 runtime 的
+# forward_lite_dense_if32of32wf32_lut4 解)。
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(HERE, "X-CUBE-AI", "App")
+PARAMS_C = os.path.join(APP_DIR, "network_data_params.c")
+NETWORK_C = os.path.join(APP_DIR, "network.c")
+
+LABELS = ("K", "L", "O")
+INPUT_SIZE = 64
+CONV_LAYERS = (("conv2d_0", 1, 16), ("conv2d_2", 16, 32), ("conv2d_4", 32, 64))
+DENSE = ("gemm_7", 64, 3)
+MACC = 10_260_832         # X-CUBE-AI 報告的每張 MACC
+
+
+def _weights_blob(params_c):
+    """s_network_weights_array_u64[] -> bytes (STM32 是 little-endian)"""
+    with open(params_c) as f:
+        text = f.read()
+    start = text.index("s_network_weights_array_u64")
+    body = text[text.index("{", start) + 1:text.index("}", start)]
+    words = [int(w, 16) for w in re.findall(r"0x([0-9a-fA-F]+)U", body)]
+    return np.array(words, dtype="<u8").tobytes()
+
+
+def _weight_offsets(network_c):
+    """network.c 的 network_configure_weights()：陣列名稱 -> (data, data_start) byte offset"""
+    with open(network_c) as f:
+        text = f.read()
+    offsets = {}
+    for name, field, off in re.findall(
+            r"(\w+)_array\.(data|data_start) = AI_PTR\(g_network_weights_map\[0\] \+ (\d+)\)", text):
+        offsets.setdefault(name, {})[field] = int(off)
+    return offsets
+
+
+def load_weights(params_c=PARAMS_C, network_c=NETWORK_C):
+    """回傳 dict：conv 權重 OHWI (out, 3, 3, in)、bias，dense 權重 (3, 64)、bias，全部 float32"""
+    blob = _weights_blob(params_c)
+    offsets = _weight_offsets(network_c)
+
+    def f32(name, count):
+        off = offsets[name]["data"]
+        if off + count * 4 > len(blob):
+            raise ValueError(f"{name} 超出權重範圍 ({params_c})")
+        return np.frombuffer(blob, dtype="<f4", count=count, offset=off).astype(np.float32)
+
+    weights = {}
+    for name, cin, cout in CONV_LAYERS:
+        weights[name + "_weights"] = f32(name + "_weights", cout * 9 * cin).reshape(cout, 3, 3, cin)
+        weights[name + "_bias"] = f32(name + "_bias", cout)
+
+    name, cin, cout = DENSE
+    lut_off = offsets[name + "_weights"]["data_start"]
+    idx_off = offsets[name + "_weights"]["data"]
+    lut = np.frombuffer(blob, dtype="<f4", count=16, offset=lut_off)
+    packed = np.frombuffer(blob, dtype=np.uint8, count=cout * cin // 2, offset=idx_off)
+    idx = np.empty(packed.size * 2, dtype=np.uint8)
+    idx[0::2] = packed >> 4
+    idx[1::2] = packed & 0x0F
+    weights[name + "_weights"] = lut[idx].reshape(cout, cin).astype(np.float32)
+    weights[name + "_bias"] = f32(name + "_bias", cout)
+    return weights
+
+
+class GestureCNN:
+    """整批推論：predict(N 張 64x64 灰階) -> (N, 3) 機率
+
+    im2col 暫存是物件自己的，同一個物件不要同時在多個執行緒呼叫 predict。
+    """
+
+    def __init__(self, weights=None, chunk=4):
+        self.weights = load_weights() if weights is None else weights
+        self.chunk = chunk            # 一次算幾張 (im2col 暫存留在 cache 裡)
+        self.convs = []
+        for name, cin, cout in CONV_LAYERS:
+            w = self.weights[name + "_weights"]
+            # OHWI -> im2col 欄位順序 (kh, kw, in)
+            self.convs.append((np.ascontiguousarray(w.transpose(1, 2, 3, 0).reshape(9 * cin, cout)),
+                               self.weights[name + "_bias"]))
+        self._cols = {}               # 輸入 shape -> im2col 暫存
+        self.dense_w = np.ascontiguousarray(self.weights[DENSE[0] + "_weights"].T)
+        self.dense_b = self.weights[DENSE[0] + "_bias"]
+
+    @staticmethod
+    def as_batch(images):
+        """(64,64) / (N,64,64) / (N,64,64,1)，uint8 或 float -> float32 (N,64,64,1)"""
+        x = np.asarray(images, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[None]
+        if x.ndim == 3:
+            x = x[..., None]
+        if x.shape[1:] != (INPUT_SIZE, INPUT_SIZE, 1):
+            raise ValueError(f"輸入大小應為 {INPUT_SIZE}x{INPUT_SIZE}，收到 {x.shape}")
+        return x
+
+    def _im2col(self, x):
+        """(N,H,W,C) -> (N*H*W, 9*C)，padding=1 的 3x3 視窗"""
+        n, h, wd, c = x.shape
+        cols = self._cols.get(x.shape)
+        if cols is None:
+            # 每個位移寫入的範圍固定，沒寫到的邊界一直是 0
+            cols = self._cols[x.shape] = np.zeros((n, h, wd, 3, 3, c), dtype=np.float32)
+        for dy in range(3):
+            y0, y1 = max(0, 1 - dy), min(h, h + 1 - dy)
+            for dx in range(3):
+                x0, x1 = max(0, 1 - dx), min(wd, wd + 1 - dx)
+                cols[:, y0:y1, x0:x1, dy, dx] = x[:, y0 + dy - 1:y1 + dy - 1, x0 + dx - 1:x1 + dx - 1]
+        return cols.reshape(n * h * wd, 9 * c)
+
+    def _conv_relu_pool(self, x, w, b):
+        n, h, wd, _ = x.shape
+        y = (self._im2col(x) @ w).reshape(n, h, wd, -1)
+        y = np.maximum(np.maximum(y[:, 0::2, 0::2], y[:, 0::2, 1::2]),
+                       np.maximum(y[:, 1::2, 0::2], y[:, 1::2, 1::2]))
+        y += b
+        return np.maximum(y, 0, out=y)
+
+    def _forward(self, x):
+        for w, b in self.convs:
+            x = self._conv_relu_pool(x, w, b)
+        logits = x.mean(axis=(1, 2)) @ self.dense_w + self.dense_b
+        logits -= logits.max(axis=1, keepdims=True)
+        e = np.exp(logits)
+        return e / e.sum(axis=1, keepdims=True)
+
+    def predict(self, images):
+        x = self.as_batch(images)
+        if len(x) <= self.chunk:
+            return self._forward(x)
+        return np.concatenate([self._forward(x[i:i + self.chunk]) for i in range(0, len(x), self.chunk)])
+
+    def classify(self, img):
+        """單張影像 -> (標籤, 機率)"""
+        probs = self.predict(img)[0]
+        return LABELS[int(probs.argmax())], probs
+
+
+def reference_forward(weights, images):
+    """不用 im2col 的直接寫法 (9 個位移 × einsum)，只給自我檢查對照"""
+    x = GestureCNN.as_batch(images).astype(np.float64)
+    for name, _, _ in CONV_LAYERS:
+        w = weights[name + "_weights"].astype(np.float64)
+        n, h, wd, _ = x.shape
+        xp = np.pad(x, ((0, 0), (1, 1), (1, 1), (0, 0)))
+        y = sum(np.einsum("nhwc,oc->nhwo", xp[:, dy:dy + h, dx:dx + wd], w[:, dy, dx])
+                for dy in range(3) for dx in range(3)) + weights[name + "_bias"]
+        y = np.maximum(y, 0)
+        x = y.reshape(n, h // 2, 2, wd // 2, 2, -1).max(axis=(2, 4))
+    logits = x.mean(axis=(1, 2)) @ weights[DENSE[0] + "_weights"].T + weights[DENSE[0] + "_bias"]
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+# ===================================================
+# 自我檢查 + 吞吐量 (images/s，batch 1..256)
+# ===================================================
+#
+#   python gesture_cnn.py                 # 檢查 + benchmark
+#   python gesture_cnn.py frames/         # 順便分類資料夾裡的 64x64 灰階圖
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    t0 = time.perf_counter()
+    model = GestureCNN()
+    print(f"載入權重 {(time.perf_counter() - t0) * 1e3:.0f} ms ({os.path.relpath(PARAMS_C, HERE)})")
+
+    # 模擬 resize_and_pad_gray 的輸出：中間是手，左右補黑邊
+    rng = np.random.default_rng(0)
+    samples = np.zeros((8, 64, 64), dtype=np.uint8)
+    yy, xx = np.mgrid[0:64, 0:44]
+    for i in range(len(samples)):
+        samples[i, :, 10:54] = (120 + 60 * np.sin(xx / (4.0 + i)) * np.cos(yy / (9.0 - i / 2))).astype(np.uint8)
+    samples[4:] = rng.integers(0, 256, (4, 64, 64), dtype=np.uint8)
+
+    probs = model.predict(samples)
+    ref = reference_forward(model.weights, samples)
+    err = np.abs(probs - ref).max()
+    single = np.concatenate([model.predict(img) for img in samples])
+    assert err < 1e-4, f"im2col 與直接 conv 結果不同 (max err {err:.2e})"
+    assert np.abs(single - probs).max() < 1e-5, "一次一張與整批的結果不同"
+    assert np.allclose(probs.sum(axis=1), 1, atol=1e-5)
+    print(f"✅ im2col 與直接 conv 一致 (max err {err:.1e})，單張與整批一致")
+
+    if len(sys.argv) > 1:
+        import cv2
+        for path in sorted(os.listdir(sys.argv[1])):
+            img = cv2.imread(os.path.join(sys.argv[1], path), cv2.IMREAD_GRAYSCALE)
+            if img is None:
+                continue
+            img = cv2.resize(img, (INPUT_SIZE, INPUT_SIZE), interpolation=cv2.INTER_AREA)
+            label, p = model.classify(img)
+            print(f"{path:<30} {label}  " + "  ".join(f"{k}={v * 100:5.1f}%" for k, v in zip(LABELS, p)))
+
+    print(f"\n{'batch':>6}{'ms/batch':>11}{'images/s':>11}{'GMACC/s':>10}")
+    for batch in (1, 2, 4, 8, 16, 32, 64, 128, 256):
+        x = rng.integers(0, 256, (batch, 64, 64), dtype=np.uint8)
+        model.predict(x)                       # 暖機
+        runs, t0 = 0, time.perf_counter()
+        while runs < 3 or time.perf_counter() - t0 < 0.5:
+            model.predict(x)
+            runs += 1
+        dt = (time.perf_counter() - t0) / runs
+        print(f"{batch:6d}{dt * 1e3:11.2f}{batch / dt:11.0f}{batch * MACC / dt / 1e9:10.2f}")
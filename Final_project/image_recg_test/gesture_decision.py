@@ -0,0 +1,282 @@
+from collections import deque
+
+import numpy as np
+
+# ===================================================
+# 手勢決策：把逐幀的機率 (K, L, O) 變成穩定的決定
+# ===================================================
+#
+# 原本 gesture_monitor.py / PySide6GUI.py 每一行都直接取最大值，一幀誤判就會讓電梯動。
+# DecisionEngine 每收到一筆機率做 O(1) 的更新：
+#
+#   1. 平滑：ema  = 指數移動平均 (alpha 越小越平滑)
+#            vote = 最近 window 幀的多數決 (每類的票數 / window)
+#            none = 不平滑 (舊行為)
+#   2. 門檻 + 遲滯：平滑後的分數 >= enter 才能成為候選；目前的決定掉到 exit 以下才放掉
+#      (enter > exit，分數在中間抖動不會來回切換；放掉之後同一個手勢可以再觸發一次)
+#   3. 停留時間：候選要連續 dwell 秒都是第一名且 >= enter 才確定
+#
+# update() 只有在「確定了新的決定」時回傳手勢標籤，其他時候回傳 None，
+# 所以呼叫端可以直接把回傳值當成一個指令。
+#
+# dwell 用的是每一行的時間，不是到達時間：OS / USB 轉接器常把好幾行一次交給 read()，
+# 同一批都用 read() 的時間的話，一整批連續的手勢也湊不滿 dwell。
+# 呼叫端用 LineClock 把同一批的行依估計的行間隔往前排開再餵給 update()。
+
+LABELS = ("K", "L", "O")
+METHODS = ("ema", "vote", "none")
+
+# 預設參數 (gesture_decision.py 的重播測試在 10 幀/秒、3% 單幀誤判下挑的)
+PRESETS = {
+    "raw":  dict(method="none", enter=0.0, exit=0.0, dwell=0.0),       # 舊行為：最大值一換就觸發
+    "ema":  dict(method="ema", alpha=0.5, enter=0.6, exit=0.4, dwell=0.15),
+    "vote": dict(method="vote", window=5, enter=0.6, exit=0.4, dwell=0.0),
+}
+
+
+class DecisionEngine:
+    def __init__(self, method="ema", alpha=0.5, window=5, enter=0.6, exit=0.4, dwell=0.15,
+                 labels=LABELS):
+        if method not in METHODS:
+            raise ValueError(f"未知的平滑方式: {method} (可用: {', '.join(METHODS)})")
+        if exit > enter:
+            raise ValueError("exit 不能大於 enter")
+        self.method = method
+        self.alpha = alpha
+        self.window = window
+        self.enter = enter
+        self.exit = exit
+        self.dwell = dwell
+        self.labels = labels
+        self.reset()
+
+    def reset(self):
+        n = len(self.labels)
+        self.scores = [0.0] * n
+        self.votes = [0] * n
+        self.ring = [None] * self.window       # vote：最近 window 幀的第一名
+        self.pos = 0
+        self.filled = 0
+        self.samples = 0
+        self.decision = None                   # 目前的決定 (index)，沒有則 None
+        self.candidate = None
+        self.since = None
+        self.decisions = 0
+
+    def _smooth(self, probs):
+        if self.method == "none":
+            self.scores = list(probs)
+        elif self.method == "ema":
+            if self.samples == 0:
+                self.scores = list(probs)
+            else:
+                a = self.alpha
+                self.scores = [s + a * (p - s) for s, p in zip(self.scores, probs)]
+        else:
+            top = max(range(len(probs)), key=probs.__getitem__)
+            old = self.ring[self.pos]
+            if old is not None:
+                self.votes[old] -= 1
+            self.ring[self.pos] = top
+            self.votes[top] += 1
+            self.pos = (self.pos + 1) % self.window
+            self.filled = min(self.filled + 1, self.window)
+            self.scores = [v / self.filled for v in self.votes]
+
+    def update(self, probs, t):
+        """probs：一幀的機率 (長度同 labels)；t：時間 (秒)。確定新的決定時回傳標籤，否則 None"""
+        self._smooth(probs)
+        self.samples += 1
+        scores = self.scores
+        if self.decision is not None and scores[self.decision] < self.exit:
+            self.decision = None                 # 放掉：同一個手勢之後可以再觸發
+        best = max(range(len(scores)), key=scores.__getitem__)
+        if best == self.decision or scores[best] < self.enter:
+            self.candidate = None
+            return None
+        if best != self.candidate:
+            self.candidate, self.since = best, t
+        if t - self.since < self.dwell:
+            return None
+        self.decision = best
+        self.candidate = None
+        self.decisions += 1
+        return self.labels[best]
+
+    @property
+    def label(self):
+        """目前的決定 (標籤)；沒有則 None"""
+        return None if self.decision is None else self.labels[self.decision]
+
+    def __str__(self):
+        if self.method == "none":
+            return "raw (每幀取最大值)"
+        smooth = f"ema a={self.alpha:g}" if self.method == "ema" else f"vote n={self.window}"
+        return f"{smooth} enter={self.enter:g} exit={self.exit:g} dwell={self.dwell:g}s"
+
+
+class LineClock:
+    """替同一次 read() 收到的多行補上時間：最後一行 = 到達時間，前面的依行間隔往前排
+
+    行間隔 = 最近 window 次 read 的 (到達間隔 / 行數) 中位數 (中間停頓不送的時候只是一個離群值)。
+    排開的時間不會早於上一批的最後一行，所以送給 update() 的 t 一定遞增。
+    """
+
+    def __init__(self, window=15):
+        self.samples = deque(maxlen=window)
+        self.prev = None             # 上一批的到達時間
+        self.last = None             # 上一批最後一行的時間
+
+    @property
+    def period(self):
+        return float(np.median(self.samples)) if self.samples else 0.0
+
+    def stamps(self, n, arrival):
+        """n 行在 arrival 一起到 -> n 個遞增的時間"""
+        if n <= 0:
+            return []
+        if self.prev is not None:
+            self.samples.append((arrival - self.prev) / n)
+        self.prev = arrival
+        first = arrival - (n - 1) * self.period
+        if self.last is not None:
+            first = max(first, self.last)
+        self.last = arrival
+        if n == 1:
+            return [arrival]
+        step = (arrival - first) / (n - 1)
+        return [first + i * step for i in range(n)]
+
+
+def add_decision_args(parser):
+    """兩個工具共用的命令列參數"""
+    parser.add_argument("--decision", choices=sorted(PRESETS), default="ema",
+                        help="手勢決策方式 (raw = 舊行為，每幀取最大值)")
+    parser.add_argument("--dwell", type=float, help="候選手勢要維持幾秒才確定 (覆蓋預設)")
+    parser.add_argument("--enter", type=float, help="平滑後的分數超過多少才能成為候選 (覆蓋預設)")
+
+
+def engine_from_args(args):
+    params = dict(PRESETS[args.decision])
+    for key in ("dwell", "enter"):
+        if getattr(args, key, None) is not None:
+            params[key] = getattr(args, key)
+    params["exit"] = min(params.get("exit", 0.0), params["enter"])
+    return DecisionEngine(**params)
+
+
+# ===================================================
+# 重播測試：決策延遲 vs 誤觸發
+# ===================================================
+#
+#   python gesture_decision.py                    # 合成資料 (replay.synthetic_probs，有真實答案)
+#   python gesture_decision.py results.txt        # 錄下來的機率行 (serial_broker.py --tap -o)
+#
+# 錄下來的資料沒有真實答案，用「前後各 1 秒的多數決」當參考答案 (離線、看得到未來)。
+#   延遲   ：參考答案換成某手勢後，到引擎確定同一個手勢的時間
+#   誤觸發 ：確定的手勢跟當下參考答案不同 (每分鐘幾次)
+#   漏掉   ：整段手勢都沒有被確定的段數
+
+def replay(engine, t, probs):
+    """回傳 [(樣本 index, 標籤 index), ...]：每次確定決定的位置"""
+    engine.reset()
+    out = []
+    for i in range(len(t)):
+        label = engine.update(probs[i], t[i])
+        if label is not None:
+            out.append((i, engine.labels.index(label)))
+    return out
+
+
+def evaluate(events, t, truth):
+    """events: replay 的結果；truth: 每幀的參考答案 (index)"""
+    starts = np.flatnonzero(np.diff(truth, prepend=-1) != 0)
+    ends = np.append(starts[1:], len(truth))
+    latency, missed = [], 0
+    ev_idx = np.array([i for i, _ in events], dtype=np.int64)
+    ev_lab = np.array([k for _, k in events], dtype=np.int64)
+    for a, b in zip(starts, ends):
+        inside = (ev_idx >= a) & (ev_idx < b) & (ev_lab == truth[a])
+        if inside.any():
+            latency.append(t[ev_idx[inside][0]] - t[a])
+        else:
+            missed += 1
+    false = int((ev_lab != truth[ev_idx]).sum()) if len(ev_idx) else 0
+    minutes = (t[-1] - t[0]) / 60
+    return np.array(latency), false / minutes, missed, len(starts)
+
+
+def _reference_truth(t, probs, half=1.0):
+    """錄下來的資料沒有答案：前後各 half 秒的多數決 (離線參考答案)"""
+    top = probs.argmax(axis=1)
+    onehot = np.eye(probs.shape[1])[top]
+    csum = np.vstack([np.zeros(probs.shape[1]), np.cumsum(onehot, axis=0)])
+    lo = np.searchsorted(t, t - half, side="left")
+    hi = np.searchsorted(t, t + half, side="right")
+    return (csum[hi] - csum[lo]).argmax(axis=1)
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import time
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            rows = [line.strip().split(b",") for line in f if line.strip()]
+        probs = np.array([[float(v) for v in r[-3:]] for r in rows if len(r) >= 3])
+        rate = 10.0
+        t = np.arange(len(probs)) / rate
+        truth = _reference_truth(t, probs)
+        print(f"--- {sys.argv[1]}：{len(probs)} 幀 (假設 {rate:g} 幀/秒)，參考答案 = 前後 1 秒多數決 ---")
+    else:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+        from replay import synthetic_probs
+        rate = 10.0
+        truth, probs = synthetic_probs(6000, rate=rate, hold=2.0, glitch=0.03, seed=1)
+        t = np.arange(len(probs)) / rate
+        print(f"--- 合成資料：{len(probs)} 幀，{rate:g} 幀/秒，每 2 秒換手勢，3% 單幀誤判 ---")
+
+    configs = [DecisionEngine(**PRESETS["raw"])]
+    for alpha in (0.7, 0.5, 0.3):
+        for dwell in (0.0, 0.15, 0.3):
+            configs.append(DecisionEngine("ema", alpha=alpha, dwell=dwell))
+    for window in (3, 5, 9):
+        configs.append(DecisionEngine("vote", window=window, dwell=0.0))
+
+    print(f"{'設定 (* = 預設組合)':<40}{'延遲 p50':>10}{'p95':>8}{'誤觸發/分':>11}{'漏掉':>8}{'us/幀':>8}")
+    results = {}
+    for eng in configs:
+        t0 = time.perf_counter()
+        events = replay(eng, t, probs)
+        cost = (time.perf_counter() - t0) / len(t) * 1e6
+        lat, false_rate, missed, segments = evaluate(events, t, truth)
+        p50, p95 = np.percentile(lat, [50, 95]) if len(lat) else (np.nan, np.nan)
+        results[str(eng)] = (false_rate, missed)
+        preset = any(str(eng) == str(DecisionEngine(**p)) for p in PRESETS.values())
+        print(f"{('* ' if preset else '  ') + str(eng):<40}{p50 * 1e3:8.0f}ms{p95 * 1e3:6.0f}ms{false_rate:11.2f}"
+              f"{missed:5d}/{segments}{cost:8.1f}")
+
+    raw = results[str(DecisionEngine(**PRESETS["raw"]))]
+    ema = results[str(DecisionEngine(**PRESETS["ema"]))]
+    if len(sys.argv) == 1:
+        assert ema[0] < raw[0] / 5, "預設的 ema 設定應該大幅減少誤觸發"
+        print("✅ 預設 ema 的誤觸發比每幀取最大值少 5 倍以上")
+
+        # 一次 read() 收到一批：每 burst 行一起到，比較到達時間 / LineClock / 真正的時間
+        print(f"\n--- 成批到達 (預設 ema，dwell {PRESETS['ema']['dwell']:g}s)：到達時間 vs LineClock ---")
+        eng = DecisionEngine(**PRESETS["ema"])
+        for burst in (1, 3, 5, 10):
+            ends = np.minimum((np.arange(len(t)) // burst + 1) * burst, len(t)) - 1
+            arrival = t[ends]                  # 同一批都用 read() 回來的時間
+            clock = LineClock()
+            paced = np.concatenate([clock.stamps(len(t[i:i + burst]), arrival[i]) for i in range(0, len(t), burst)])
+            assert np.all(np.diff(paced) >= 0), "LineClock 的時間必須遞增"
+            row = []
+            for stamps in (arrival, paced):
+                lat, _, missed, segments = evaluate(replay(eng, stamps, probs), t, truth)
+                row.append((np.percentile(lat, 50), missed, segments))
+            print("  每 %2d 行一批   到達時間: p50 %4.0fms 漏掉 %d/%d   LineClock: p50 %4.0fms 漏掉 %d/%d"
+                  % (burst, row[0][0] * 1e3, *row[0][1:], row[1][0] * 1e3, *row[1][1:]))
+            assert row[1][1] == 0 and row[1][0] <= 0.35, "LineClock 排開後 dwell 應該跟逐行到達差不多"
+        print("✅ 成批到達時用 LineClock，dwell 的延遲跟逐行到達相同")
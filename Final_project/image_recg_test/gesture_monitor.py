@@ -1,54 +1,323 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
 import serial
-import matplotlib.pyplot as plt
+
+from gesture_decision import LineClock, add_decision_args, engine_from_args
 
 # ===== UART 設定 =====
 PORT = "COM6"        # ⚠️ 改成你的 STM32 COM port
 BAUD = 115200
+FPS = 20             # 畫面更新頻率 (與每秒收到幾行無關)
+HISTORY = 200        # 下方折線圖保留最近幾筆
 
-ser = serial.Serial(PORT, BAUD, timeout=1)
+parser = argparse.ArgumentParser(description="即時顯示 STM32 手勢辨識機率")
+parser.add_argument("port", nargs="?", default=PORT, help="序列埠或 pyserial URL")
+parser.add_argument("--broker", nargs="?", const="127.0.0.1:8765", metavar="HOST:PORT",
+                    help="不直接開序列埠，改從 serial_broker.py 收 (可與其他工具同時使用)")
+parser.add_argument("--baud", type=int, default=BAUD)
+parser.add_argument("--fps", type=float, default=FPS, help="畫面更新頻率")
+parser.add_argument("--history", type=int, default=HISTORY, help="折線圖保留最近幾筆")
+parser.add_argument("--renderer", choices=("blit", "legacy"), default="blit",
+                    help="blit = 讀取執行緒 + 固定幀率只重畫 bar；legacy = 原本每行 readline + plt.pause(0.05)")
+parser.add_argument("--bench", type=float, metavar="SEC",
+                    help="不開視窗，用 pty 模擬 STM32 跑 SEC 秒，比較兩種方式的延遲 (Linux / macOS)")
+parser.add_argument("--bench-rate", type=float, default=50.0, help="模擬 STM32 每秒送幾行")
+add_decision_args(parser)
+args = parser.parse_args()
+
+import matplotlib
+if args.bench:
+    matplotlib.use("Agg")
+import matplotlib.pyplot as plt
 
 # ===== 手勢定義 =====
 labels = ["K", "L", "O"]
-values = [0.0, 0.0, 0.0]
 
-# ===== Matplotlib 初始化 =====
-plt.ion()
-fig, ax = plt.subplots()
-bars = ax.bar(labels, values)
-ax.set_ylim(0, 1)
-ax.set_ylabel("Probability")
-ax.set_title("Gesture Recognition")
 
-print("Listening...")
+def parse_probs(line):
+    """'0.1,0.8,0.1' -> [0.1, 0.8, 0.1]；亂碼或欄位數不對回傳 None"""
+    try:
+        values = [float(v) for v in line.decode(errors="ignore").strip().split(",")]
+    except ValueError:
+        return None
+    return values if len(values) == 3 else None
 
-while True:
-    line = ser.readline().decode(errors="ignore").strip()
-    if not line:
-        continue
 
-    try:
-        # 期望格式: 0.1,0.8,0.1
-        values = list(map(float, line.split(",")))
-        if len(values) != 3:
-            continue
+def title_text(values, decision=None):
+    # 顯示平滑 + 遲滯之後的決定 (gesture_decision.py)，不是這一幀的最大值
+    return (f"Predict: {decision or '—'} | "
+            f"K={values[0]*100:.1f}%  "
+            f"L={values[1]*100:.1f}%  "
+            f"O={values[2]*100:.1f}%")
+
+
+# ===== UART 讀取執行緒 =====
+class ProbReader(threading.Thread):
+    """一次讀完 OS 緩衝區裡的資料、逐行解析，只保留最新一筆 + 最近 history 筆的 ring
+
+    畫面慢的時候資料不會在 OS 緩衝區排隊，只是中間幾筆不會各自畫出來 (折線圖裡還是有)。
+    """
+
+    def __init__(self, ser, history, engine):
+        super().__init__(daemon=True)
+        self.ser = ser
+        self.engine = engine
+        self.clock = LineClock()  # 同一次 read 的多行依行間隔排開，dwell 才不會被整批同一個時間卡住
+        self.lock = threading.Lock()
+        self.probs = np.zeros((history, 3))
+        self.history = history
+        self.count = 0            # 解析成功的行數
+        self.bad = 0              # 亂碼 / 欄位數不對的行
+        self.latest = None        # 最新一筆機率 (list)
+        self.arrival = 0.0        # 最新一筆的到達時間 (perf_counter)
+        self.running = True
+
+    def run(self):
+        buf = b""
+        while self.running:
+            try:
+                # timeout 內沒資料回傳 b""，讓 running 有機會被檢查
+                data = self.ser.read(max(self.ser.in_waiting, 1))
+            except (serial.SerialException, OSError) as e:
+                print(f"⚠️ UART 讀取錯誤: {e}")
+                break
+            if not data:
+                continue
+            t = time.perf_counter()
+            *lines, buf = (buf + data).split(b"\n")
+            buf = buf[-4096:]                 # 一直沒有換行的亂碼不要無限累積
+            rows = []
+            for line in lines:
+                values = parse_probs(line)
+                if values is not None:
+                    rows.append(values)
+                elif line.strip():
+                    self.bad += 1
+            # 每一行都進決策，畫面掉幀也不影響
+            for values, t_line in zip(rows, self.clock.stamps(len(rows), t)):
+                self.engine.update(values, t_line)
+            if rows:
+                self._push(rows, t)
+
+    def _push(self, rows, t):
+        rows = rows[-self.history:]
+        with self.lock:
+            for values in rows:
+                self.probs[self.count % self.history] = values
+                self.count += 1
+            self.latest = rows[-1]
+            self.arrival = t
+
+    def snapshot(self, out):
+        """依時間順序把歷史複製到 out，回傳 (筆數, count, 最新機率, 到達時間, 目前決定)"""
+        with self.lock:
+            n = min(self.count, self.history)
+            end = self.count % self.history
+            if self.count <= self.history:
+                out[:n] = self.probs[:n]
+            else:
+                out[:self.history - end] = self.probs[end:]
+                out[self.history - end:] = self.probs[:end]
+            return n, self.count, self.latest, self.arrival, self.engine.label
+
+
+# ===== Matplotlib：bar / 折線只建立一次，每幀 set_height + blit =====
+class BlitMonitor:
+    """timer 以固定幀率呼叫 frame()；沒有新資料的幀直接跳過
+
+    延遲 = 這一幀最新一行從 UART 讀到，到 blit 完成的時間；畫面上顯示的是前一幀量到的值。
+    """
+
+    def __init__(self, reader, history):
+        self.reader = reader
+        self.fig, (self.ax, self.ax_hist) = plt.subplots(2, 1, figsize=(6, 6),
+                                                         gridspec_kw={"height_ratios": [3, 2]})
+        self.canvas = self.fig.canvas
+        self.bars = self.ax.bar(labels, [0.0, 0.0, 0.0])
+        self.ax.set_ylim(0, 1)
+        self.ax.set_ylabel("Probability")
+        self.ax.set_title("Gesture Recognition")
+        self.lines = [self.ax_hist.plot([], [], label=lb)[0] for lb in labels]
+        self.ax_hist.set_xlim(0, history - 1)
+        self.ax_hist.set_ylim(0, 1)
+        self.ax_hist.set_xlabel("Samples")
+        self.ax_hist.legend(loc="upper left")
+        self.ax_hist.grid(True)
+        self.status = self.fig.text(0.01, 0.005, "", fontsize=8)
+        self.artists = [*self.bars, *self.lines, self.ax.title, self.status]
+        for a in self.artists:
+            a.set_animated(True)
+        self.fig.tight_layout()
+
+        self.x = np.arange(history)
+        self.snap = np.zeros((history, 3))
+        self.bg = None
+        self.last_count = 0
+        self.latency = []         # 最近 100 幀的延遲 (秒)
+        self.frames = 0
+        self.coalesced = 0        # 沒有單獨畫出來的行 (同一幀裡較舊的)
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self.bg = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for a in self.artists:
+            self.fig.draw_artist(a)
+
+    def frame(self):
+        """回傳 True 表示有重畫"""
+        n, count, latest, arrival, decision = self.reader.snapshot(self.snap)
+        if count == self.last_count:
+            return False
+        self.coalesced += count - self.last_count - 1
+        self.last_count = count
 
         # 更新 bar
+        for bar, v in zip(self.bars, latest):
+            bar.set_height(v)
+        self.ax.set_title(title_text(latest, decision))
+        for i, line in enumerate(self.lines):
+            line.set_data(self.x[:n], self.snap[:n, i])
+        if self.latency:
+            p50, p95 = np.percentile(self.latency, [50, 95]) * 1e3
+            self.status.set_text(f"latency {self.latency[-1] * 1e3:5.1f} ms  (p50 {p50:.1f} / p95 {p95:.1f})"
+                                 f"   lines {count}  coalesced {self.coalesced}  bad {self.reader.bad}")
+
+        if self.bg is None:
+            self.canvas.draw()          # 觸發 _on_draw，擷取背景
+        else:
+            self.canvas.restore_region(self.bg)
+            self._draw_artists()
+            self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+        self.latency = self.latency[-99:] + [time.perf_counter() - arrival]
+        self.frames += 1
+        return True
+
+
+def run_legacy(ser, engine, seconds=None, on_frame=None):
+    """原本的做法：每行 readline、更新 bar、plt.pause(0.05) (benchmark 對照用)"""
+    plt.ion()
+    fig, ax = plt.subplots()
+    bars = ax.bar(labels, [0.0, 0.0, 0.0])
+    ax.set_ylim(0, 1)
+    ax.set_ylabel("Probability")
+    ax.set_title("Gesture Recognition")
+    count = 0
+    t0 = time.perf_counter()
+    while seconds is None or time.perf_counter() - t0 < seconds:
+        values = parse_probs(ser.readline())
+        if values is None:
+            continue
+        count += 1
+        engine.update(values, time.perf_counter())
         for bar, v in zip(bars, values):
             bar.set_height(v)
+        ax.set_title(title_text(values, engine.label))
+        if seconds is None:
+            plt.pause(0.05)
+        else:
+            fig.canvas.draw()           # Agg 沒有事件迴圈：draw + sleep 等同 plt.pause
+            time.sleep(0.05)
+        if on_frame is not None:
+            on_frame(count)
+    plt.close(fig)
 
-        # 找最大機率
-        pred_idx = values.index(max(values))
-        pred_label = labels[pred_idx]
 
-        ax.set_title(
-            f"Predict: {pred_label} | "
-            f"K={values[0]*100:.1f}%  "
-            f"L={values[1]*100:.1f}%  "
-            f"O={values[2]*100:.1f}%"
-        )
+# ===== Benchmark：pty 模擬 STM32，量測「送出 -> 畫面」延遲 =====
+def run_bench(seconds):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+    import tty
+    from replay import format_probs, synthetic_probs
 
-        plt.pause(0.05)
+    messages = format_probs(synthetic_probs(1000, rate=args.bench_rate)[1])
+    period = 1.0 / args.bench_rate
+    print(f"模擬 STM32 {args.bench_rate:.0f} 行/秒，{seconds:.0f} 秒，目標 {args.fps:.0f} FPS")
 
-    except ValueError:
-        # 避免亂碼行
-        continue
+    for kind in ("legacy", "blit"):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        ser = serial.Serial(os.ttyname(slave), args.baud, timeout=0.1)
+        sent = []                 # 第 k 行的送出時間
+        shown = []                # (畫面更新完成時間, 當時已處理的行數)
+        stop = threading.Event()
+
+        def writer():
+            t_next = time.perf_counter()
+            while not stop.is_set():
+                os.write(master, messages[len(sent) % len(messages)])
+                sent.append(time.perf_counter())
+                t_next += period
+                time.sleep(max(t_next - time.perf_counter(), 0))
+
+        threading.Thread(target=writer, daemon=True).start()
+        c0 = time.process_time()
+        t0 = time.perf_counter()
+        if kind == "legacy":
+            run_legacy(ser, engine_from_args(args), seconds,
+                       lambda count: shown.append((time.perf_counter(), count)))
+        else:
+            reader = ProbReader(ser, args.history, engine_from_args(args))
+            reader.start()
+            monitor = BlitMonitor(reader, args.history)
+            monitor.canvas.draw()
+            next_frame = t0
+            while time.perf_counter() - t0 < seconds:
+                if monitor.frame():
+                    shown.append((time.perf_counter(), monitor.last_count))
+                next_frame += 1.0 / args.fps
+                time.sleep(max(next_frame - time.perf_counter(), 0))
+            reader.running = False
+            plt.close(monitor.fig)
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - c0
+        stop.set()
+        time.sleep(0.05)
+        lat = np.array([t - sent[c - 1] for t, c in shown])
+        processed = shown[-1][1] if shown else 0
+        p50, p95, worst = np.percentile(lat, [50, 95, 100]) * 1e3 if len(lat) else (np.nan,) * 3
+        print(f"{kind:>6}: 畫面 {len(shown) / wall:5.1f} FPS，處理 {processed / wall:6.1f} 行/秒 "
+              f"(送出 {len(sent) / wall:6.1f})，結束時落後 {len(sent) - processed} 行，"
+              f"延遲 p50 {p50:7.1f} / p95 {p95:7.1f} / max {worst:7.1f} ms，CPU {cpu / wall * 100:5.1f}%")
+        ser.close()
+        os.close(master)
+        os.close(slave)
+
+
+if args.bench:
+    run_bench(args.bench)
+    sys.exit(0)
+
+timeout = 1 if args.renderer == "legacy" else 0.1
+if args.broker:
+    from serial_broker import BrokerClient
+    ser = BrokerClient(args.broker, timeout)
+else:
+    ser = serial.serial_for_url(args.port, args.baud, timeout=timeout)
+print("Listening...")
+
+if args.renderer == "legacy":
+    run_legacy(ser, engine_from_args(args))
+    sys.exit(0)
+
+reader = ProbReader(ser, args.history, engine_from_args(args))
+reader.start()
+monitor = BlitMonitor(reader, args.history)
+
+# 畫面更新用 timer，與接收速率脫鉤
+def on_timer():
+    monitor.frame()    # 不回傳值：timer callback 回傳 False/0 會被移除
+
+timer = monitor.canvas.new_timer(interval=int(1000 / args.fps))
+timer.add_callback(on_timer)
+timer.start()
+
+plt.show()
+reader.running = False
@@ -0,0 +1,146 @@
+import numpy as np
+
+# ===================================================
+# 手部 Bounding Box / 裁切 (NumPy 向量化)
+# ===================================================
+#
+# 全部用 float64 算，像素座標跟原本的 int(x * w) 完全相同 (float32 會有差 1 px 的情況)。
+# NumPy 每個運算都有約 1 us 的固定開銷，單手時就是在比運算個數，所以：
+#   - 所有手的 x、y 接成一個 list，一次轉成陣列、乘上同樣攤平的 [w..., h...] (不用 broadcast)
+#   - min/max 用沿關鍵點排序後取頭尾，直接排成一個連續的 [xmin, ymin, xmax, ymax]
+#   - 邊界、夾在畫面內、有效判斷都在這個 (H, 4) 陣列的前後兩半上原地做
+# min 只夾下界 0、max 只夾上界 w/h，跟原本逐點寫法一樣 (bbox 整個在畫面外時結果也相同)。
+
+
+def landmarks_to_array(hand):
+    """MediaPipe 的 hand.landmark 轉成 (N, 2) 正規化座標"""
+    lms = hand.landmark
+    return np.array([[lm.x for lm in lms], [lm.y for lm in lms]]).T
+
+
+class HandCropper:
+    """依關鍵點算出加邊界並夾在畫面內的 bbox，多手一次批次計算"""
+
+    def __init__(self, width, height, margin=0.2):
+        self.size = np.array([width, height], dtype=np.float64)
+        self.limit = np.array([width, height], dtype=np.int64)
+        self.margin = margin
+        self._margin = np.array(margin, dtype=np.float64)   # 0-d 陣列比 Python float 少一次轉型
+        self._scale = {}          # 所有手的座標數 -> [w] * N + [h] * N 重複 H 次
+
+    def to_pixels(self, points):
+        """正規化座標 -> 像素座標 (與 int() 相同，向 0 截斷)"""
+        return (points * self.size).astype(np.int64)
+
+    def _boxes(self, px):
+        """px: (H, 2, N) 像素座標 (N >= 2)；回傳 (H, 4) 的 [xmin, ymin, xmax, ymax] 與 (H,) 有效遮罩"""
+        box = np.sort(px, axis=2)[:, :, ::px.shape[2] - 1].transpose(0, 2, 1).reshape(-1, 4)
+        lo, hi = box[:, :2], box[:, 2:]
+        m = ((hi - lo) * self._margin).astype(np.int64)
+        lo -= m
+        hi += m
+        np.maximum(lo, 0, out=lo)
+        np.minimum(hi, self.limit, out=hi)
+        ok = hi > lo
+        return box, ok[:, 0] & ok[:, 1]
+
+    def bboxes(self, points):
+        """points: (H, N, 2) 正規化座標；回傳 (H, 4) 的 [xmin, ymin, xmax, ymax] 與 (H,) 有效遮罩"""
+        return self._boxes(self.to_pixels(points).transpose(0, 2, 1))
+
+    def bbox(self, points):
+        """單手版本：回傳 (xmin, ymin, xmax, ymax)，bbox 無效時回傳 None"""
+        boxes, valid = self.bboxes(points[np.newaxis])
+        if not valid[0]:
+            return None
+        return tuple(boxes[0].tolist())
+
+    def from_results(self, multi_hand_landmarks):
+        """hands.process() 的結果 -> (points (H, N, 2) 像素座標, boxes, valid)"""
+        values = []
+        for hand in multi_hand_landmarks:
+            lms = hand.landmark
+            values += [lm.x for lm in lms]
+            values += [lm.y for lm in lms]
+        count = len(multi_hand_landmarks)
+        scale = self._scale.get(len(values))
+        if scale is None:
+            scale = self._scale[len(values)] = np.tile(np.repeat(self.size, len(values) // count // 2), count)
+        px = (np.array(values) * scale).astype(np.int64).reshape(count, 2, -1)
+        boxes, valid = self._boxes(px)
+        return px.transpose(0, 2, 1), boxes, valid
+
+    @staticmethod
+    def crop(frame, bbox):
+        """回傳 frame 上 bbox 區域的 view (不複製)"""
+        xmin, ymin, xmax, ymax = bbox
+        return frame[ymin:ymax, xmin:xmax]
+
+
+# ===================================================
+# Micro-benchmark：與原本 sender 主迴圈的逐點 list + min/max 寫法比較
+# ===================================================
+
+def _legacy_bbox(hand, w_img, h_img):
+    """原本 main_rpi_uart4_sender.py 的寫法 (含給 scheduler 的 points)；回傳 (bbox, points) 或 (None, None)"""
+    xs = [lm.x for lm in hand.landmark]
+    ys = [lm.y for lm in hand.landmark]
+
+    x_vals = [int(x * w_img) for x in xs]
+    y_vals = [int(y * h_img) for y in ys]
+
+    box_w = max(x_vals) - min(x_vals)
+    box_h = max(y_vals) - min(y_vals)
+
+    mx, my = int(box_w * 0.2), int(box_h * 0.2)
+    xmin, xmax = max(0, min(x_vals)-mx), min(w_img, max(x_vals)+mx)
+    ymin, ymax = max(0, min(y_vals)-my), min(h_img, max(y_vals)+my)
+    if xmax > xmin and ymax > ymin:
+        return (xmin, ymin, xmax, ymax), np.array([x_vals, y_vals], dtype=np.float32).T
+    return None, None
+
+
+if __name__ == "__main__":
+    import timeit
+    from types import SimpleNamespace
+
+    W, H = 640, 480
+    rng = np.random.default_rng(0)
+
+    def fake_hand(spread=0.08, lo=0.1, hi=0.9):
+        cx, cy = rng.uniform(lo, hi, size=2)
+        pts = np.column_stack((cx + rng.normal(0, spread, 21), cy + rng.normal(0, spread, 21)))
+        return SimpleNamespace(landmark=[SimpleNamespace(x=float(x), y=float(y), z=0.0) for x, y in pts])
+
+    cropper = HandCropper(W, H)
+    # 一般的手 + 部分/整個在畫面外、縮成一點 (bbox 無效) 的手
+    hands = [fake_hand() for _ in range(200)]
+    tests = hands + [fake_hand(s, -0.3, 1.3) for s in (0.0, 0.001, 0.08, 0.3) for _ in range(5000)]
+    invalid = 0
+    for i in range(0, len(tests), 4):
+        batch = tests[i:i + 4]
+        points, boxes, valid = cropper.from_results(batch)
+        for k, hand in enumerate(batch):
+            bbox, legacy_points = _legacy_bbox(hand, W, H)
+            assert (tuple(boxes[k].tolist()) if valid[k] else None) == bbox
+            assert cropper.bbox(landmarks_to_array(hand)) == bbox
+            if bbox is None:
+                invalid += 1
+            else:
+                assert np.array_equal(points[k], legacy_points)
+    print(f"✅ {len(tests)} 隻手的 bbox / 像素座標與原本寫法完全相同 (其中 {invalid} 隻 bbox 無效)")
+
+    def best_of(*fns, n=200, rounds=300):
+        """兩邊交錯跑很多小輪、各取最快的一輪 (共用 CPU 的機器上雜訊很大)"""
+        best = [float("inf")] * len(fns)
+        for _ in range(rounds):
+            for i, fn in enumerate(fns):
+                best[i] = min(best[i], timeit.timeit(fn, number=n) / n)
+        return best
+
+    print("每幀 (bbox + 給 scheduler 的 points)：")
+    for k in (1, 2, 3, 4):
+        batch = hands[:k]
+        t_old, t_new = best_of(lambda: [_legacy_bbox(h, W, H) for h in batch],
+                               lambda: cropper.from_results(batch))
+        print(f"  {k} 手: 原本 {t_old * 1e6:6.1f} us  HandCropper {t_new * 1e6:6.1f} us  ({t_old / t_new:.2f}x)")
@@ -1,180 +1,339 @@
+import argparse
 import cv2
 import mediapipe as mp
 import time
 import os
 import sys
-import serial
+import threading
 import numpy as np
-from picamera2 import Picamera2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+
+import frame_codec
+from uart_link import LinkSender, LinkError
+from frame_io import open_source, open_sink, LocalInferenceSink
+from pipeline import LatestQueue, Stage, StageStats, format_report
+from send_scheduler import SendScheduler, POLICIES
+from hand_cropper import HandCropper
+from preprocess import GrayPreprocessor
 
 # ===================================================
 # 0. 環境和初始化設置
 # ===================================================
 
+parser = argparse.ArgumentParser(description="RPi 手部追蹤 + 64x64 影像 UART 傳送")
+parser.add_argument("--source", default="picamera2",
+                    help="影像來源：picamera2 / 影片檔 / 圖片資料夾 (預設 picamera2)")
+parser.add_argument("--sink", default="/dev/serial0",
+                    help="輸出端：序列埠路徑 / pty / loopback / file:PATH / none / local[:PATH] (預設 /dev/serial0)")
+parser.add_argument("--baud", type=int, default=115200)
+parser.add_argument("--simulate-baud", action="store_true",
+                    help="pty / file / none 也依 --baud 模擬傳輸時間")
+parser.add_argument("--headless", action="store_true", help="不開視窗、不做任何畫圖")
+parser.add_argument("--realtime", action="store_true", help="檔案來源依 FPS 節流播放")
+parser.add_argument("--loop", action="store_true", help="檔案來源播完後重頭開始")
+parser.add_argument("--max-frames", type=int, default=0, help="處理幾幀後結束 (0 = 不限)")
+parser.add_argument("--policy", choices=POLICIES, default="stable", help="傳送策略 (見 send_scheduler.py)")
+parser.add_argument("--format", choices=sorted(frame_codec.FORMAT_IDS), default="auto",
+                    help="UART 封包格式 (見 frame_codec.py)")
+parser.add_argument("--link", choices=("raw", "reliable"), default="raw",
+                    help="raw: 直接送 frame_codec 封包 (STM32 韌體用這個)；"
+                         "reliable: 分塊 + ACK/重傳 (common/uart_link.py，接收端需跑 LinkReceiver)")
+parser.add_argument("--local-fallback", action="store_true",
+                    help="UART 還在傳上一張時，該送的影像改在本機用 gesture_cnn.py 分類，不用等")
+args = parser.parse_args()
+
 # 圖形化環境設定
-os.environ['QT_QPA_PLATFORM'] = 'xcb' 
+if not args.headless:
+    os.environ['QT_QPA_PLATFORM'] = 'xcb' 
 WIDTH, HEIGHT = 640, 480
 FPS = 30 
 TARGET_SIZE = 64  # STM32 模型輸入大小
+MAX_NUM_HANDS = 1  # 多手時送出面積最大 (最靠近鏡頭) 的那一隻
+FRAME_FORMAT = frame_codec.FORMAT_IDS[args.format]  # UART 封包格式，f32 為舊的 16 KiB 格式
+SHOW_PREVIEW = not args.headless  # False 時完全不做 BGR 轉換與畫圖
 
 # ---------------------------------------------------
 # MediaPipe 初始化
 # ---------------------------------------------------
 mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(max_num_hands=1, min_detection_confidence=0.5, min_tracking_confidence=0.5)
+hands = mp_hands.Hands(max_num_hands=MAX_NUM_HANDS, min_detection_confidence=0.5, min_tracking_confidence=0.5)
 mp_drawing = mp.solutions.drawing_utils
+cropper = HandCropper(WIDTH, HEIGHT, margin=0.2)
+preprocessor = GrayPreprocessor(WIDTH, HEIGHT, TARGET_SIZE, color_code=cv2.COLOR_RGB2GRAY)
+local_preprocessor = GrayPreprocessor(WIDTH, HEIGHT, TARGET_SIZE, color_code=cv2.COLOR_RGB2GRAY)
 
 # ---------------------------------------------------
-# UART 初始化
+# UART (sink) 初始化
 # ---------------------------------------------------
 try:
-    # 🌟 保持使用 /dev/serial0 (RPi 的硬體 UART), 鮑率 115200 bps
+    # 🌟 預設使用 /dev/serial0 (RPi 的硬體 UART), 鮑率 115200 bps
     # 此埠將連接到 STM32 的 UART4 (PA0/PA1 或 Arduino D1/D0)
-    ser = serial.Serial('/dev/serial0', 115200, timeout=1)
-    print("✅ UART 連接成功: /dev/serial0 @ 115200 bps (目標: STM32 UART4)")
-except serial.SerialException as e:
-    print(f"❌ UART 連接失敗: {e}")
+    ser = open_sink(args.sink, args.baud, throttle=args.simulate_baud)
+    print(f"✅ 輸出端開啟成功: {ser} (目標: STM32 UART4)")
+except Exception as e:
+    print(f"❌ 輸出端開啟失敗: {e}")
     ser = None
 
+link = None
+if args.link == "reliable" and ser:
+    if not hasattr(ser, "read"):
+        print(f"❌ {ser} 無法讀取 ACK，不能使用 --link reliable")
+        sys.exit(1)
+    link = LinkSender(ser)
+
 # ---------------------------------------------------
-# Picamera2 相機初始化
+# 影像來源初始化
 # ---------------------------------------------------
 try:
-    picam2 = Picamera2()
-    picam2.configure(picam2.create_preview_configuration(
-        main={"size": (WIDTH, HEIGHT)}, raw=None, controls={"FrameRate": FPS}
-    ))
-    picam2.start()
-    time.sleep(1)
-    print("✅ Picamera2 攝影機服務啟動成功。")
+    source = open_source(args.source, WIDTH, HEIGHT, FPS, realtime=args.realtime, loop=args.loop)
+    print(f"✅ 影像來源啟動成功: {args.source}")
 except Exception as e:
-    print(f"❌ Picamera2 啟動失敗：{e}")
+    print(f"❌ 影像來源啟動失敗：{e}")
     sys.exit(1)
 
 # ---------------------------------------------------
 # OpenCV 視窗初始化
 # ---------------------------------------------------
 WINDOW_NAME = 'RPi Hand Tracking & Sender'
-cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_AUTOSIZE)
+if SHOW_PREVIEW:
+    cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_AUTOSIZE)
 
 # ===================================================
-# 1. 影像處理輔助函式 (不變)
+# 1. 影像處理輔助函式
 # ===================================================
 
-def resize_and_pad_gray(img, target_size):
-    """轉灰階並保持比例縮放至 target_size，補黑邊"""
-    if len(img.shape) > 2:
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        
-    h, w = img.shape[:2]
-    scale = target_size / max(h, w)
-    new_w, new_h = int(w * scale), int(h * scale)
-    
-    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    canvas = np.zeros((target_size, target_size), dtype=np.uint8)
-    
-    x_offset = (target_size - new_w) // 2
-    y_offset = (target_size - new_h) // 2
-    
-    canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
-    return canvas
-
 def send_image_via_uart(processed_img):
-    """將 64x64 影像轉為 Float32 並透過 UART 發送 (16384 bytes)"""
+    """將 64x64 影像編成 frame_codec 封包 (header + payload + CRC) 並透過 UART 發送"""
     if ser:
         try:
-            float_data = processed_img.astype(np.float32)
-            bytes_to_send = float_data.tobytes()
+            bytes_to_send = frame_codec.encode_frame(processed_img, FRAME_FORMAT)
+            fmt, _, _, length, _ = frame_codec.parse_header(bytes_to_send)
             
-            print(f"🚀 [傳送中] 發送影像資料: {len(bytes_to_send)} bytes (Float32)...")
-            ser.write(bytes_to_send)
-            print("✅ [傳送完成]")
+            print(f"🚀 [傳送中] 發送影像資料: {len(bytes_to_send)} bytes "
+                  f"({frame_codec.FORMAT_NAMES[fmt]}, payload {length} bytes)...")
+            if link:
+                stats = link.send(bytes_to_send)
+                print(f"✅ [傳送完成] {stats}")
+            else:
+                ser.write(bytes_to_send)
+                ser.flush()  # 等資料真的送出，背壓才準確
+                print("✅ [傳送完成]")
+        except LinkError as e:
+            print(f"❌ UART 傳送失敗 (對方未確認): {e}")
         except Exception as e:
             print(f"❌ UART 發送錯誤: {e}")
     else:
         print("⚠️ UART 未連接，無法發送影像。")
 
 # ===================================================
-# 2. 主迴圈
+# 2. 管線各階段 (各自一個執行緒，以「只留最新」的佇列串接)
 # ===================================================
+#
+#   capture ──frame_q──▶ landmark ──display_q──▶ display (主執行緒)
+#                            └────send_q──▶ sender (UART)
+#
+# 佇列滿了就丟掉舊的，UART 傳送中也不會卡住預覽和追蹤。
 
-print("--- 程式運行中：全程預覽骨架，每 10 秒傳送一次資料 ---")
-next_capture_time = time.time() + 10.0 
-last_sent_preview = None 
+# 傳送策略 (見 send_scheduler.py)：interval / continuous / stable / change
+SEND_POLICY = args.policy
+SEND_INTERVAL = 10.0        # interval 策略的間隔秒數
+STABLE_FRAMES = 5           # stable 策略：bbox 連續不動的幀數
+CHANGE_THRESHOLD = 0.08     # change 策略：關鍵點平均位移 (相對 bbox 大小)
+STATS_INTERVAL = 5.0  # 每隔幾秒印一次各階段 FPS / 佇列深度
 
-try:
-    while True:
-        # A. 每一幀都執行：抓圖 + MediaPipe 偵測
-        frame_array = picam2.capture_array()
-        frame = cv2.cvtColor(frame_array, cv2.COLOR_RGB2BGR)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        results = hands.process(rgb_frame)
+frame_q = LatestQueue(maxsize=1)
+display_q = LatestQueue(maxsize=1)
+send_q = LatestQueue(maxsize=1)
+local_q = LatestQueue(maxsize=1)   # --local-fallback：UART 忙碌時改在本機分類
+stop_event = threading.Event()
+source_done = threading.Event()  # 檔案來源讀完或到達 --max-frames
+link_idle = threading.Event()   # UART 背壓：上一張送完才會再 set
+link_idle.set()
+
+scheduler = SendScheduler(SEND_POLICY, interval=SEND_INTERVAL, stable_frames=STABLE_FRAMES,
+                          change_threshold=CHANGE_THRESHOLD)
+last_sent_preview = None
+local_sink = LocalInferenceSink() if args.local_fallback else None
+# 本機分類用自己的 scheduler：只在本機分類的幀不能重設 UART 的計時器 / 參考姿勢
+local_scheduler = SendScheduler(SEND_POLICY, interval=SEND_INTERVAL, stable_frames=STABLE_FRAMES,
+                                change_threshold=CHANGE_THRESHOLD) if local_sink else None
+
+
+def capture_step():
+    """A. 抓圖"""
+    if source_done.is_set():
+        time.sleep(0.05)
+        return False
+    frame = source.read()
+    if frame is None:
+        source_done.set()
+        return False
+    frame_q.put(frame)
+    if args.max_frames and stages[0].stats.count + 1 >= args.max_frames:
+        source_done.set()
+    return True
+
+
+def landmark_step():
+    """B. MediaPipe 偵測 + Bounding Box，由 scheduler 決定是否把裁切結果交給 sender"""
+    global last_sent_preview
+
+    rgb_frame = frame_q.get(timeout=0.1)
+    if rgb_frame is None:
+        return False
+
+    # 相機輸出已是 RGB，直接給 MediaPipe，不再 RGB->BGR->RGB 來回轉
+    results = hands.process(rgb_frame)
+
+    hand_list = []
+    boxes = []
+    bbox = None
+    points = None
+    current_hand_crop = None
+
+    if results.multi_hand_landmarks:
+        hand_list = results.multi_hand_landmarks
+
+        # 計算 Bounding Box (所有手一次向量化)
+        all_points, all_boxes, valid = cropper.from_results(hand_list)
+        boxes = [tuple(b) for b in all_boxes[valid].tolist()]
+
+        if valid.any():
+            # 面積最大的那隻手拿去送
+            area = (all_boxes[:, 2] - all_boxes[:, 0]) * (all_boxes[:, 3] - all_boxes[:, 1])
+            best = int(np.argmax(np.where(valid, area, -1)))
+            bbox = tuple(all_boxes[best].tolist())
+            points = all_points[best].astype(np.float32)
+            # 骨架改在 display 階段才畫，裁切到的是乾淨的手部影像
+            current_hand_crop = cropper.crop(rgb_frame, bbox)
+
+    # 由 scheduler 決定這一幀要不要送；UART 忙碌時一律不送 (--local-fallback 時改在本機分類)
+    current_time = time.time()
+    link_busy = not link_idle.is_set()
+
+    # 兩個 scheduler 每幀都要問一次 (stable 的穩定計數靠每幀更新)
+    send = scheduler.should_send(current_time, bbox, points, link_busy)
+    local = local_scheduler is not None and local_scheduler.should_send(current_time, bbox, points, not link_busy)
+
+    if send or local:
+        # 執行前處理 (只對裁切區轉灰階，寫進預先配置的 canvas)
+        # UART 還在傳上一張時 sender 可能還在讀 preprocessor 的 canvas，改用另一個
+        if send:
+            processed_img = preprocessor.process(current_hand_crop)
+        else:
+            processed_img = local_preprocessor.process(current_hand_crop).copy()
         
-        bbox = None
-        current_hand_crop = None
+        # 更新左上角的預覽縮圖
+        if SHOW_PREVIEW:
+            last_sent_preview = cv2.cvtColor(processed_img, cv2.COLOR_GRAY2BGR)
         
-        # 繪製骨架
-        if results.multi_hand_landmarks:
-            hand = results.multi_hand_landmarks[0]
-            mp_drawing.draw_landmarks(frame, hand, mp_hands.HAND_CONNECTIONS)
-            
-            # 計算 Bounding Box
-            h_img, w_img, _ = frame.shape
-            xs = [lm.x for lm in hand.landmark]
-            ys = [lm.y for lm in hand.landmark]
-            
-            x_vals = [int(x * w_img) for x in xs]
-            y_vals = [int(y * h_img) for y in ys]
-            
-            box_w = max(x_vals) - min(x_vals)
-            box_h = max(y_vals) - min(y_vals)
-            
-            mx, my = int(box_w * 0.2), int(box_h * 0.2)
-            xmin, xmax = max(0, min(x_vals)-mx), min(w_img, max(x_vals)+mx)
-            ymin, ymax = max(0, min(y_vals)-my), min(h_img, max(y_vals)+my)
-            
-            if xmax > xmin and ymax > ymin:
-                bbox = (xmin, ymin, xmax, ymax)
-                cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
-                current_hand_crop = frame[ymin:ymax, xmin:xmax]
+        if send:
+            # 交給 sender 執行緒做 UART 傳送，送完前 link_idle 保持 clear
+            link_idle.clear()
+            send_q.put(processed_img)
+            scheduler.mark_sent(current_time, bbox, points)
+        else:
+            local_q.put(processed_img)
+            local_scheduler.mark_sent(current_time, bbox, points)
 
-        # B. 檢查時間：是否到達傳送時刻 (每 10 秒)
-        current_time = time.time()
-        
-        if current_time >= next_capture_time:
-            print(f"\n⏰ 時間到 ({time.strftime('%H:%M:%S')}) - 準備傳送...")
-            
-            if current_hand_crop is not None:
-                # 執行前處理
-                processed_img = resize_and_pad_gray(current_hand_crop, TARGET_SIZE)
-                
-                # 更新左上角的預覽縮圖
-                last_sent_preview = cv2.cvtColor(processed_img, cv2.COLOR_GRAY2BGR)
-                
-                # 執行 UART 傳送
-                send_image_via_uart(processed_img)
-            else:
-                print("⚠️ 時間到但未偵測到手部，本次跳過。")
-            
-            # 設定下一次傳送時間
-            next_capture_time = current_time + 10.0
+    if SHOW_PREVIEW:
+        display_q.put((rgb_frame, hand_list, boxes))
+    return True
 
-        # C. 顯示資訊與畫面
-        remaining = max(0, next_capture_time - current_time)
-        cv2.putText(frame, f"Next Send: {remaining:.1f}s", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
 
-        # 顯示最後一次傳送的縮圖
-        if last_sent_preview is not None:
-            frame[0:64, 0:64] = last_sent_preview
-            cv2.rectangle(frame, (0,0), (64,64), (0,0,255), 2)
-            cv2.putText(frame, "Sent", (0, 75), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,255), 1)
+def sender_step():
+    """C. UART 傳送 (阻塞只影響這個執行緒)"""
+    processed_img = send_q.get(timeout=0.1)
+    if processed_img is None:
+        return False
+    print(f"\n📤 [{SEND_POLICY}] {time.strftime('%H:%M:%S')} 準備傳送...")
+    try:
+        send_image_via_uart(processed_img)
+    finally:
+        link_idle.set()
+    return True
+
+
+def local_step():
+    """C'. UART 忙碌時的本機分類 (--local-fallback)"""
+    processed_img = local_q.get(timeout=0.1)
+    if processed_img is None:
+        return False
+    local_sink.classify(processed_img)
+    return True
+
+
+display_frame = np.empty((HEIGHT, WIDTH, 3), dtype=np.uint8)
+
+
+def draw_overlay(rgb_frame, hand_list, boxes):
+    """D. 轉成 BGR 預覽畫面，畫上骨架、框框、狀態與最後一次傳送的縮圖"""
+    frame = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2BGR, dst=display_frame)
+    for hand in hand_list:
+        mp_drawing.draw_landmarks(frame, hand, mp_hands.HAND_CONNECTIONS)
+    for xmin, ymin, xmax, ymax in boxes:
+        cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), (0, 255, 0), 2)
+
+    status = scheduler.status_text(time.time(), not link_idle.is_set())
+    cv2.putText(frame, status, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+
+    # 顯示最後一次傳送的縮圖
+    preview = last_sent_preview
+    if preview is not None:
+        frame[0:64, 0:64] = preview
+        cv2.rectangle(frame, (0,0), (64,64), (0,0,255), 2)
+        cv2.putText(frame, "Sent", (0, 75), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,255), 1)
+    return frame
+
+
+# ===================================================
+# 3. 主程式：啟動各執行緒，主執行緒負責顯示
+# ===================================================
+
+print(f"--- 程式運行中：全程預覽骨架，傳送策略 = {SEND_POLICY} ---")
+
+stages = [
+    Stage("capture", capture_step, stop_event),
+    Stage("landmark", landmark_step, stop_event),
+    Stage("sender", sender_step, stop_event),
+]
+queues = {"frame": frame_q, "display": display_q, "send": send_q}
+if local_sink:
+    stages.append(Stage("local", local_step, stop_event))
+    queues["local"] = local_q
+display_stats = StageStats("display")
+
+
+def pipeline_drained():
+    """來源結束後，等最後一幀處理完、最後一張送完"""
+    captured = stages[0].stats.count
+    handled = stages[1].stats.count + frame_q.dropped
+    return (source_done.is_set() and handled >= captured
+            and send_q.empty() and link_idle.is_set() and local_q.empty())
 
-        cv2.imshow(WINDOW_NAME, frame)
-        
-        key = cv2.waitKey(1) 
-        if key & 0xFF == ord('q'):
-            break
+
+start_time = time.time()
+try:
+    for stage in stages:
+        stage.start()
+
+    next_report = time.time() + STATS_INTERVAL
+    while not stop_event.is_set() and not pipeline_drained():
+        item = display_q.get(timeout=0.1)
+        if item is not None:
+            frame = draw_overlay(*item)
+            cv2.imshow(WINDOW_NAME, frame)
+            display_stats.tick()
+
+        if SHOW_PREVIEW:
+            key = cv2.waitKey(1) 
+            if key & 0xFF == ord('q'):
+                break
+
+        if time.time() >= next_report:
+            print("📊 " + format_report([s.stats for s in stages] + [display_stats], queues))
+            next_report = time.time() + STATS_INTERVAL
 
 except KeyboardInterrupt:
     pass
@@ -183,8 +342,23 @@ except Exception as e:
 
 finally:
     print("\n--- 程式退出中，釋放資源 ---")
-    picam2.stop()
-    cv2.destroyAllWindows()
+    stop_event.set()
+    for stage in stages:
+        stage.join(timeout=2.0)
+
+    # 吞吐量摘要 (搭配檔案來源 + --headless 可當作離線 benchmark)
+    elapsed = max(time.time() - start_time, 1e-6)
+    captured, tracked, sent = (s.stats.count for s in stages[:3])
+    sent_bytes = ser.bytes_written if ser else 0
+    print(f"📊 {elapsed:.1f}s: 擷取 {captured} 幀 ({captured / elapsed:.1f} fps), "
+          f"追蹤 {tracked} 幀 ({tracked / elapsed:.1f} fps), 丟棄 {frame_q.dropped} 幀, "
+          f"傳送 {sent} 張 / {sent_bytes} bytes ({sent_bytes / elapsed / 1024:.1f} KiB/s)")
+    if local_sink:
+        print(f"🧠 UART 忙碌時本機分類 {local_sink.frames} 張")
+
+    source.close()
+    if SHOW_PREVIEW:
+        cv2.destroyAllWindows()
     if ser:
         ser.close()
-    print("✅ 程式已安全退出。")
\ No newline at end of file
+    print("✅ 程式已安全退出。")
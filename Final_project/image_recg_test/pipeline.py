@@ -0,0 +1,95 @@
+import queue
+import threading
+import time
+
+# ===================================================
+# 多執行緒管線輔助工具
+# ===================================================
+
+
+class LatestQueue:
+    """有上限的佇列：滿了就丟掉最舊的一筆，永遠保留最新的資料"""
+
+    def __init__(self, maxsize=1):
+        self._q = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._lock:
+            while True:
+                try:
+                    self._q.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self._q.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout=None):
+        """取出一筆；逾時回傳 None"""
+        try:
+            return self._q.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._q.qsize()
+
+    def empty(self):
+        return self._q.empty()
+
+
+class StageStats:
+    """統計單一階段的處理次數與 FPS (以上次 snapshot 為區間)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self._lock = threading.Lock()
+        self._last_count = 0
+        self._last_time = time.perf_counter()
+
+    def tick(self, n=1):
+        with self._lock:
+            self.count += n
+
+    def snapshot(self):
+        """回傳自上次呼叫以來的 FPS"""
+        with self._lock:
+            now = time.perf_counter()
+            dt = now - self._last_time
+            fps = (self.count - self._last_count) / dt if dt > 0 else 0.0
+            self._last_count = self.count
+            self._last_time = now
+            return fps
+
+
+class Stage(threading.Thread):
+    """背景執行緒：重複呼叫 step() 直到 stop_event 被設定"""
+
+    def __init__(self, name, step, stop_event):
+        super().__init__(name=name, daemon=True)
+        self.step = step
+        self.stop_event = stop_event
+        self.stats = StageStats(name)
+        self.error = None
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.step():
+                    self.stats.tick()
+        except Exception as e:
+            self.error = e
+            print(f"❌ [{self.name}] 執行緒發生錯誤: {e}")
+            self.stop_event.set()
+
+
+def format_report(stats, queues):
+    """組成一行狀態報告：各階段 FPS、佇列深度與丟棄數"""
+    parts = [f"{s.name} {s.snapshot():5.1f} fps" for s in stats]
+    parts += [f"{name} q={q.qsize()} drop={q.dropped}" for name, q in queues.items()]
+    return " | ".join(parts)
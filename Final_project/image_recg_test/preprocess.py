@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+
+# ===================================================
+# 手部裁切 -> 64x64 灰階 (預先配置緩衝區，不在每一幀 new 陣列)
+# ===================================================
+
+
+def resize_and_pad_gray(img, target_size):
+    """轉灰階並保持比例縮放至 target_size，補黑邊 (原本的寫法，每次都配置新陣列)"""
+    if len(img.shape) > 2:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    h, w = img.shape[:2]
+    scale = target_size / max(h, w)
+    new_w, new_h = int(w * scale), int(h * scale)
+
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    canvas = np.zeros((target_size, target_size), dtype=np.uint8)
+
+    x_offset = (target_size - new_w) // 2
+    y_offset = (target_size - new_h) // 2
+
+    canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = resized
+    return canvas
+
+
+class GrayPreprocessor:
+    """只對裁切區 (ROI) 做灰階與縮放，結果寫進預先配置好的 64x64 canvas
+
+    回傳的 canvas 會在下一次 process() 被覆寫；sender 受背壓控制，
+    上一張送完才會再處理下一張，所以可以直接重複使用。
+    """
+
+    def __init__(self, max_width, max_height, target_size=64, color_code=cv2.COLOR_RGB2GRAY):
+        self.target_size = target_size
+        self.color_code = color_code
+        self._gray = np.empty((max_height, max_width), dtype=np.uint8)
+        self.canvas = np.zeros((target_size, target_size), dtype=np.uint8)
+
+    def process(self, roi):
+        """roi: 彩色 (HxWx3/4) 或灰階 (HxW) 的裁切 view"""
+        h, w = roi.shape[:2]
+        if roi.ndim > 2:
+            gray = cv2.cvtColor(roi, self.color_code, dst=self._gray[:h, :w])
+        else:
+            gray = roi
+
+        size = self.target_size
+        scale = size / max(h, w)
+        new_w, new_h = int(w * scale), int(h * scale)
+        x_offset = (size - new_w) // 2
+        y_offset = (size - new_h) // 2
+
+        self.canvas.fill(0)
+        cv2.resize(gray, (new_w, new_h),
+                   dst=self.canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w],
+                   interpolation=cv2.INTER_AREA)
+        return self.canvas
+
+
+# ===================================================
+# Benchmark：原本 RGB->BGR->RGB + 每次 np.zeros 的路徑 vs 目前的路徑
+# ===================================================
+#
+#   python preprocess.py [錄好的影格 .npy 或圖片資料夾]
+#
+# 沒給參數時用隨機產生的 640x480 影格；在 RPi 4 上跑才有代表性。
+
+def _load_frames(path, limit=200):
+    import glob
+    import os
+    if path.endswith(".npy"):
+        return list(np.load(path)[:limit])
+    frames = []
+    for name in sorted(glob.glob(os.path.join(path, "*")))[:limit]:
+        img = cv2.imread(name, cv2.IMREAD_COLOR)
+        if img is not None:
+            frames.append(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+    return frames
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import tracemalloc
+
+    if len(sys.argv) > 1:
+        frames = _load_frames(sys.argv[1])
+    else:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8) for _ in range(30)]
+    h_img, w_img = frames[0].shape[:2]
+    bbox = (w_img // 3, h_img // 4, w_img // 3 + 180, h_img // 4 + 220)
+    xmin, ymin, xmax, ymax = bbox
+
+    def old_path(rgb):
+        frame = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        mp_input = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)   # 給 hands.process
+        crop = frame[ymin:ymax, xmin:xmax]
+        return mp_input, resize_and_pad_gray(crop, 64)
+
+    pre = GrayPreprocessor(w_img, h_img)
+
+    def new_path(rgb):
+        mp_input = rgb                                      # 直接給 hands.process
+        return mp_input, pre.process(rgb[ymin:ymax, xmin:xmax])
+
+    assert np.array_equal(old_path(frames[0])[1], new_path(frames[0])[1])
+
+    for name, fn in (("原本", old_path), ("目前", new_path)):
+        for f in frames[:5]:
+            fn(f)
+        t0 = time.perf_counter()
+        for f in frames:
+            fn(f)
+        dt = (time.perf_counter() - t0) / len(frames)
+
+        # 每幀新配置的記憶體 (numpy 陣列會被 tracemalloc 追蹤到)
+        tracemalloc.start()
+        total = 0
+        for f in frames:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            out = fn(f)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - before
+            del out
+        tracemalloc.stop()
+        print(f"{name}: {dt * 1000:6.2f} ms/frame, 每幀配置約 {total / len(frames) / 1024:7.1f} KiB")
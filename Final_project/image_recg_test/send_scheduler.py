@@ -0,0 +1,91 @@
+import numpy as np
+
+# ===================================================
+# 傳送排程：決定哪一幀要送給 STM32
+# ===================================================
+#
+# 所有策略都受 UART 背壓控制：上一張還在傳 (link_busy) 時一律不送，
+# 所以送出頻率最多就是鏈路能承受的速度。
+#
+#   interval   : 每 interval 秒送一次 (舊行為)；沒偵測到手就在下一幀繼續等
+#   continuous : 只要有手且鏈路空閒就送
+#   stable     : bbox 連續 stable_frames 幀幾乎不動才送 (手勢擺好才送)
+#   change     : 關鍵點相對上次送出時的平均位移超過 change_threshold 才送
+
+POLICIES = ("interval", "continuous", "stable", "change")
+
+
+def _normalize(points, bbox):
+    """把關鍵點換成以 bbox 為單位的座標，消除手離鏡頭遠近的影響"""
+    xmin, ymin, xmax, ymax = bbox
+    scale = max(xmax - xmin, ymax - ymin, 1)
+    return (points - points.min(axis=0)) / scale
+
+
+class SendScheduler:
+    def __init__(self, policy="stable", interval=10.0, stable_frames=5,
+                 stable_tolerance=0.05, change_threshold=0.08):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的傳送策略: {policy} (可用: {', '.join(POLICIES)})")
+        self.policy = policy
+        self.interval = interval
+        self.stable_frames = stable_frames
+        self.stable_tolerance = stable_tolerance
+        self.change_threshold = change_threshold
+
+        self.next_time = None
+        self._prev_bbox = None
+        self._steady = 0
+        self._sent_points = None
+
+    def _update_steady(self, bbox):
+        """bbox 四個邊的位移都小於 tolerance * bbox 大小就算「不動」"""
+        if bbox is None:
+            self._prev_bbox = None
+            self._steady = 0
+            return
+        cur = np.asarray(bbox, dtype=np.float32)
+        if self._prev_bbox is not None:
+            size = max(cur[2] - cur[0], cur[3] - cur[1], 1.0)
+            moved = np.abs(cur - self._prev_bbox).max() / size
+            self._steady = self._steady + 1 if moved <= self.stable_tolerance else 0
+        self._prev_bbox = cur
+
+    def should_send(self, now, bbox, points, link_busy):
+        """每一幀呼叫一次；points 為 (N, 2) 的像素座標，沒偵測到手時 bbox/points 為 None"""
+        if self.next_time is None:
+            self.next_time = now + self.interval
+        self._update_steady(bbox)
+
+        if bbox is None or link_busy:
+            return False
+
+        if self.policy == "interval":
+            return now >= self.next_time
+        if self.policy == "continuous":
+            return True
+        if self.policy == "stable":
+            return self._steady >= self.stable_frames
+        # change
+        if self._sent_points is None:
+            return True
+        cur = _normalize(points, bbox)
+        return float(np.linalg.norm(cur - self._sent_points, axis=1).mean()) >= self.change_threshold
+
+    def mark_sent(self, now, bbox, points):
+        """實際送出後呼叫，重設計時器 / 穩定計數 / 參考關鍵點"""
+        self.next_time = now + self.interval
+        self._steady = 0
+        if points is not None:
+            self._sent_points = _normalize(points, bbox)
+
+    def status_text(self, now, link_busy):
+        """預覽畫面左上角顯示的狀態文字"""
+        if link_busy:
+            return f"[{self.policy}] Sending..."
+        if self.policy == "interval":
+            remaining = max(0.0, (self.next_time or now) - now)
+            return f"Next Send: {remaining:.1f}s"
+        if self.policy == "stable":
+            return f"[stable] steady {min(self._steady, self.stable_frames)}/{self.stable_frames}"
+        return f"[{self.policy}] Ready"
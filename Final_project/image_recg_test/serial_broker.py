@@ -0,0 +1,364 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from sensor_hub import Bus
+
+# ===================================================
+# 序列埠 broker：一個行程獨佔 STM32 的 COM port，把每一行轉發給任意多個本機 client
+# ===================================================
+#
+#   python serial_broker.py COM6                         # 開 broker (預設聽 127.0.0.1:8765)
+#   python gesture_monitor.py --broker                   # 機率長條圖
+#   python PySide6GUI.py --broker 127.0.0.1:8765         # 電梯 GUI
+#   python serial_broker.py --tap -o results.txt         # 紀錄 (也可以 nc 127.0.0.1 8765)
+#   python serial_broker.py --selftest / --bench 3       # pty 迴路測試 / 扇出 benchmark (Linux / macOS)
+#
+# 傳給 client 的就是 STM32 送出的原始行 (去掉 \r，只保留完整的行)：
+# 切行與解碼只在 broker 做一次，同一塊 bytes 直接寫給每個 client；
+# client 端用 BrokerClient：read / readline / in_waiting 跟 pyserial 的 Serial 一樣，原本讀 COM port 的程式不用改；
+# 一次要整批完整的行 (像 QSerialPort 的 canReadLine / readLine) 就用 read_lines。
+#
+# 每個 client 是 sensor_hub.Bus 上的一個有上限的訂閱 (滿了丟最舊的)，
+# 慢的 client 只會丟自己的資料，不會拖慢 broker 或其他 client。
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+class SerialBroker:
+    def __init__(self, ser, host=HOST, port=PORT, maxsize=1000):
+        self.ser = ser
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.bus = Bus()
+        self.clients = {}        # "ip:port" -> Subscription
+        self.lines = 0
+        self.bytes = 0
+        self.running = True
+        self.server = None
+        self._thread = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._thread = threading.Thread(target=self._reader, args=(loop,), daemon=True)
+        self._thread.start()
+        return self.server
+
+    def close(self):
+        """停止讀取執行緒 (最多等一個 read timeout) 再關序列埠"""
+        self.running = False
+        if self._thread is not None:
+            self._thread.join(1.0)
+        if self.server is not None:
+            self.server.close()
+        self.ser.close()
+
+    def _reader(self, loop):
+        """序列埠讀取執行緒：一次讀完緩衝區，完整的行合成一塊 publish 到 event loop"""
+        buf = b""
+        while self.running:
+            try:
+                data = self.ser.read(max(self.ser.in_waiting, 1))
+            except (serial.SerialException, OSError) as e:
+                print(f"⚠️ 序列埠讀取錯誤: {e}")
+                break
+            if not data:
+                continue
+            *lines, buf = (buf + data).split(b"\n")
+            buf = buf[-4096:]                 # 一直沒有換行的亂碼不要無限累積
+            lines = [line.rstrip(b"\r") for line in lines if line.strip()]
+            if lines:
+                block = b"\n".join(lines) + b"\n"
+                self.lines += len(lines)
+                self.bytes += len(block)
+                loop.call_soon_threadsafe(self.bus.publish, "line", block)
+        self.running = False
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        client = f"{peer[0]}:{peer[1]}" if peer else "?"
+        sub = self.bus.subscribe(["line"], self.maxsize)
+        self.clients[client] = sub
+        print(f"🔗 {client} 連上 ({len(self.clients)} 個 client)")
+        closed = asyncio.ensure_future(reader.read())      # client 不會送資料；讀到 EOF 就是斷線
+        try:
+            while not closed.done():
+                get = asyncio.ensure_future(sub.get())
+                await asyncio.wait([get, closed], return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    break
+                chunks = [get.result()]
+                while not sub.queue.empty():
+                    chunks.append(sub.queue.get_nowait())
+                writer.write(b"".join(chunks))
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            closed.cancel()
+            self.bus.unsubscribe(sub)
+            del self.clients[client]
+            writer.close()
+            print(f"🔌 {client} 離開 (丟掉 {sub.dropped} 塊)，剩 {len(self.clients)} 個 client")
+
+    def report(self, dt, last_lines):
+        rate = (self.lines - last_lines) / dt
+        dropped = sum(s.dropped for s in self.clients.values())
+        return f"📈 {rate:7.1f} 行/秒，{len(self.clients)} 個 client，慢 client 丟掉 {dropped} 塊"
+
+
+class BrokerClient:
+    """連到 broker 的 client，介面跟 pyserial.Serial 相同 (read / readline / in_waiting / close)
+
+    一次 recv 盡量多讀，放在自己的緩衝區；pyserial 的 socket:// 的 in_waiting 最多只回報 1，
+    用 read(max(in_waiting, 1)) 的讀法會變成一次一個 byte。
+    """
+
+    def __init__(self, address=f"{HOST}:{PORT}", timeout=0.1):
+        host, port = address.rsplit(":", 1)
+        self.sock = socket.create_connection((host, int(port)), timeout=5.0)
+        self.sock.settimeout(timeout)
+        self.buf = bytearray()
+
+    @property
+    def in_waiting(self):
+        return len(self.buf)
+
+    def _fill(self):
+        try:
+            data = self.sock.recv(65536)
+        except socket.timeout:
+            return False
+        if not data:
+            raise serial.SerialException("broker 關閉了連線")
+        self.buf += data
+        return True
+
+    def read(self, size=1):
+        """有資料就馬上回傳 (最多 size bytes)，timeout 內都沒有資料回傳 b"""""
+        if not self.buf:
+            self._fill()
+        out = bytes(self.buf[:size])
+        del self.buf[:size]
+        return out
+
+    def readline(self):
+        while b"\n" not in self.buf:
+            if not self._fill():
+                break
+        end = self.buf.find(b"\n") + 1 or len(self.buf)
+        out = bytes(self.buf[:end])
+        del self.buf[:end]
+        return out
+
+    def read_lines(self):
+        """緩衝區裡沒有完整的行就等一次 (最多 timeout)；回傳所有完整的行 (不含 \\n)，不完整的留到下次"""
+        if b"\n" not in self.buf:
+            self._fill()
+        end = self.buf.rfind(b"\n") + 1
+        out = bytes(self.buf[:end])
+        del self.buf[:end]
+        return out.splitlines()
+
+    def close(self):
+        self.sock.close()
+
+
+async def serve(args):
+    ser = serial.serial_for_url(args.port, args.baud, timeout=0.1)
+    host, port = args.listen.rsplit(":", 1)
+    broker = SerialBroker(ser, host, int(port))
+    await broker.start()
+    print(f"📡 {args.port} -> {host}:{broker.port} (Ctrl+C 停止)")
+    last = broker.lines
+    try:
+        while broker.running:
+            await asyncio.sleep(args.interval)
+            print(broker.report(args.interval, last))
+            last = broker.lines
+    finally:
+        broker.close()
+
+
+def tap(args):
+    """最簡單的 client：印出或寫檔 (紀錄用)"""
+    ser = BrokerClient(args.listen, timeout=1.0)
+    out = open(args.output, "ab") if args.output else None
+    print(f"👂 {args.listen}" + (f" -> {args.output}" if out else ""))
+    try:
+        while True:
+            line = ser.readline()
+            if not line:
+                continue
+            if out is not None:
+                out.write(line)
+                out.flush()
+            else:
+                print(line.decode(errors="replace").rstrip())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not None:
+            out.close()
+
+
+# ===================================================
+# pty 迴路測試 / 扇出 benchmark
+# ===================================================
+#
+# pty 的 slave 端當成 STM32 的序列埠給 broker 開；另一個行程寫 master 端並開 N 個 client。
+# 測試行是 "seq,0.1,0.8,0.1"：client 用 seq 對回送出時間算延遲，也能檢查順序。
+
+def _open_pty():
+    import tty
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    return master, slave, os.ttyname(slave)
+
+
+async def _clients(master, port, n_clients, rate, seconds, lines_per_write=64):
+    conns = [await asyncio.open_connection(HOST, port) for _ in range(n_clients)]
+    await asyncio.sleep(0.3)                   # 等 broker 把訂閱建好
+    sent = []
+    results = [{"lines": 0, "lat": [], "in_order": True, "last": -1} for _ in conns]
+
+    async def consume(reader, res):
+        buf = b""
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            t = time.time()
+            *lines, buf = (buf + data).split(b"\n")
+            if not lines:
+                continue
+            res["lines"] += len(lines)
+            first, last = int(lines[0].split(b",", 1)[0]), int(lines[-1].split(b",", 1)[0])
+            if first != res["last"] + 1 or last - first != len(lines) - 1:
+                res["in_order"] = False
+            res["last"] = last
+            res["lat"].append(t - sent[last])
+
+    def writer():
+        period = lines_per_write / rate if rate else 0.0
+        t_next = time.perf_counter()
+        t_end = t_next + seconds
+        while time.perf_counter() < t_end:
+            k = len(sent)
+            block = b"".join(b"%d,0.100000,0.800000,0.100000\r\n" % (k + i) for i in range(lines_per_write))
+            now = time.time()
+            sent.extend([now] * lines_per_write)
+            view = memoryview(block)
+            while view:
+                view = view[os.write(master, view):]
+            if period:
+                t_next += period
+                time.sleep(max(t_next - time.perf_counter(), 0))
+
+    tasks = [asyncio.ensure_future(consume(r, res)) for (r, _), res in zip(conns, results)]
+    await asyncio.get_running_loop().run_in_executor(None, writer)
+    await asyncio.sleep(1.0)
+    for _, w in conns:
+        w.close()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for res in results:
+        res["lat"] = np.array(res["lat"])
+    return len(sent), results
+
+
+def _client_process(master, port, n_clients, rate, seconds, out):
+    out.put(asyncio.run(_clients(master, port, n_clients, rate, seconds)))
+
+
+async def _run_pty(n_clients, rate, seconds, maxsize=1000):
+    master, slave, path = _open_pty()
+    ser = serial.serial_for_url(path, timeout=0.1)
+    broker = SerialBroker(ser, HOST, 0, maxsize=maxsize)
+    await broker.start()
+    out = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_client_process, daemon=True,
+                                   args=(master, broker.port, n_clients, rate, seconds, out))
+    c0 = time.process_time()
+    proc.start()
+    n_sent, results = await asyncio.get_running_loop().run_in_executor(None, out.get)
+    cpu = time.process_time() - c0
+    proc.join()
+    broker.close()
+    os.close(master)
+    os.close(slave)
+    return n_sent, results, cpu, broker
+
+
+def selftest():
+    import builtins
+    quiet = builtins.print
+    builtins.print = lambda *a, **k: None            # 不要連線訊息
+    try:
+        n_sent, results, _, broker = asyncio.run(_run_pty(3, 20000, 1.0))
+    finally:
+        builtins.print = quiet
+    assert broker.lines == n_sent, (broker.lines, n_sent)
+    for k, res in enumerate(results):
+        assert res["lines"] == n_sent and res["in_order"], (k, res["lines"], n_sent)
+    print(f"✅ pty -> broker -> 3 個 client：{n_sent} 行全部依序收到")
+
+
+def bench(seconds):
+    import builtins
+    quiet = builtins.print
+    rows = []
+    for rate in (1000, 0):
+        for n in (1, 4, 16, 64):
+            builtins.print = lambda *a, **k: None
+            try:
+                n_sent, results, cpu, broker = asyncio.run(_run_pty(n, rate, seconds))
+            finally:
+                builtins.print = quiet
+            got = np.array([r["lines"] for r in results])
+            lat = np.concatenate([r["lat"] for r in results])
+            p50, p99 = np.percentile(lat, [50, 99]) * 1e3 if len(lat) else (np.nan, np.nan)
+            label = f"{rate} 行/秒" if rate else "全速"
+            print(f"{label:>9} x {n:2d} client：broker 讀 {broker.lines / seconds:8.0f} 行/秒，"
+                  f"轉發 {got.sum() / seconds:9.0f} 行/秒，每個 client 最少收到 {got.min() / max(n_sent, 1):6.1%}，"
+                  f"延遲 p50 {p50:6.2f} / p99 {p99:7.2f} ms，broker CPU {cpu / seconds * 100:5.1f}%")
+            rows.append((rate, n, got.sum() / seconds))
+    return rows
+
+
+parser = argparse.ArgumentParser(description="獨佔 STM32 序列埠，轉發每一行給多個本機 client")
+parser.add_argument("port", nargs="?", default="COM6", help="序列埠 (也可以是 pyserial URL)")
+parser.add_argument("--baud", type=int, default=115200)
+parser.add_argument("--listen", default=f"{HOST}:{PORT}", help="client 連線的位址")
+parser.add_argument("--interval", type=float, default=10.0, help="統計輸出間隔 (秒)")
+parser.add_argument("--tap", action="store_true", help="當 client：印出收到的行 (或 -o 寫檔)")
+parser.add_argument("-o", "--output", help="--tap 時附加寫到這個檔案")
+parser.add_argument("--selftest", action="store_true", help="pty 迴路測試")
+parser.add_argument("--bench", type=float, metavar="SEC", help="扇出 benchmark，每個情境 SEC 秒")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.selftest:
+        selftest()
+    elif args.bench:
+        bench(args.bench)
+    elif args.tap:
+        tap(args)
+    else:
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
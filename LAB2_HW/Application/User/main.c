@@ -24,6 +24,11 @@
 static uint8_t RemoteIP[] = {172,20,10,12};
 #define RemotePORT  8002
 
+/* 0 = 文字行 "ACC XYZ = [..]  GYRO dps = [..]" (預設)
+ * 1 = 每筆 24-byte 二進位紀錄 (格式見 common/telemetry.py 的 RECORD_DTYPE)，
+ *     server 以連線的第一個 byte (0xA5) 自動判斷，不會送 "STM32 : Panda!" 文字 */
+#define TELEMETRY_BINARY     0
+
 #define WIFI_WRITE_TIMEOUT   10000
 #define WIFI_READ_TIMEOUT    10000
 #define CONNECTION_TRIAL_MAX 10
@@ -77,6 +82,40 @@ static volatile uint8_t btn_pressed = 0;
 static volatile uint8_t smd_event   = 0;
 #endif
 
+#if (Question==basic) && TELEMETRY_BINARY
+/* 二進位紀錄：magic 0xA5 0x5A, seq, tick(ms), acc[3], gyro[3] (0.01 dps, INT16_MIN = NA), crc32 */
+typedef struct __attribute__((packed)) {
+  uint8_t  magic[2];
+  uint16_t seq;
+  uint32_t tick;
+  int16_t  acc[3];
+  int16_t  gyro[3];
+  uint32_t crc;
+} TelemetryRecord;
+
+static uint16_t telemetry_seq = 0;
+
+/* CRC32 (IEEE 802.3，與 Python zlib.crc32 相同) */
+static uint32_t telemetry_crc32(const uint8_t *buf, uint32_t len)
+{
+  uint32_t crc = 0xFFFFFFFFu;
+  for (uint32_t i = 0; i < len; i++) {
+    crc ^= buf[i];
+    for (int b = 0; b < 8; b++)
+      crc = (crc >> 1) ^ (0xEDB88320u & (0u - (crc & 1u)));
+  }
+  return ~crc;
+}
+
+static int16_t gyro_centi_dps(float v)
+{
+  float c = v * 100.0f;
+  if (c > 32767.0f)  c = 32767.0f;
+  if (c < -32767.0f) c = -32767.0f;
+  return (int16_t)(c >= 0 ? c + 0.5f : c - 0.5f);
+}
+#endif
+
 /* Prototypes */
 #if defined (TERMINAL_USE)
 #ifdef __GNUC__
@@ -249,6 +288,7 @@ int main(void)
     if (btn_pressed) {
       btn_pressed = 0;
 
+#if !TELEMETRY_BINARY
       uint16_t slen = 0;
       if (WIFI_SendData(Socket, TxData, strlen((char*)TxData),
                         &slen, WIFI_WRITE_TIMEOUT) != WIFI_STATUS_OK) {
@@ -259,6 +299,7 @@ int main(void)
       } else {
         TERMOUT("TX (%u): %s\r\n", slen, TxData);
       }
+#endif
 
       int16_t pDataXYZ[3];
       BSP_ACCELERO_AccGetXYZ(pDataXYZ);
@@ -266,6 +307,20 @@ int main(void)
       float gxf=0, gyf=0, gzf=0;
       int gyro_ok = (LSM6DSL_Gyro_GetXYZ(&gxf, &gyf, &gzf) == 0);
 
+#if TELEMETRY_BINARY
+      TelemetryRecord rec;
+      rec.magic[0] = 0xA5;
+      rec.magic[1] = 0x5A;
+      rec.seq  = telemetry_seq++;
+      rec.tick = HAL_GetTick();
+      for (int i = 0; i < 3; i++) rec.acc[i] = pDataXYZ[i];
+      rec.gyro[0] = gyro_ok ? gyro_centi_dps(gxf) : INT16_MIN;
+      rec.gyro[1] = gyro_ok ? gyro_centi_dps(gyf) : INT16_MIN;
+      rec.gyro[2] = gyro_ok ? gyro_centi_dps(gzf) : INT16_MIN;
+      rec.crc = telemetry_crc32((const uint8_t*)&rec, sizeof(rec) - 4);
+      const uint8_t *line2 = (const uint8_t*)&rec;
+      const uint16_t line2_len = sizeof(rec);
+#else
       char line2[160];
       if (gyro_ok) {
         snprintf(line2, sizeof(line2),
@@ -276,16 +331,22 @@ int main(void)
                  "ACC XYZ = [%d, %d, %d]  GYRO dps = [NA, NA, NA]\n",
                  pDataXYZ[0], pDataXYZ[1], pDataXYZ[2]);
       }
+      const uint16_t line2_len = (uint16_t)strlen(line2);
+#endif
 
       uint16_t slen2 = 0;
-      if (WIFI_SendData(Socket, (uint8_t*)line2, (uint16_t)strlen(line2),
+      if (WIFI_SendData(Socket, (uint8_t*)line2, line2_len,
                         &slen2, WIFI_WRITE_TIMEOUT) != WIFI_STATUS_OK) {
         TERMOUT("> WARN : ACC+GYRO send failed, will reconnect\r\n");
         WIFI_CloseClientConnection(0);
         Socket = -1;
         continue;
       } else {
+#if TELEMETRY_BINARY
+        TERMOUT("TX record #%u (%u bytes)\r\n", (unsigned)rec.seq, slen2);
+#else
         TERMOUT("%s", line2);
+#endif
       }
     }
 
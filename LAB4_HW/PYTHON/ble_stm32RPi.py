@@ -1,10 +1,17 @@
-from bluepy.btle import Peripheral, DefaultDelegate, Scanner, UUID
+from bluepy.btle import UUID, BTLEException
+from collections import deque
+import os
+import queue
 import time
 import sys
-import select
 import tty
 import termios
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from ble_batch import is_batch, iter_batch, decode_legacy, TICK_MS
+from ble_cache import connect_cached, set_cccd
+from ble_worker import BleWorker, KeyReader, LatencyStats
+
 TARGET_NAME = "BlueNRG"
 
 target_char_uuids = [
@@ -15,19 +22,19 @@ target_char_uuids = [
 
 write_char_uuid = UUID("56780000-0001-11E1-AC36-0002A5D5C51B")
 
-class MyDelegate(DefaultDelegate):
-    def __init__(self):
-        DefaultDelegate.__init__(self)
-    def handleNotification(self, cHandle, data):
-        if len(data) >= 2:
-            value = int.from_bytes(data, byteorder='little', signed=True)
-            print(f"📥 Notification from handle {cHandle}: {value}")
-        else:
-            print(f"📥 Notification from handle {cHandle}: {data}")
-
-def is_key_pressed(timeout=0.1):
-    dr, _, _ = select.select([sys.stdin], [], [], timeout)
-    return dr
+def show_notification(cHandle, data):
+    # 批次封包：一次帶多筆 (tick, x, y, z)；否則退回舊的單值格式
+    if is_batch(data):
+        for tick, x, y, z in iter_batch(data):
+            print(f"📥 Notification from handle {cHandle}: t={tick * TICK_MS} ms  X={x} Y={y} Z={z}")
+        return
+    value = decode_legacy(data)
+    if value is None:
+        print(f"📥 Notification from handle {cHandle}: {data}")
+    elif value[0] is None:
+        print(f"📥 Notification from handle {cHandle}: {value[1]}")
+    else:
+        print(f"📥 Notification from handle {cHandle}: t={value[0] * TICK_MS} ms  {value[1]}")
 
 def enable_raw_mode():
     fd = sys.stdin.fileno()
@@ -38,84 +45,105 @@ def enable_raw_mode():
 def restore_terminal(fd, old_settings):
     termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
-def toggle_notify(dev, char, enable=True):
+def toggle_notify(dev, uuid, enable=True):
     try:
-        cccd = char.getDescriptors(forUUID=0x2902)[0]
-        val = b'\x01\x00' if enable else b'\x00\x00'
-        dev.writeCharacteristic(cccd.handle, val, withResponse=True)
-        print(f"{'✅ 開啟' if enable else '⏸️ 暫停'} Notify: {char.uuid}")
+        set_cccd(dev, handles[str(uuid)]["cccd"], 1 if enable else 0)
+        print(f"{'✅ 開啟' if enable else '⏸️ 暫停'} Notify: {uuid}")
     except Exception as e:
         print(f"⚠️ 切換通知時出錯: {e}")
 
-# BLE 掃描與連線
-scanner = Scanner()
-print("🔍 掃描裝置中...")
-devices = scanner.scan(5.0)
-
-target_addr = None
-for dev in devices:
-    for (adtype, desc, value) in dev.getScanData():
-        if desc == "Complete Local Name" and value == TARGET_NAME:
-            target_addr = dev.addr
-            print(f"✅ 找到 {TARGET_NAME}，MAC = {target_addr}")
-            break
-    if target_addr:
-        break
-
-if not target_addr:
-    print("❌ 找不到裝置")
-    sys.exit(1)
+def parse_hex_input(hex_input):
+    if not all(c in "0123456789ABCDEFabcdef" for c in hex_input):
+        raise ValueError("❌ 包含無效字元")
+    if len(hex_input) != 4:
+        raise ValueError("❌ 請輸入 2 個位元組（4 個 16 進位字元）")
+    return bytes.fromhex(hex_input)
 
+# BLE 連線：有快取就直接用快取的位址與 handle，不必掃描與探索 GATT (見 common/ble_cache.py)
+print("🔍 連線中...")
+t0 = time.perf_counter()
 try:
-    dev = Peripheral(target_addr, 'random')
-    dev.setDelegate(MyDelegate())
-
-    notify_chars = []
-    write_char = None
+    dev, handles, source = connect_cached(TARGET_NAME, target_char_uuids + [write_char_uuid])
+except BTLEException as e:
+    print(f"❌ 找不到裝置或連線失敗: {e}")
+    sys.exit(1)
+how = {"cache": "使用快取", "rediscover": "快取失效，已重新探索", "scan": "掃描 + 探索，已寫入快取"}[source]
+print(f"✅ 已連線 {TARGET_NAME}，MAC = {dev.addr}（{how}，{time.perf_counter() - t0:.2f} 秒）")
+
+# 事件驅動：BLE I/O 執行緒與鍵盤執行緒都把事件放進 events，主迴圈只負責處理
+events = queue.SimpleQueue()
+latency = LatencyStats()
+held = deque(maxlen=1000)   # 輸入 16 進位值期間收到的通知，輸入完再印出
+line = None                 # None = 一般模式；字串 = 正在輸入的 16 進位值
+worker = None
+fd = None
+try:
+    write_handle = handles[str(write_char_uuid)]["value"]
 
     print("🔗 已連線，啟用通知中...")
-    for svc in dev.getServices():
-        for char in dev.getCharacteristics(startHnd=svc.hndStart, endHnd=svc.hndEnd):
-            if char.uuid in target_char_uuids:
-                toggle_notify(dev, char, True)
-                notify_chars.append(char)
-            if char.uuid == write_char_uuid:
-                write_char = char
-
-    if not write_char:
-        raise Exception("❌ 找不到可寫入的 characteristic")
-
-    print("📡 等待通知中，按 F 輸入 16 進制值（會暫停通知），Ctrl+C 離開\n")
+    for uuid in target_char_uuids:
+        toggle_notify(dev, uuid, True)
 
+    worker = BleWorker(dev, events)
+    worker.start()
     fd, old_settings = enable_raw_mode()
+    KeyReader(events).start()
 
-    while True:
-        if is_key_pressed():
-            key = sys.stdin.read(1)
-            if key.lower() == 'f':
-                # 暫停所有通知
-                for c in notify_chars:
-                    toggle_notify(dev, c, False)
+    print("📡 等待通知中，按 F 輸入 16 進制值（通知不會中斷，Enter 送出、Esc 取消），Ctrl+C 離開\n")
 
+    while True:
+        ev = events.get()
+        kind = ev[0]
+
+        if kind == "notify":
+            _, cHandle, data, t_arrive = ev
+            latency.add(time.perf_counter() - t_arrive)
+            if line is None:
+                show_notification(cHandle, data)
+            else:
+                held.append((cHandle, data))
+
+        elif kind == "key":
+            ch = ev[1]
+            if line is None:
+                if ch.lower() == 'f':
+                    line = ""
+                    print("📝 請輸入要寫入的 16 進位值（例如 1A2B）：", end="", flush=True)
+                continue
+            if ch in ("\n", "\r"):
+                print()
                 try:
-                    hex_input = input("📝 請輸入要寫入的 16 進位值（例如 1A2B）：").strip()
-                    if not all(c in "0123456789ABCDEFabcdef" for c in hex_input):
-                        raise ValueError("❌ 包含無效字元")
-                    if len(hex_input) != 4:
-                        raise ValueError("❌ 請輸入 2 個位元組（4 個 16 進位字元）")
-
-                    data = bytes.fromhex(hex_input)
-                    write_char.write(data, withResponse=True)
-                    print(f"✅ 已寫入 0x{hex_input.upper()}，原始位元組：{data.hex(' ')}")
-                except Exception as e:
+                    data = parse_hex_input(line.strip())
+                    worker.write(write_handle, data)    # 在 I/O 執行緒送出，不必暫停通知
+                except ValueError as e:
                     print(f"⚠️ 輸入或寫入錯誤：{e}")
-
-                # 恢復通知
-                for c in notify_chars:
-                    toggle_notify(dev, c, True)
-        else :
-            if dev.waitForNotifications(0.3):
-                continue
+                line = None
+            elif ch == "\x1b":
+                print("\n↩️ 取消輸入")
+                line = None
+            elif ch in ("\x7f", "\b"):
+                if line:
+                    line = line[:-1]
+                    print("\b \b", end="", flush=True)
+            else:
+                line += ch
+                print(ch, end="", flush=True)
+            if line is None:
+                if held:
+                    print(f"📦 輸入期間收到 {len(held)} 筆通知：")
+                while held:
+                    show_notification(*held.popleft())
+
+        elif kind == "done":
+            _, tag, result, error = ev
+            if error is not None:
+                print(f"⚠️ 輸入或寫入錯誤：{error}")
+            else:
+                data = tag[2]
+                print(f"✅ 已寫入 0x{data.hex().upper()}，原始位元組：{data.hex(' ')}")
+
+        elif kind == "error":
+            raise ev[1]
 
 except KeyboardInterrupt:
     print("\n🛑 使用者中斷")
@@ -124,6 +152,11 @@ except Exception as e:
     print(f"❌ 發生錯誤: {e}")
 
 finally:
-    restore_terminal(fd, old_settings)
+    if fd is not None:
+        restore_terminal(fd, old_settings)
+    if worker is not None:
+        worker.stop()
+        worker.join(timeout=1.0)
+    print(f"📊 通知 -> 處理延遲: {latency.summary()}")
     dev.disconnect()
     print("🔌 已斷線")
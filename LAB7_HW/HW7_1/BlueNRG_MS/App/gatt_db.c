@@ -109,12 +109,21 @@ tBleStatus Add_HWServW2ST_Service(void)
   COPY_ACC_GYRO_MAG_W2ST_CHAR_UUID(uuid);
   uuid[14] = 0x11;
   BLUENRG_memcpy(&char_uuid.Char_UUID_128, uuid, 16);
+#if ACC_BATCH_SAMPLES > 0
+  ret = aci_gatt_add_char(HWServW2STHandle, UUID_TYPE_128, char_uuid.Char_UUID_128,
+                          ACC_BATCH_HEADER + ACC_BATCH_SAMPLE * ACC_BATCH_SAMPLES,
+                          CHAR_PROP_NOTIFY | CHAR_PROP_READ,
+                          ATTR_PERMISSION_NONE,
+                          GATT_NOTIFY_READ_REQ_AND_WAIT_FOR_APPL_RESP,
+                          16, 1, &AccXCharHandle);
+#else
   ret = aci_gatt_add_char(HWServW2STHandle, UUID_TYPE_128, char_uuid.Char_UUID_128,
                           2 + 2,
                           CHAR_PROP_NOTIFY | CHAR_PROP_READ,
                           ATTR_PERMISSION_NONE,
                           GATT_NOTIFY_READ_REQ_AND_WAIT_FOR_APPL_RESP,
                           16, 0, &AccXCharHandle);
+#endif
   if (ret != BLE_STATUS_SUCCESS)
     return BLE_STATUS_ERROR;
 
@@ -367,6 +376,36 @@ tBleStatus Add_MVACC_Service(void)
  * @param  AxesRaw_t structure containing acceleration value in mg.
  * @retval tBleStatus Status
  */
+#if ACC_BATCH_SAMPLES > 0
+tBleStatus Acc_Update(AxesRaw_t *x_axes, AxesRaw_t *g_axes, AxesRaw_t *m_axes)
+{
+  static uint8_t batch[ACC_BATCH_HEADER + ACC_BATCH_SAMPLE * ACC_BATCH_SAMPLES];
+  static uint8_t count = 0;
+  static uint16_t seq = 0;
+  uint8_t *p = batch + ACC_BATCH_HEADER + ACC_BATCH_SAMPLE * count;
+  tBleStatus ret;
+
+  /* 先存進批次緩衝區，湊滿 ACC_BATCH_SAMPLES 筆才送一次 notification */
+  HOST_TO_LE_16(p, HAL_GetTick()>>3);
+  HOST_TO_LE_16(p+2, accx);
+  HOST_TO_LE_16(p+4, accy);
+  HOST_TO_LE_16(p+6, accz);
+  if (++count < ACC_BATCH_SAMPLES)
+    return BLE_STATUS_SUCCESS;
+
+  batch[0] = ACC_BATCH_MAGIC;
+  batch[1] = count;
+  HOST_TO_LE_16(batch+2, seq);
+  seq++;
+  count = 0;
+  ret = aci_gatt_update_char_value(HWServW2STHandle, AccXCharHandle, 0, sizeof(batch), batch);
+  if (ret != BLE_STATUS_SUCCESS){
+      PRINTF("Error while updating Acceleration batch characteristic: 0x%02X\n",ret) ;
+      return BLE_STATUS_ERROR ;
+  }
+  return BLE_STATUS_SUCCESS;
+}
+#else
 tBleStatus Acc_Update(AxesRaw_t *x_axes, AxesRaw_t *g_axes, AxesRaw_t *m_axes)
 {
   uint8_t buff[2+2];
@@ -396,6 +435,7 @@ tBleStatus Acc_Update(AxesRaw_t *x_axes, AxesRaw_t *g_axes, AxesRaw_t *m_axes)
 
   return BLE_STATUS_SUCCESS;
 }
+#endif
 
 
 tBleStatus MVAcc_Update(void)
@@ -27,6 +27,19 @@
 #define Y_OFFSET 50
 #define Z_OFFSET 1000
 
+/**
+ * @brief 批次通知：一個 notification 帶 N 筆 (時間戳, X, Y, Z)
+ *        0 = 原本的格式 (X/Y/Z 各一個 characteristic，每次一個值)
+ *        N > 0 時 X 軸 characteristic 改送批次封包 (格式見 common/ble_batch.py)：
+ *          header  : magic(0xB5) u8, count u8, seq u16
+ *          sample  : tick(HAL_GetTick()>>3) u16, x i16, y i16, z i16
+ *        預設 ATT_MTU 23 最多 20 bytes，N = 2 剛好放得下
+ */
+#define ACC_BATCH_SAMPLES 0
+#define ACC_BATCH_MAGIC   0xB5
+#define ACC_BATCH_HEADER  4
+#define ACC_BATCH_SAMPLE  8
+
 /**
  * @brief Number of application services
  */
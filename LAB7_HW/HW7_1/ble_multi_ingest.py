@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import time
+
+import numpy as np
+from bleak import BleakScanner, BleakClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from ble_batch import CHANNEL_NAMES, MVDATA_CHAR_UUIDS, ORIDATA_CHAR_UUIDS, NotificationDecoder
+from sample_ring import SampleCollector
+from recorder import Recorder
+
+# ===================================================
+# 多台 BlueNRG 同時接收 (asyncio + bleak)
+# ===================================================
+#
+#   python ble_multi_ingest.py                     # 一直收，定期印出統計
+#   python ble_multi_ingest.py --record rec/       # 所有裝置的樣本 (時間、MAC、channel) 錄到 rec/
+#   python ble_multi_ingest.py --max-devices 4 --rescan 30
+#
+# 每台裝置一個 task：斷線只會重連自己，不會卡住其他裝置；
+# 掃描也在背景定期進行，新出現的板子會自動加入。
+
+TARGET_NAME = "BlueNRG"
+
+oridata_char_uuids, MVdata_char_uuids = ORIDATA_CHAR_UUIDS, MVDATA_CHAR_UUIDS
+ALL_UUIDS = [u.lower() for u in oridata_char_uuids + MVdata_char_uuids]
+
+parser = argparse.ArgumentParser(description="同時連線多台 BlueNRG 並接收加速度資料")
+parser.add_argument("--name", default=TARGET_NAME, help="裝置名稱")
+parser.add_argument("--max-devices", type=int, default=0, help="最多連幾台 (0 = 不限)")
+parser.add_argument("--scan-timeout", type=float, default=5.0)
+parser.add_argument("--rescan", type=float, default=20.0, help="每隔幾秒重新掃描新裝置")
+parser.add_argument("--capacity", type=int, default=10000, help="記憶體中每台每軸保留的筆數")
+parser.add_argument("--record", metavar="DIR",
+                    help="所有裝置的樣本錄到 DIR (分段 .npy，recorder.Recording 讀回)")
+parser.add_argument("--interval", type=float, default=5.0, help="統計輸出間隔 (秒)")
+parser.add_argument("--retry-max", type=float, default=30.0, help="重連等待時間上限 (秒)")
+
+
+class DeviceSession:
+    """一台裝置：連線、訂閱、重連，樣本以 (MAC, uuid) 標記存進自己的 collector"""
+
+    def __init__(self, address, args, stop, recorder=None):
+        self.address = address
+        self.args = args
+        self.stop = stop
+        self.recorder = recorder
+        self.collector = SampleCollector(ALL_UUIDS, capacity=args.capacity)
+        self.decoders = {u: NotificationDecoder() for u in ALL_UUIDS}
+        self.state = "idle"
+        self.connects = 0
+        self.errors = 0
+        self._last_samples = 0
+
+    # ---------- 資料 ----------
+
+    def _handler(self, axis_uuids):
+        def inner(sender, data):
+            t = time.perf_counter()
+            uuid_str = str(sender.uuid).lower()
+            result = self.decoders[uuid_str].decode(data)
+            if result is None:
+                return
+            kind, payload = result
+            if kind == "batch":
+                channels = [(u, payload[axis]) for u, axis in zip(axis_uuids, "xyz")]
+            else:
+                channels = [(uuid_str, payload[1])]
+            now = time.time() if self.recorder is not None else None
+            for u, values in channels:
+                self.collector.add(u, values, t)
+                if now is not None:
+                    self.recorder.append(self.address, CHANNEL_NAMES[u], now, np.atleast_1d(values))
+        return inner
+
+    # 統計一律以 XYZ 組數計：批次封包一筆就是一組；舊格式每個軸各 notify 一次，
+    # 三個軸的值才算一組，兩種格式的 samples/s 才能直接比較
+    @staticmethod
+    def _xyz(batch, legacy):
+        return batch + legacy / 3
+
+    @property
+    def samples(self):
+        ds = self.decoders.values()
+        return int(self._xyz(sum(d.samples - d.legacy for d in ds), sum(d.legacy for d in ds)))
+
+    @property
+    def drop_rate(self):
+        ds = self.decoders.values()
+        lost = self._xyz(sum(d.lost_samples - d.lost_legacy for d in ds), sum(d.lost_legacy for d in ds))
+        total = self._xyz(sum(d.samples - d.legacy for d in ds), sum(d.legacy for d in ds)) + lost
+        return lost / total if total else 0.0
+
+    def take_rate(self, dt):
+        n = self.samples
+        rate = (n - self._last_samples) / dt
+        self._last_samples = n
+        return rate
+
+    # ---------- 連線 ----------
+
+    async def run(self):
+        delay = 1.0
+        while not self.stop.is_set():
+            disconnected = asyncio.Event()
+            try:
+                self.state = "connecting"
+                async with BleakClient(self.address,
+                                       disconnected_callback=lambda c: disconnected.set()) as client:
+                    self.connects += 1
+                    for d in self.decoders.values():
+                        d.resync()
+                    ori = [u.lower() for u in oridata_char_uuids]
+                    mv = [u.lower() for u in MVdata_char_uuids]
+                    for u in oridata_char_uuids:
+                        await client.start_notify(u, self._handler(ori))
+                    for u in MVdata_char_uuids:
+                        await client.start_notify(u, self._handler(mv))
+                    self.state = "streaming"
+                    print(f"🔗 {self.address} 已連線 (第 {self.connects} 次)")
+                    delay = 1.0
+                    await _wait_any(disconnected, self.stop)
+                    if self.stop.is_set() and client.is_connected:
+                        for u in oridata_char_uuids + MVdata_char_uuids:
+                            await client.stop_notify(u)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"⚠️ {self.address}: {e}")
+            if self.stop.is_set():
+                break
+            # 指數退避，只影響這台裝置
+            self.state = f"retry {delay:.0f}s"
+            print(f"🔌 {self.address} 斷線，{delay:.0f} 秒後重連")
+            try:
+                await asyncio.wait_for(self.stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.args.retry_max)
+        self.state = "stopped"
+        self.collector.close()
+
+
+async def _wait_any(*events):
+    tasks = [asyncio.ensure_future(e.wait()) for e in events]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+async def discover_loop(args, sessions, tasks, stop, recorder=None):
+    while not stop.is_set():
+        if not args.max_devices or len(sessions) < args.max_devices:
+            print("🔍 掃描裝置中...")
+            try:
+                devices = await BleakScanner.discover(timeout=args.scan_timeout)
+            except Exception as e:
+                print(f"⚠️ 掃描失敗: {e}")
+                devices = []
+            for d in devices:
+                if d.name != args.name or d.address in sessions:
+                    continue
+                if args.max_devices and len(sessions) >= args.max_devices:
+                    break
+                print(f"✅ 找到 {args.name}，MAC = {d.address}")
+                session = DeviceSession(d.address, args, stop, recorder)
+                sessions[d.address] = session
+                tasks.append(asyncio.ensure_future(session.run()))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=args.rescan)
+        except asyncio.TimeoutError:
+            pass
+
+
+def format_report(sessions, dt):
+    lines = []
+    total = 0.0
+    for addr, s in sessions.items():
+        rate = s.take_rate(dt)
+        total += rate
+        lines.append(f"   {addr}  {s.state:<11} {rate:7.1f} XYZ/s  "
+                     f"掉包 {s.drop_rate:6.2%}  重連 {max(s.connects - 1, 0)}  錯誤 {s.errors}")
+    return "\n".join([f"📈 {len(sessions)} 台裝置，總計 {total:.1f} XYZ/s"] + lines)
+
+
+async def report_loop(args, sessions, stop):
+    last = time.perf_counter()
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=args.interval)
+        except asyncio.TimeoutError:
+            pass
+        now = time.perf_counter()
+        if sessions:
+            print(format_report(sessions, now - last))
+        last = now
+
+
+async def main(args):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    signal.signal(signal.SIGINT, lambda sig, frame: loop.call_soon_threadsafe(stop.set))
+
+    sessions = {}
+    tasks = []
+    recorder = Recorder(args.record) if args.record else None
+    workers = [asyncio.ensure_future(discover_loop(args, sessions, tasks, stop, recorder)),
+               asyncio.ensure_future(report_loop(args, sessions, stop))]
+    await stop.wait()
+    print("\n🛑 停止中，關閉所有連線...")
+    await asyncio.gather(*workers, *tasks, return_exceptions=True)
+
+    print("📋 最終統計")
+    for addr, s in sessions.items():
+        print(f"   {addr}: {s.samples} 組 XYZ，掉包 {s.drop_rate:.2%}，連線 {s.connects} 次")
+    if recorder is not None:
+        recorder.close()
+        print(f"💾 已錄製到 {args.record}/ (recorder.Recording 讀回)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parser.parse_args()))
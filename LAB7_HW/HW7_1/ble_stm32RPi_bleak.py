@@ -1,45 +1,85 @@
+import argparse
 import asyncio
 from bleak import BleakScanner, BleakClient
 import matplotlib.pyplot as plt
 import msvcrt
+import numpy as np
+import os
 import signal
 import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from ble_batch import CHANNEL_NAMES, MVDATA_CHAR_UUIDS, ORIDATA_CHAR_UUIDS, NotificationDecoder
+from sample_ring import SampleCollector
+from recorder import Recorder
 
 TARGET_NAME = "BlueNRG"
 TARGET_SAMPLE_COUNT = 100  # 每軸收集的樣本數
 
+parser = argparse.ArgumentParser(description="收集 BlueNRG 原始 / 濾波後加速度並畫圖")
+parser.add_argument("-n", "--count", type=int, default=TARGET_SAMPLE_COUNT, help="每軸收集的樣本數")
+parser.add_argument("--stream", metavar="DIR",
+                    help="不限筆數一直收 (Ctrl+C 停止)，資料依序寫到 DIR/<uuid>.bin")
+parser.add_argument("--capacity", type=int, default=10000, help="--stream 時記憶體中每軸保留的筆數")
+parser.add_argument("--record", metavar="DIR",
+                    help="全部樣本 (含時間、MAC) 錄到 DIR (分段 .npy，recorder.Recording 讀回)")
+args = parser.parse_args()
+
 # UUIDs for 原始資料（oridata）與 濾波資料（MVdata）
-oridata_char_uuids = [
-    "00110000-0001-11E1-AC36-0002A5D5C51B",  # X
-    "00220000-0001-11E1-AC36-0002A5D5C51B",  # Y
-    "00330000-0001-11E1-AC36-0002A5D5C51B"   # Z
-]
-MVdata_char_uuids = [
-    "AA110000-0001-11E1-AC36-0002A5D5C51B",  # X
-    "AA220000-0001-11E1-AC36-0002A5D5C51B",  # Y
-    "AA330000-0001-11E1-AC36-0002A5D5C51B"   # Z
-]
-
-# 初始化資料儲存區，UUID 字串轉小寫統一比對
-oridata = {uuid.lower(): [] for uuid in oridata_char_uuids}
-MVdata = {uuid.lower(): [] for uuid in MVdata_char_uuids}
-
-def parse_value(data):
-    if len(data) >= 2:
-        return int.from_bytes(data, byteorder='little', signed=True)
-    return None
+oridata_char_uuids, MVdata_char_uuids = ORIDATA_CHAR_UUIDS, MVDATA_CHAR_UUIDS
+
+# 每個 characteristic 一個預先配置的 ring buffer (值 + 到達時間)，UUID 字串轉小寫統一比對
+collector = SampleCollector(
+    [u.lower() for u in oridata_char_uuids + MVdata_char_uuids],
+    target=None if args.stream else args.count,
+    capacity=args.capacity if args.stream else None,
+    spill_dir=args.stream,
+)
+stop = asyncio.Event()
+
+recorder = Recorder(args.record) if args.record else None
+device_address = None
+
+decoders = {}
+
+def parse_value(uuid_str, data, axis_uuids):
+    """回傳 [(channel, 值), ...]：批次封包一次帶 X/Y/Z 多筆，舊格式只有自己這一軸一筆"""
+    decoder = decoders.setdefault(uuid_str, NotificationDecoder())
+    result = decoder.decode(data)
+    if result is None:
+        return []
+    kind, payload = result
+    if kind == "batch":
+        return [(axis_uuids[i], payload[axis]) for i, axis in enumerate("xyz")]
+    return [(uuid_str, payload[1])]
 
 # 接收 Notification 並儲存資料
-async def notification_handler(uuid, data_dict):
+async def notification_handler(uuid_list):
+    axis_uuids = [u.lower() for u in uuid_list]
     async def inner(sender, data):
-        uuid_str = str(sender.uuid).lower()
-        value = parse_value(data)
-        if value is not None and uuid_str in data_dict:
-            if len(data_dict[uuid_str]) < TARGET_SAMPLE_COUNT:
-                data_dict[uuid_str].append(value)
+        t = collector.clock()
+        for channel, values in parse_value(str(sender.uuid).lower(), data, axis_uuids):
+            collector.add(channel, values, t)
+            if recorder is not None:
+                recorder.append(device_address, CHANNEL_NAMES[channel], time.time(), np.atleast_1d(values))
     return inner
 
+async def report(interval=5.0):
+    """stream 模式定期印出每軸累積筆數"""
+    last = collector.counts()
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        now = collector.counts()
+        rates = "  ".join(f"{u[:4]}:{(now[u] - last[u]) / interval:5.1f}/s" for u in now)
+        print(f"📈 {sum(now.values())} 筆  {rates}")
+        last = now
+
 async def main():
+    global device_address
     print("🔍 掃描裝置中...")
     devices = await BleakScanner.discover(timeout=5.0)
     target_device = next((d for d in devices if d.name == TARGET_NAME), None)
@@ -49,39 +89,54 @@ async def main():
         return
 
     print(f"✅ 找到 {TARGET_NAME}，MAC = {target_device.address}")
+    device_address = target_device.address
 
     async with BleakClient(target_device.address) as client:
         print("🔗 已連線，啟用通知中...")
 
         # 開啟所有通知並註冊對應處理器
         for uuid in oridata_char_uuids:
-            await client.start_notify(uuid, await notification_handler(uuid.lower(), oridata))
+            await client.start_notify(uuid, await notification_handler(oridata_char_uuids))
             print(f"📡 原始資料 Notify 開啟: {uuid}")
         for uuid in MVdata_char_uuids:
-            await client.start_notify(uuid, await notification_handler(uuid.lower(), MVdata))
+            await client.start_notify(uuid, await notification_handler(MVdata_char_uuids))
             print(f"📡 濾波後資料 Notify 開啟: {uuid}")
 
-        # 等待資料收集完成
-        print("⏳ 接收資料中（每軸 1000 筆）...")
-        while not all(len(oridata[u]) >= TARGET_SAMPLE_COUNT for u in oridata) or \
-              not all(len(MVdata[u]) >= TARGET_SAMPLE_COUNT for u in MVdata):
-            await asyncio.sleep(0.1)
+        # 等待資料收集完成：所有軸收滿時 collector.done 會被 set，不需要輪詢
+        if args.stream:
+            print(f"⏳ 串流接收中，寫入 {args.stream}/（Ctrl+C 停止）...")
+            await report()
+        else:
+            print(f"⏳ 接收資料中（每軸 {args.count} 筆）...")
+            done = asyncio.ensure_future(collector.done.wait())
+            await asyncio.wait([done, asyncio.ensure_future(stop.wait())],
+                               return_when=asyncio.FIRST_COMPLETED)
 
         # 關閉通知
         print("🛑 資料接收完成，關閉 Notify")
         for uuid in oridata_char_uuids + MVdata_char_uuids:
             await client.stop_notify(uuid)
-
-    # 繪圖比較
+        for uuid_str, decoder in decoders.items():
+            print(f"   {uuid_str[:8]}: {decoder}")
+
+    collector.close()
+    if recorder is not None:
+        recorder.close()
+        print(f"💾 已錄製到 {args.record}/ (recorder.Recording 讀回)")
+    if args.stream:
+        lost = sum(r.lost for r in collector.rings.values())
+        print(f"💾 已寫入 {args.stream}/ (load_spill() 讀回)" + (f"，⚠️ 溢出 {lost} 筆" if lost else ""))
+
+    # 繪圖比較 (stream 模式畫記憶體中最後 capacity 筆)
     print("📊 開始畫圖...")
     labels = ['X', 'Y', 'Z']
     fig, axs = plt.subplots(3, 1, figsize=(10, 8))
 
     for i in range(3):
-        uuid_ori = oridata_char_uuids[i].lower()
-        uuid_mv = MVdata_char_uuids[i].lower()
-        axs[i].plot(oridata[uuid_ori], label="原始資料")
-        axs[i].plot(MVdata[uuid_mv], label="濾波後資料")
+        _, ori = collector.series(oridata_char_uuids[i].lower())
+        _, mv = collector.series(MVdata_char_uuids[i].lower())
+        axs[i].plot(ori, label="原始資料")
+        axs[i].plot(mv, label="濾波後資料")
         axs[i].set_title(f"{labels[i]} 軸加速度比較")
         axs[i].legend()
         axs[i].grid(True)
@@ -90,10 +145,21 @@ async def main():
     plt.show()
 
 def signal_handler(sig, frame):
+    # 在事件迴圈中 set stop，讓 main() 正常關閉通知、把 stream 資料寫完
+    if loop is not None and not stop.is_set():
+        print("\n🛑 中斷，結束接收...")
+        loop.call_soon_threadsafe(stop.set)
+        return
     print("\n🛑 強制中斷")
     sys.exit(0)
 
+loop = None
 signal.signal(signal.SIGINT, signal_handler)
 
+async def run():
+    global loop
+    loop = asyncio.get_running_loop()
+    await main()
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
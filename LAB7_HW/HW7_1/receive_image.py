@@ -1,15 +1,229 @@
+import argparse
+import os
+import re
+import sys
+import time
+import zlib
+
 import serial
 
-ser = serial.Serial('COM4', 115200, timeout=1)  # 將 COM3 改成你的實際 COM port
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "common"))
+from uart_link import LinkReceiver, LinkError
+
+# ===================================================
+# UART 影像接收：邊收邊寫檔、可續傳、檢查 CRC、連續多張自動編號
+# ===================================================
+#
+# 舊格式 (預設)：一行 "<size>\n" 或 "<size> <crc32 hex>\n"，接著 size bytes 的檔案內容
+# --reliable   ：common/uart_link.py 的分塊 + ACK/重傳協定
+#
+# 收到的資料先寫進 <name>.part，完成且 CRC 正確才改名；CRC 錯誤改存成 <name>.bad。
+# 舊格式的傳送端不支援從中間續傳：傳到一半暫停時在 --idle-timeout 內會接著收，
+# 超過就放棄這張 (保留 .part)，之後晚到的剩餘資料會被丟掉，不會被當成下一張的標頭。
+
+parser = argparse.ArgumentParser(description="從 UART 接收影像")
+parser.add_argument("port", nargs="?", default="COM4", help="序列埠 (預設 COM4)")  # 改成你的實際 COM port
+parser.add_argument("--baud", type=int, default=115200)
+parser.add_argument("-o", "--output", default="recv.jpg",
+                    help="輸出檔名；連續接收時自動加上編號，例如 recv_0001.jpg")
+parser.add_argument("-n", "--count", type=int, default=1, help="要接收幾張 (0 = 一直收)")
+parser.add_argument("--idle-timeout", type=float, default=10.0,
+                    help="傳到一半超過幾秒沒有資料就放棄這張 (期間資料回來會接著收)")
+parser.add_argument("--reliable", action="store_true",
+                    help="使用 common/uart_link.py 的分塊 + ACK/重傳協定 (傳送端需用 LinkSender)")
+args = parser.parse_args()
+
+CHUNK = 4096
+HEADER_RE = re.compile(rb"^(\d{1,10})(?: ([0-9a-fA-F]{1,8}))?$")
+
+
+class Progress:
+    """每隔 interval 秒印一次進度與速度"""
+
+    def __init__(self, total, interval=0.5):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.t0 = time.perf_counter()
+        self._next = self.t0
+
+    def update(self, n, force=False):
+        self.done += n
+        now = time.perf_counter()
+        if force or now >= self._next:
+            rate = self.done / max(now - self.t0, 1e-6)
+            pct = self.done * 100 / self.total if self.total else 100.0
+            print(f"\r  {self.done}/{self.total} bytes ({pct:5.1f}%)  {rate / 1024:6.1f} KiB/s",
+                  end="", flush=True)
+            self._next = now + self.interval
+
+    def finish(self):
+        self.update(0, force=True)
+        print()
+        return time.perf_counter() - self.t0
+
+
+def output_paths(pattern, count):
+    """單張且沒有編號需求時直接用 pattern，否則產生 name_0001.ext、name_0002.ext... (跳過已存在的檔案)"""
+    if count == 1:
+        yield pattern
+        return
+    stem, ext = os.path.splitext(pattern)
+    index = 1
+    while True:
+        path = f"{stem}_{index:04d}{ext}"
+        index += 1
+        if not os.path.exists(path):
+            yield path
+
+
+def finalize(part, path, ok):
+    final = path if ok else path + ".bad"
+    os.replace(part, final)
+    return final
+
+
+def read_header(ser, first=None):
+    """等待 "<size> [crc32]" 這一行；回傳 (size, crc 或 None)
+
+    整行都要符合格式才接受 (二進位資料剛好以數字開頭也不會被當成大小)；
+    不符合的行只在收到標頭時合併回報一次，不逐行印。first：resync() 已經讀到的那一行。
+    """
+    skipped = 0
+    while True:
+        line, first = (first if first is not None else ser.readline()).strip(), None
+        if not line:
+            continue
+        m = HEADER_RE.match(line)
+        if m is None:
+            skipped += 1
+            continue
+        if skipped:
+            print(f"⚠️ 略過 {skipped} 行無法解析的資料")
+        return int(m.group(1)), int(m.group(2), 16) if m.group(2) else None
+
+
+def resync(ser, n):
+    """上一張放棄後，等下一筆資料：開頭就是標頭 (傳送端放棄舊的、直接送下一張) 就交給
+    read_header；否則當成舊那張晚到的剩餘資料丟掉，丟滿 n bytes 或線路安靜一個 read timeout 為止。
+    回傳 (丟掉的 bytes 數, 讀到的標頭行或 None)"""
+    first = b""
+    while not first:
+        first = ser.readline(32)              # 二進位資料可能很久才有換行，最多讀 32 bytes
+    if first.endswith(b"\n") and HEADER_RE.match(first.strip()):
+        return 0, first
+    dropped = len(first)
+    while dropped < n:
+        data = ser.read(min(CHUNK, n - dropped))
+        if not data:
+            break
+        dropped += len(data)
+    return dropped, None
+
+
+def receive_legacy(ser, path, header=None):
+    """回傳 (完成的檔名或 None, 放棄時這張還沒收到的 bytes 數)"""
+    size, expected_crc = read_header(ser, header)
+    print(f"Expecting bytes: {size}" + (f" (crc32 {expected_crc:08x})" if expected_crc is not None else ""))
+
+    part = path + ".part"
+    crc = 0
+    progress = Progress(size)
+    last_data = time.perf_counter()
+    with open(part, "wb") as f:
+        while progress.done < size:
+            data = ser.read(min(CHUNK, size - progress.done))
+            if not data:
+                # 逾時不截斷：繼續等，資料回來就從目前位置接著收
+                idle = time.perf_counter() - last_data
+                if idle > args.idle_timeout:
+                    progress.finish()
+                    print(f"❌ 超過 {args.idle_timeout:.0f} 秒沒有資料，保留未完成檔案 {part}")
+                    return None, size - progress.done
+                continue
+            last_data = time.perf_counter()
+            f.write(data)
+            crc = zlib.crc32(data, crc)
+            progress.update(len(data))
+
+    elapsed = progress.finish()
+    ok = expected_crc is None or crc == expected_crc
+    if not ok:
+        print(f"❌ CRC 錯誤: 收到 {crc:08x}，應為 {expected_crc:08x}")
+    final = finalize(part, path, ok)
+    print(f"✅ {final}: {size} bytes, {elapsed:.2f}s, crc32 {crc:08x}")
+    return final, 0
+
+
+def receive_reliable(receiver, path):
+    part = path + ".part"
+    state = {}
+
+    def on_start(total):
+        # 傳送端重送 START (重新開始這次傳輸)：關掉舊的檔案、結束舊的進度行
+        if "f" in state:
+            state["f"].close()
+        if "progress" in state:
+            state["progress"].finish()
+        state["f"] = open(part, "wb")
+        state["progress"] = Progress(total)
+        print(f"Expecting bytes: {total}")
+
+    def on_chunk(offset, data):
+        # 區塊可能不照順序到，依 offset 寫到正確位置
+        f = state["f"]
+        f.seek(offset)
+        f.write(data)
+        state["progress"].update(len(data))
+
+    try:
+        blob_crc = receiver.receive(on_start=on_start, on_chunk=on_chunk, idle_timeout=args.idle_timeout)
+    finally:
+        if "f" in state:
+            state["f"].close()
+        if "progress" in state:
+            elapsed = state["progress"].finish()
 
-# 讀取檔案大小
-size = int(ser.readline().decode().strip())
-print("Expecting bytes:", size)
+    crc = 0
+    with open(part, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            crc = zlib.crc32(block, crc)
+    ok = crc == blob_crc
+    if not ok:
+        print(f"❌ CRC 錯誤: 收到 {crc:08x}，應為 {blob_crc:08x}")
+    final = finalize(part, path, ok)
+    print(f"✅ {final}: {receiver.last_stats.payload_bytes} bytes, {elapsed:.2f}s ({receiver.last_stats})")
+    return final
 
-# 讀取檔案資料
-data = ser.read(size)
 
-with open("recv.jpg", "wb") as f:
-    f.write(data)
+ser = serial.Serial(args.port, args.baud, timeout=0.02 if args.reliable else 1)
+receiver = LinkReceiver(ser) if args.reliable else None
+received = 0
+leftover = 0      # 舊格式：上一張放棄時還沒到的 bytes
+try:
+    for path in output_paths(args.output, args.count):
+        if args.count and received >= args.count:
+            break
+        print(f"Waiting for image -> {path}")
+        header = None
+        if leftover:
+            dropped, header = resync(ser, leftover)
+            if dropped:
+                print(f"🧹 丟掉上一張晚到的 {dropped} bytes")
+            leftover = 0
+        try:
+            if args.reliable:
+                result = receive_reliable(receiver, path)
+            else:
+                result, leftover = receive_legacy(ser, path, header)
+        except LinkError as e:
+            print(f"❌ 傳輸失敗: {e}")
+            continue
+        if result:
+            received += 1
+except KeyboardInterrupt:
+    print("\n🛑 使用者中斷")
+finally:
+    ser.close()
 
-print("Image received!")
+print(f"Image received! ({received} 張)")
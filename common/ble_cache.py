@@ -0,0 +1,152 @@
+import json
+import os
+import time
+
+from bluepy.btle import Peripheral, Scanner, UUID, BTLEException
+
+# ===================================================
+# BLE 快速重連：快取位址、位址類型與 characteristic / CCCD handle (bluepy)
+# ===================================================
+#
+# 第一次連線：掃描 -> 連線 -> 一次讀完全部 characteristic 與 descriptor -> 存進快取
+# 之後      ：直接用快取的位址連線，只驗證每個 handle 的 UUID 沒變，就可以寫 CCCD
+# 驗證失敗 (韌體改了 GATT 表) 時在同一條連線上重新探索；連不上 (位址換了) 才重新掃描。
+#
+# 快取檔預設為 ~/.cache/ble_gatt_cache.json，可用環境變數 BLE_GATT_CACHE 指定。
+
+DEFAULT_PATH = os.environ.get("BLE_GATT_CACHE",
+                              os.path.join(os.path.expanduser("~"), ".cache", "ble_gatt_cache.json"))
+CCCD_UUID = UUID(0x2902)
+
+
+class GattCache:
+    """{裝置名稱: {"addr", "addr_type", "chars": {uuid: {"value": handle, "cccd": handle}}}}"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def put(self, name, entry):
+        entry["updated"] = time.time()
+        self.entries[name] = entry
+        self._save()
+
+    def drop(self, name):
+        if self.entries.pop(name, None) is not None:
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def uuid_key(uuid):
+    return str(UUID(uuid) if not isinstance(uuid, UUID) else uuid)
+
+
+def scan_for_addr(name, timeout=5.0, match=lambda n, target: n == target):
+    """掃描並回傳 (addr, addr_type)；找不到回傳 (None, None)"""
+    for dev in Scanner().scan(timeout):
+        n = dev.getValueText(9) or dev.getValueText(8)
+        if n and match(n, name):
+            return dev.addr, dev.addrType
+    return None, None
+
+
+def discover_handles(dev, uuids):
+    """完整探索：一次讀全部 characteristic + descriptor，不逐一走訪 service / char"""
+    wanted = {uuid_key(u) for u in uuids}
+    chars = sorted(dev.getCharacteristics(), key=lambda c: c.handle)
+    cccds = sorted(d.handle for d in dev.getDescriptors() if d.uuid == CCCD_UUID)
+    table = {}
+    for i, c in enumerate(chars):
+        key = str(c.uuid)
+        if key not in wanted:
+            continue
+        end = chars[i + 1].handle if i + 1 < len(chars) else 0xFFFF
+        cccd = next((h for h in cccds if c.valHandle < h < end), None)
+        table[key] = {"value": c.valHandle, "cccd": cccd}
+    missing = wanted - set(table)
+    if missing:
+        raise BTLEException(f"找不到 characteristic: {', '.join(sorted(missing))}")
+    return table
+
+
+def validate_handles(dev, table):
+    """確認快取的 handle 還是同一個 characteristic：每個只讀自己那一條 declaration"""
+    for key, h in table.items():
+        found = dev.getCharacteristics(startHnd=h["value"] - 1, endHnd=h["value"] - 1)
+        if not found or str(found[0].uuid) != key or found[0].valHandle != h["value"]:
+            return False
+        if h["cccd"] is not None and len(dev.readCharacteristic(h["cccd"])) != 2:
+            return False
+    return True
+
+
+def _connect(addr, addr_type, iface=None):
+    if iface is None:
+        return Peripheral(addr, addr_type)
+    return Peripheral(addr, addr_type, iface=iface)
+
+
+def connect_cached(name, uuids, cache=None, scan_timeout=5.0, addr_types=("random", "public"),
+                   iface=None, match=lambda n, target: n == target):
+    """連線並回傳 (Peripheral, handle 表, 來源說明)；handle 表的 key 是 UUID 字串
+
+    來源說明是 "cache"、"rediscover" (連得上但 GATT 表變了) 或 "scan"。
+    """
+    cache = cache or GattCache()
+    entry = cache.get(name)
+    if entry:
+        try:
+            dev = _connect(entry["addr"], entry["addr_type"], iface)
+        except BTLEException:
+            dev = None
+        if dev is not None:
+            wanted = {uuid_key(u) for u in uuids}
+            table = {k: v for k, v in entry["chars"].items() if k in wanted}
+            try:
+                if set(table) == wanted and validate_handles(dev, table):
+                    return dev, table, "cache"
+                table = discover_handles(dev, uuids)
+            except BTLEException:
+                dev.disconnect()
+                raise
+            entry["chars"].update(table)
+            cache.put(name, entry)
+            return dev, table, "rediscover"
+        cache.drop(name)
+
+    addr, scanned_type = scan_for_addr(name, scan_timeout, match)
+    if addr is None:
+        raise BTLEException(f"找不到裝置 {name}")
+    last_error = None
+    for addr_type in dict.fromkeys((scanned_type, *addr_types)):
+        try:
+            dev = _connect(addr, addr_type, iface)
+        except BTLEException as e:
+            last_error = e
+            continue
+        try:
+            table = discover_handles(dev, uuids)
+        except BTLEException:
+            dev.disconnect()
+            raise
+        cache.put(name, {"addr": addr, "addr_type": addr_type, "chars": table})
+        return dev, table, "scan"
+    raise last_error
+
+
+def set_cccd(dev, handle, value):
+    """value: 0 = 關閉, 1 = Notify, 2 = Indicate"""
+    dev.writeCharacteristic(handle, value.to_bytes(2, "little"), withResponse=True)
@@ -0,0 +1,192 @@
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+# ===================================================
+# 事件驅動的 BLE 核心：I/O 執行緒 + 事件佇列 (bluepy)
+# ===================================================
+#
+# bluepy 的 Peripheral 不能跨執行緒使用，所以只讓 BleWorker 這個執行緒碰 dev：
+#   - 以很短的 timeout 呼叫 waitForNotifications，通知一到就放進 events
+#   - 寫入 / 其他操作透過 BleWorker.write() / call() 排進佇列，由 I/O 執行緒執行，
+#     不需要先關掉 CCCD (寫入等待回應時到達的通知，bluepy 一樣會交給 delegate)
+#   - KeyReader 執行緒讀鍵盤，也放進同一個 events
+# 主執行緒只要 events.get() 就好，不再輪流 select stdin / 等通知。
+#
+# 事件都是 tuple，第一個欄位是種類：
+#   ("notify", handle, data, t)    t = 進到 Python 的時間 (time.perf_counter)
+#   ("key", ch, t)
+#   ("done", tag, result, error)   write() / call() 的結果
+#   ("error", exc)                 I/O 執行緒因例外結束 (例如斷線)
+
+
+class _QueueDelegate:
+    def __init__(self, events):
+        self.events = events
+
+    def handleNotification(self, cHandle, data):
+        self.events.put(("notify", cHandle, data, time.perf_counter()))
+
+    def handleDiscovery(self, *args):
+        pass
+
+
+class BleWorker(threading.Thread):
+    def __init__(self, dev, events, poll=0.01):
+        super().__init__(daemon=True, name="ble-io")
+        self.dev = dev
+        self.events = events
+        self.poll = poll
+        self._cmds = queue.SimpleQueue()
+        self._stop_event = threading.Event()
+        dev.setDelegate(_QueueDelegate(events))
+
+    def call(self, fn, *args, tag=None):
+        """在 I/O 執行緒執行 fn(dev, *args)，結果以 ("done", tag, result, error) 回到 events"""
+        self._cmds.put((fn, args, tag))
+
+    def write(self, handle, data, with_response=True, tag=None):
+        self.call(lambda dev: dev.writeCharacteristic(handle, data, withResponse=with_response),
+                  tag=tag if tag is not None else ("write", handle, data))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                while True:
+                    try:
+                        fn, args, tag = self._cmds.get_nowait()
+                    except queue.Empty:
+                        break
+                    try:
+                        self.events.put(("done", tag, fn(self.dev, *args), None))
+                    except Exception as e:
+                        self.events.put(("done", tag, None, e))
+                self.dev.waitForNotifications(self.poll)
+        except Exception as e:
+            self.events.put(("error", e))
+
+
+class KeyReader(threading.Thread):
+    """逐字讀 stdin (呼叫端先把終端機設成 cbreak)，每個字元放一個 ("key", ch, t)"""
+
+    def __init__(self, events, stream=sys.stdin):
+        super().__init__(daemon=True, name="keys")
+        self.events = events
+        self.stream = stream
+
+    def run(self):
+        while True:
+            ch = self.stream.read(1)
+            if not ch:
+                return
+            self.events.put(("key", ch, time.perf_counter()))
+
+
+class LatencyStats:
+    """通知從進到 Python 到被處理的延遲；只保留最近 size 筆"""
+
+    def __init__(self, size=10000):
+        self.buf = np.zeros(size, dtype=np.float64)
+        self.count = 0
+
+    def add(self, seconds):
+        self.buf[self.count % len(self.buf)] = seconds
+        self.count += 1
+
+    def summary(self):
+        if not self.count:
+            return "沒有資料"
+        d = self.buf[:min(self.count, len(self.buf))] * 1e3
+        p50, p95, p99 = np.percentile(d, [50, 95, 99])
+        return f"n={self.count}  p50 {p50:.2f} ms  p95 {p95:.2f} ms  p99 {p99:.2f} ms  max {d.max():.2f} ms"
+
+
+# ===================================================
+# Benchmark：原本 select(stdin, 0.1) + waitForNotifications(0.3) 的迴圈 vs BleWorker
+# ===================================================
+#
+# FakePeripheral 依設定的速率在背景「到達」通知 (記錄到達時間)，
+# waitForNotifications 的行為與 bluepy 相同：有通知就交給 delegate 並回傳 True。
+# 延遲 = 處理時間 - 到達時間，包含通知在 helper pipe 裡等待被讀取的時間。
+
+class FakePeripheral:
+    def __init__(self, rate=50.0, duration=3.0, seed=0):
+        rng = np.random.default_rng(seed)
+        gaps = rng.exponential(1.0 / rate, int(rate * duration))
+        self.t0 = time.perf_counter()
+        self.arrivals = self.t0 + np.cumsum(gaps)
+        self.next = 0
+        self.lock = threading.Lock()
+        self.delegate = None
+
+    def setDelegate(self, delegate):
+        self.delegate = delegate
+
+    def done(self):
+        return self.next >= len(self.arrivals)
+
+    def waitForNotifications(self, timeout):
+        with self.lock:
+            if self.done():
+                time.sleep(timeout)
+                return False
+            wait = self.arrivals[self.next] - time.perf_counter()
+            if wait > timeout:
+                time.sleep(timeout)
+                return False
+            if wait > 0:
+                time.sleep(wait)
+            i = self.next
+            self.next += 1
+        self.delegate.handleNotification(i, b"\x00\x00\x00\x00")
+        return True
+
+    def writeCharacteristic(self, handle, data, withResponse=True):
+        time.sleep(0.0075)          # 大約一個 connection interval
+        return True
+
+
+if __name__ == "__main__":
+    import os
+    import select
+
+    def legacy_loop(dev, stats):
+        class Delegate:
+            def handleNotification(self, i, data):
+                stats.add(time.perf_counter() - dev.arrivals[i])
+        dev.setDelegate(Delegate())
+        r, w = os.pipe()          # 代替 stdin：沒有人按鍵
+        while not dev.done():
+            dr, _, _ = select.select([r], [], [], 0.1)
+            if not dr:
+                dev.waitForNotifications(0.3)
+
+    def worker_loop(dev, stats):
+        events = queue.SimpleQueue()
+        worker = BleWorker(dev, events)
+        worker.start()
+        handled = 0
+        while handled < len(dev.arrivals):
+            ev = events.get()
+            if ev[0] == "notify":
+                stats.add(time.perf_counter() - dev.arrivals[ev[1]])
+                handled += 1
+                if handled % 20 == 0:
+                    worker.write(0x10, b"\x1a\x2b")     # 寫入不影響通知
+        worker.stop()
+        worker.join()
+
+    # 原本的迴圈每圈只處理一個通知又要先等 0.1 秒，通知比 10 Hz 快就會越積越多
+    for rate, duration in ((5.0, 6.0), (50.0, 2.0)):
+        print(f"--- 通知速率 {rate:.0f} Hz ---")
+        for name, loop in (("原本 select + waitForNotifications", legacy_loop),
+                           ("BleWorker + 事件佇列", worker_loop)):
+            stats = LatencyStats()
+            loop(FakePeripheral(rate, duration), stats)
+            print(f"{name:<34}: {stats.summary()}")
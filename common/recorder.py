@@ -0,0 +1,397 @@
+import json
+import os
+import time
+
+import numpy as np
+
+# ===================================================
+# 長時間錄製：分段、按欄存放的 .npy (可 mmap) + index.json
+# ===================================================
+#
+#   root/
+#     index.json              裝置 / 種類對照表、每段的筆數與時間範圍
+#     seg-000000/t.npy        float64  時間 (time.time())
+#     seg-000000/device.npy   uint16   裝置編號 -> index["devices"] (例如 "192.168.1.5:50123"、BLE MAC)
+#     seg-000000/kind.npy     uint8    種類編號 -> index["kinds"]   (例如 "acc"、"gyro"、"ori_x")
+#     seg-000000/x.npy ...    float32  x / y / z (單一數值的 channel 只用 x，y、z 為 NaN)
+#
+# 寫入：append() 先放進固定大小的緩衝區，滿了或超過 flush_interval 才寫到目前這段的 memmap；
+#       這段寫滿 segment_rows 筆或超過 segment_seconds 秒就封存 (.npy header 改成實際筆數) 換下一段。
+#       index.json 每次 flush 都更新，程式中斷時最多遺失最後一次 flush 之後的資料。
+# 讀取：Recording.read(t0, t1) 只打開時間範圍重疊的段落，用 mmap + searchsorted 切出需要的部分，
+#       不會把整個檔案讀進記憶體。錄製中也可以讀 (只看得到已 flush 的部分)。
+
+COLUMNS = (("t", "<f8"), ("device", "<u2"), ("kind", "u1"), ("x", "<f4"), ("y", "<f4"), ("z", "<f4"))
+ROW_DTYPE = np.dtype(list(COLUMNS))
+INDEX_NAME = "index.json"
+
+
+def _save_json(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _load_index(root):
+    with open(os.path.join(root, INDEX_NAME)) as f:
+        return json.load(f)
+
+
+def _shrink_npy(path, dtype, rows):
+    """把預先配置的 .npy 縮成實際筆數：改寫 header 的 shape 後截斷檔案"""
+    fmt = np.lib.format
+    with open(path, "r+b") as f:
+        version = fmt.read_magic(f)
+        read_header = fmt.read_array_header_1_0 if version == (1, 0) else fmt.read_array_header_2_0
+        read_header(f)
+        offset = f.tell()
+        header = {"descr": fmt.dtype_to_descr(dtype), "fortran_order": False, "shape": (rows,)}
+        f.seek(0)
+        write_header = fmt.write_array_header_1_0 if version == (1, 0) else fmt.write_array_header_2_0
+        write_header(f, header)
+        if f.tell() == offset:
+            f.truncate(offset + rows * dtype.itemsize)
+            return
+    # header 長度變了 (padding 跨過 64 bytes 邊界)：整個重寫
+    data = np.load(path, mmap_mode="r")[:rows]
+    tmp = path + ".tmp.npy"
+    np.save(tmp, data)
+    del data
+    os.replace(tmp, path)
+
+
+class _Segment:
+    def __init__(self, root, name, capacity, opened_at):
+        self.name = name
+        self.capacity = capacity
+        self.rows = 0
+        self.opened_at = opened_at
+        self.t_min = None
+        self.t_max = None
+        self.sorted = True
+        path = os.path.join(root, name)
+        os.makedirs(path, exist_ok=True)
+        self.paths = {c: os.path.join(path, f"{c}.npy") for c, _ in COLUMNS}
+        self.cols = {c: np.lib.format.open_memmap(self.paths[c], mode="w+", dtype=np.dtype(dt),
+                                                  shape=(capacity,))
+                     for c, dt in COLUMNS}
+
+    def write(self, rows):
+        k = min(len(rows), self.capacity - self.rows)
+        if k == 0:
+            return 0
+        part = rows[:k]
+        for c, _ in COLUMNS:
+            self.cols[c][self.rows:self.rows + k] = part[c]
+        t = part["t"]
+        if self.sorted and ((self.t_max is not None and t[0] < self.t_max) or (np.diff(t) < 0).any()):
+            self.sorted = False
+        lo, hi = float(t.min()), float(t.max())
+        self.t_min = lo if self.t_min is None else min(self.t_min, lo)
+        self.t_max = hi if self.t_max is None else max(self.t_max, hi)
+        self.rows += k
+        return k
+
+    def flush(self):
+        for m in self.cols.values():
+            m.flush()
+
+    def seal(self):
+        self.flush()
+        self.cols = None          # 關掉 memmap 才能截斷檔案
+        for c, dt in COLUMNS:
+            _shrink_npy(self.paths[c], np.dtype(dt), self.rows)
+
+    def entry(self, sealed):
+        return {"name": self.name, "rows": self.rows, "capacity": self.capacity,
+                "t_min": self.t_min, "t_max": self.t_max, "sorted": self.sorted, "sealed": sealed}
+
+
+class Recorder:
+    """append(device, kind, t, values) 寫入；close() 封存最後一段
+
+    同一個 root 再開一次會接著錄 (沿用裝置 / 種類編號)；上次沒正常關閉的段落以 index 記錄的筆數封存。
+    只能在單一執行緒使用 (asyncio 的 event loop 執行緒，或用 bus callback)。
+    """
+
+    def __init__(self, root, segment_rows=1 << 20, segment_seconds=3600.0, buffer_rows=8192,
+                 flush_interval=1.0, clock=time.time):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        self.flush_interval = flush_interval
+        self.clock = clock
+        os.makedirs(root, exist_ok=True)
+        self.index_path = os.path.join(root, INDEX_NAME)
+        if os.path.exists(self.index_path):
+            self.index = _load_index(root)
+            self._recover()
+        else:
+            self.index = {"version": 1, "columns": [list(c) for c in COLUMNS],
+                          "devices": [], "kinds": [], "segments": []}
+        self._device_ids = {d: i for i, d in enumerate(self.index["devices"])}
+        self._kind_ids = {k: i for i, k in enumerate(self.index["kinds"])}
+        self.buf = np.zeros(buffer_rows, dtype=ROW_DTYPE)
+        self.pending = 0
+        self.rows = 0                # 這次開啟後寫入的筆數
+        self.seg = None
+        self._last_flush = clock()
+
+    def _recover(self):
+        for entry in self.index["segments"]:
+            if not entry["sealed"]:
+                path = os.path.join(self.root, entry["name"])
+                for c, dt in COLUMNS:
+                    _shrink_npy(os.path.join(path, f"{c}.npy"), np.dtype(dt), entry["rows"])
+                entry["sealed"] = True
+        _save_json(self.index_path, self.index)
+
+    # ---------- 對照表 ----------
+
+    def device_id(self, name):
+        i = self._device_ids.get(name)
+        if i is None:
+            if len(self.index["devices"]) >= 65536:
+                raise ValueError("device 最多 65536 台")
+            i = self._device_ids[name] = len(self.index["devices"])
+            self.index["devices"].append(name)
+        return i
+
+    def kind_id(self, name):
+        i = self._kind_ids.get(name)
+        if i is None:
+            if len(self.index["kinds"]) >= 256:
+                raise ValueError("kind 最多 256 種")
+            i = self._kind_ids[name] = len(self.index["kinds"])
+            self.index["kinds"].append(name)
+        return i
+
+    # ---------- 寫入 ----------
+
+    def append(self, device, kind, t, values):
+        """values: (n, 3) 的 xyz 或 (n,) 的單一數值；t: 純量 (整批共用) 或 (n,)"""
+        values = np.asarray(values)
+        n = len(values)
+        if n == 0:
+            return
+        dev, knd = self.device_id(device), self.kind_id(kind)
+        done = 0
+        while done < n:
+            k = min(n - done, len(self.buf) - self.pending)
+            rows = self.buf[self.pending:self.pending + k]
+            rows["t"] = t if np.ndim(t) == 0 else t[done:done + k]
+            rows["device"] = dev
+            rows["kind"] = knd
+            part = values[done:done + k]
+            if part.ndim == 2:
+                rows["x"], rows["y"], rows["z"] = part[:, 0], part[:, 1], part[:, 2]
+            else:
+                rows["x"] = part
+                rows["y"] = rows["z"] = np.nan
+            self.pending += k
+            done += k
+            if self.pending == len(self.buf):
+                self._write_pending()
+        self.rows += n
+        if self.clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _write_pending(self):
+        rows = self.buf[:self.pending]
+        while len(rows):
+            if self.seg is None or self.seg.rows == self.seg.capacity or \
+                    self.clock() - self.seg.opened_at >= self.segment_seconds:
+                self._rotate()
+            rows = rows[self.seg.write(rows):]
+        self.pending = 0
+
+    def _rotate(self):
+        segments = self.index["segments"]
+        if self.seg is not None:
+            self.seg.seal()
+            segments[-1] = self.seg.entry(sealed=True)
+        name = f"seg-{len(segments):06d}"
+        self.seg = _Segment(self.root, name, self.segment_rows, self.clock())
+        segments.append(self.seg.entry(sealed=False))
+
+    def flush(self):
+        """緩衝區寫到 memmap，並更新 index.json (讀取端看得到的筆數)"""
+        if self.pending:
+            self._write_pending()
+        if self.seg is not None:
+            self.seg.flush()
+            self.index["segments"][-1] = self.seg.entry(sealed=False)
+        _save_json(self.index_path, self.index)
+        self._last_flush = self.clock()
+
+    def close(self):
+        if self.pending:
+            self._write_pending()
+        if self.seg is not None:
+            self.seg.seal()
+            self.index["segments"][-1] = self.seg.entry(sealed=True)
+            self.seg = None
+        _save_json(self.index_path, self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+    """讀取錄製結果；每次 read / iter_segments 都重新讀 index，所以錄製中也能讀"""
+
+    def __init__(self, root):
+        self.root = root
+        self.index = _load_index(root)
+
+    def refresh(self):
+        self.index = _load_index(self.root)
+
+    @property
+    def devices(self):
+        return self.index["devices"]
+
+    @property
+    def kinds(self):
+        return self.index["kinds"]
+
+    @property
+    def rows(self):
+        return sum(s["rows"] for s in self.index["segments"])
+
+    @property
+    def time_range(self):
+        segs = [s for s in self.index["segments"] if s["rows"]]
+        if not segs:
+            return None, None
+        return min(s["t_min"] for s in segs), max(s["t_max"] for s in segs)
+
+    def _column(self, seg, name):
+        path = os.path.join(self.root, seg["name"], f"{name}.npy")
+        return np.load(path, mmap_mode="r")[:seg["rows"]]
+
+    def iter_segments(self, t0=None, t1=None, columns=None):
+        """逐段回傳 {欄位: 陣列}，只含 t0 <= t < t1；排序過的段落回傳 mmap 的切片 (不複製)"""
+        self.refresh()
+        columns = columns or [c for c, _ in COLUMNS]
+        lo = -np.inf if t0 is None else t0
+        hi = np.inf if t1 is None else t1
+        for seg in self.index["segments"]:
+            if not seg["rows"] or seg["t_max"] < lo or seg["t_min"] >= hi:
+                continue
+            t = self._column(seg, "t")
+            if seg["sorted"]:
+                a, b = np.searchsorted(t, [lo, hi], side="left")
+                sel = slice(int(a), int(b))
+            else:
+                sel = np.flatnonzero((t >= lo) & (t < hi))
+            yield {c: (t if c == "t" else self._column(seg, c))[sel] for c in columns}
+
+    def read(self, t0=None, t1=None, device=None, kind=None, columns=None):
+        """時間範圍 (可再指定裝置 / 種類名稱) 內的資料，回傳 {欄位: 陣列} (複製到記憶體)"""
+        columns = list(columns or [c for c, _ in COLUMNS])
+        need = list(dict.fromkeys(columns + [c for c, v in (("device", device), ("kind", kind)) if v]))
+        dev = self.devices.index(device) if device is not None and device in self.devices else None
+        knd = self.kinds.index(kind) if kind is not None and kind in self.kinds else None
+        if (device is not None and dev is None) or (kind is not None and knd is None):
+            return {c: np.zeros(0, dtype=dict(COLUMNS)[c]) for c in columns}
+        parts = {c: [] for c in columns}
+        for cols in self.iter_segments(t0, t1, need):
+            mask = None
+            if dev is not None:
+                mask = cols["device"] == dev
+            if knd is not None:
+                m = cols["kind"] == knd
+                mask = m if mask is None else mask & m
+            for c in columns:
+                parts[c].append(np.array(cols[c] if mask is None else cols[c][mask]))
+        return {c: np.concatenate(p) if p else np.zeros(0, dtype=dict(COLUMNS)[c])
+                for c, p in parts.items()}
+
+    def export_parquet(self, path, t0=None, t1=None):
+        """轉成 Parquet (每段一個 row group，device / kind 存成字串)；需要 pyarrow"""
+        import pyarrow as pa               # 只有要匯出時才需要
+        import pyarrow.parquet as pq
+
+        devices = pa.array(self.devices, pa.string())
+        kinds = pa.array(self.kinds, pa.string())
+        writer = None
+        try:
+            for cols in self.iter_segments(t0, t1):
+                table = pa.table({
+                    "t": pa.array(cols["t"]),
+                    "device": pa.DictionaryArray.from_arrays(pa.array(cols["device"].astype(np.int32)), devices),
+                    "kind": pa.DictionaryArray.from_arrays(pa.array(cols["kind"].astype(np.int32)), kinds),
+                    "x": pa.array(cols["x"]), "y": pa.array(cols["y"]), "z": pa.array(cols["z"]),
+                })
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+# ===================================================
+# Benchmark：模擬長時間錄製，再讀中間一分鐘
+# ===================================================
+#
+#   python recorder.py [分鐘數=60] [板子數=8] [每塊每秒樣本數=100] [目錄=暫存]
+
+if __name__ == "__main__":
+    import shutil
+    import sys
+    import tempfile
+
+    minutes = float(sys.argv[1]) if len(sys.argv) > 1 else 60.0
+    boards = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 100.0
+    root = sys.argv[4] if len(sys.argv) > 4 else tempfile.mkdtemp(prefix="rec-")
+    cleanup = len(sys.argv) <= 4
+
+    # 模擬時鐘：每塊板子每 0.1 秒送一批 (約一次 recv 的量)，ACC + GYRO 各一批
+    step = 0.1
+    per_batch = max(int(rate * step), 1)
+    t_start = 1.7e9
+    now = [t_start]
+    rng = np.random.default_rng(0)
+    acc = rng.integers(-2000, 2000, size=(per_batch, 3))
+    gyro = rng.normal(size=(per_batch, 3))
+
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    with Recorder(root, segment_rows=1 << 20, segment_seconds=600, clock=lambda: now[0]) as rec:
+        for i in range(int(minutes * 60 / step)):
+            now[0] = t_start + i * step
+            ts = now[0] + np.arange(per_batch) / rate
+            for b in range(boards):
+                rec.append(f"192.168.0.{b + 10}:5000", "acc", ts, acc)
+                rec.append(f"192.168.0.{b + 10}:5000", "gyro", ts, gyro)
+        total = rec.rows
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - c0
+    size = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(root) for f in fs)
+    r = Recording(root)
+    print(f"寫入 {total} 筆 ({minutes:.0f} 分鐘 x {boards} 塊板子 x {rate:.0f} Hz x ACC/GYRO)："
+          f"{total / wall / 1e6:.2f} M 筆/秒，CPU {cpu / wall * 100:.0f}%，"
+          f"{len(r.index['segments'])} 段，{size / 1e6:.0f} MB ({size / total:.1f} bytes/筆)")
+    assert r.rows == total
+
+    mid = t_start + minutes * 30
+    for label, kwargs in (("中間 1 分鐘，全部", {}),
+                          ("中間 1 分鐘，單一板子的 GYRO", {"device": "192.168.0.12:5000", "kind": "gyro"})):
+        t0 = time.perf_counter()
+        data = r.read(mid, mid + 60, **kwargs)
+        dt = time.perf_counter() - t0
+        assert data["t"].min() >= mid and data["t"].max() < mid + 60
+        print(f"讀 {label}: {len(data['t'])} 筆，{dt * 1e3:.1f} ms")
+    t0 = time.perf_counter()
+    n = sum(len(c["t"]) for c in r.iter_segments(columns=["t", "x"]))
+    dt = time.perf_counter() - t0
+    print(f"逐段掃過全部 t/x 欄位 (mmap): {n} 筆，{dt * 1e3:.0f} ms")
+    if cleanup:
+        shutil.rmtree(root)
@@ -0,0 +1,697 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+# ===================================================
+# 重播 / 壓力測試工具：不接硬體也能對各個接收端施加負載
+# ===================================================
+#
+#   python replay.py tcp   LAB2 的 ACC/GYRO (文字行或 24-byte 二進位紀錄) 用 TCP 送給 SensorHub
+#   python replay.py pty   模擬 STM32 UART：機率行 "0.1,0.8,0.1" 或影像 (receive_image.py 舊格式) 寫到 pty
+#   python replay.py ble   假的 bleak 模組 + runpy 執行收集程式 (預設 ble_multi_ingest.py)
+#   python replay.py suite 固定的一組情境，印出總表 (專案的 benchmark)
+#
+# 資料來源：合成資料 (預設)、recorder.Recording 錄下來的資料夾 (--recording，依原本的時間間隔)
+# 或原始擷取檔 (--capture，例如 nc -l 8002 > capture.txt)。
+# --speed 是相對真實時間的倍數，0 = 能送多快送多快。
+#
+# 延遲怎麼量：TCP 不會亂序，所以某連線收到的第 k 筆樣本就是送出的第 k 筆；
+# 送出端記下「累計送出筆數 -> 送出時間」，hub 端記下「累計收到筆數 -> 收到時間」，結束後對起來。
+# 送出端跑在另一個行程，hub 行程的 CPU 時間就是伺服器本身的負擔。
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+# data: 整段 bytes；offsets: 第 i 筆在 data 的起點 (長度 n+1)；t: 第 i 筆的時間 (秒，從 0 開始)
+# acc_cum: 到第 i 筆之前累計幾筆 ACC 樣本 (長度 n+1，擷取檔裡不是每行都有 ACC)；span: 一輪的長度 (秒)
+Payload = namedtuple("Payload", "data offsets t acc_cum span")
+
+
+# ---------------------------------------------------
+# 資料來源
+# ---------------------------------------------------
+
+def synthetic_samples(n=1 << 16):
+    """(acc int (n,3), gyro dps (n,3))；每 500 筆有一筆 GYRO NA
+
+    預設 65536 筆：二進位紀錄的 u16 seq 剛好繞一圈，循環重播時不會被當成掉包。
+    """
+    i = np.arange(n)
+    acc = np.stack([i % 997 - 498, -(i % 311), np.full(n, 1000)], axis=1)
+    gyro = np.stack([(i % 300) / 7, -(i % 200) / 3, np.zeros(n)], axis=1)
+    gyro[i % 500 == 7] = np.nan
+    return acc, gyro
+
+
+def recording_samples(root, device=None):
+    """從 recorder.Recording 取一台裝置的 (t, acc, gyro)；GYRO 取不晚於 ACC 的最近一筆"""
+    from recorder import Recording
+
+    rec = Recording(root)
+    if not rec.devices:
+        raise SystemExit(f"❌ {root} 沒有資料")
+    device = device or rec.devices[0]
+    acc = rec.read(device=device, kind="acc")
+    gyro = rec.read(device=device, kind="gyro")
+    if not len(acc["t"]):
+        raise SystemExit(f"❌ {root} 裡 {device} 沒有 ACC 資料")
+    t = acc["t"] - acc["t"][0]
+    xyz = np.stack([acc["x"], acc["y"], acc["z"]], axis=1).astype(np.int64)
+    g = np.full((len(t), 3), np.nan)
+    if len(gyro["t"]):
+        k = np.searchsorted(gyro["t"], acc["t"], side="right") - 1
+        ok = k >= 0
+        g[ok] = np.stack([gyro["x"], gyro["y"], gyro["z"]], axis=1)[k[ok]]
+    return t, xyz, g
+
+
+def _acc_text(acc, gyro, panda_every=0):
+    lines = []
+    for k in range(len(acc)):
+        head = b"STM32 : Panda!" if panda_every and k % panda_every == panda_every - 1 else b""
+        if np.isnan(gyro[k]).any():
+            lines.append(head + b"ACC XYZ = [%d, %d, %d]  GYRO dps = [NA, NA, NA]\n" % tuple(acc[k]))
+        else:
+            lines.append(head + b"ACC XYZ = [%d, %d, %d]  GYRO dps = [%.2f, %.2f, %.2f]\n"
+                         % (*acc[k], *gyro[k]))
+    return lines
+
+
+def make_payload(t, acc, gyro, fmt="text", panda_every=97):
+    """樣本 -> 板子送出的格式 (main.c 的文字行，或 TELEMETRY_BINARY 的 24-byte 紀錄)"""
+    n = len(t)
+    if fmt == "binary":
+        from telemetry import RECORD_SIZE, encode_records
+        i = np.arange(n)
+        data = encode_records(i, (np.asarray(t) * 1000).astype(np.int64), acc, gyro)
+        offsets = np.arange(n + 1) * RECORD_SIZE
+    else:
+        lines = _acc_text(acc, gyro, panda_every)
+        data = b"".join(lines)
+        offsets = np.concatenate(([0], np.cumsum([len(x) for x in lines])))
+    period = float(np.median(np.diff(t))) if n > 1 else 0.005
+    return Payload(data, offsets, np.asarray(t, dtype=np.float64), np.arange(n + 1),
+                   float(t[-1]) + period)
+
+
+def capture_payload(path, rate):
+    """原始擷取檔：逐行重播 (沒有時間資訊，依 rate 行/秒)"""
+    with open(path, "rb") as f:
+        data = f.read()
+    lines = data.splitlines(keepends=True)
+    if not lines:
+        raise SystemExit(f"❌ {path} 是空的")
+    offsets = np.concatenate(([0], np.cumsum([len(x) for x in lines])))
+    has_acc = np.array([b"ACC XYZ = [" in x for x in lines], dtype=np.int64)
+    n = len(lines)
+    return Payload(data, offsets, np.arange(n) / rate, np.concatenate(([0], np.cumsum(has_acc))), n / rate)
+
+
+def build_payload(args):
+    if args.capture:
+        return capture_payload(args.capture, args.rate)
+    if args.recording:
+        t, acc, gyro = recording_samples(args.recording, args.device)
+    else:
+        acc, gyro = synthetic_samples()
+        t = np.arange(len(acc)) / args.rate
+    return make_payload(t, acc, gyro, args.format)
+
+
+def synthetic_probs(n, rate=10.0, hold=2.0, noise=0.08, glitch=0.03, seed=0):
+    """模擬模型輸出：每 hold 秒換一個手勢，加上雜訊與偶發的單幀誤判
+
+    回傳 (真實手勢 index (n,), 機率 (n, 3))；glitch 是單幀錯成別的手勢的機率。
+    """
+    rng = np.random.default_rng(seed)
+    per = max(int(hold * rate), 1)
+    truth = rng.integers(0, 3, size=n // per + 1).repeat(per)[:n]
+    shown = truth.copy()
+    bad = rng.random(n) < glitch
+    shown[bad] = (truth[bad] + rng.integers(1, 3, size=int(bad.sum()))) % 3
+    logits = rng.normal(0.0, noise * 10, size=(n, 3))
+    logits[np.arange(n), shown] += 3.0
+    p = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return truth, p / p.sum(axis=1, keepdims=True)
+
+
+def format_probs(probs):
+    """與 STM32 相同的格式：printf("%.6f,%.6f,%.6f\\r\\n")"""
+    return [b"%.6f,%.6f,%.6f\r\n" % tuple(p) for p in probs]
+
+
+def percentiles(values):
+    """(p50, p95, p99, max)，單位與輸入相同；沒有資料回傳 NaN"""
+    if not len(values):
+        return (float("nan"),) * 4
+    return tuple(np.percentile(values, [50, 95, 99, 100]))
+
+
+def _fmt_ms(p):
+    return "p50 {:.2f}  p95 {:.2f}  p99 {:.2f}  max {:.2f} ms".format(*(v * 1e3 for v in p))
+
+
+# ---------------------------------------------------
+# TCP：多個模擬板子 -> SensorHub
+# ---------------------------------------------------
+
+async def _send_one(host, port, payload, speed, start_at, seconds):
+    """一個模擬板子；回傳 (client, 累計 ACC 筆數陣列, 送出時間陣列, 送出筆數)"""
+    _, writer = await asyncio.open_connection(host, port)
+    sock = writer.get_extra_info("sockname")
+    client = f"{sock[0]}:{sock[1]}"
+    data, offsets, t, acc_cum, span = payload
+    n = len(t)
+    per_write = max(65536 // max(len(data) // n, 1), 1)    # 全速時一次寫約 64 KiB
+    cum, times = [], []
+    i = 0
+    await asyncio.sleep(max(start_at - time.time(), 0))
+    t0 = time.time()
+    while True:
+        now = time.time()
+        if now - t0 >= seconds:
+            break
+        if speed:
+            laps, rem = divmod((now - t0) * speed, span)
+            j = int(laps) * n + int(np.searchsorted(t, rem, side="right"))
+        else:
+            j = i + per_write
+        if j > i:
+            k = i
+            while k < j:
+                a = k % n
+                b = min(a + (j - k), n)
+                writer.write(data[offsets[a]:offsets[b]])
+                k += b - a
+            i = j
+            cum.append((i // n) * int(acc_cum[n]) + int(acc_cum[i % n]))
+            times.append(time.time())
+        await writer.drain()
+        if speed:
+            await asyncio.sleep(0.002)
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
+    return client, np.array(cum, dtype=np.int64), np.array(times), i
+
+
+async def _send_all(host, port, payload, clients, speed, seconds):
+    start_at = time.time() + 0.2          # 大家一起開始
+    return await asyncio.gather(*(_send_one(host, port, payload, speed, start_at, seconds)
+                                  for _ in range(clients)))
+
+
+def _sender_process(host, port, payload, clients, speed, seconds, out):
+    out.put(asyncio.run(_send_all(host, port, payload, clients, speed, seconds)))
+
+
+def _latencies(sent, received):
+    """sent: {client: (cum, times)}；received: {client: [(t, n), ...]} -> 每批的延遲 (秒)"""
+    out = []
+    for client, blocks in received.items():
+        if client not in sent or not blocks:
+            continue
+        cum, times = sent[client]
+        tr = np.array([b[0] for b in blocks])
+        cr = np.cumsum([b[1] for b in blocks])
+        idx = np.searchsorted(cum, cr, side="left")
+        ok = idx < len(cum)
+        out.append(tr[ok] - times[idx[ok]])
+    return np.concatenate(out) if out else np.zeros(0)
+
+
+async def run_tcp(args, payload):
+    """回傳結果 dict (給 suite 彙整)"""
+    from sensor_hub import Bus, SensorHub, record_to
+
+    speed = 0.0 if args.speed == "max" else float(args.speed)
+    label = f"tcp {args.format:<6} {args.clients:3d} 連線 x " + ("全速" if not speed else
+                                                           f"每條 {len(payload.t) / payload.span * speed:.0f}/s")
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        t0 = time.perf_counter()
+        res = await _send_all(host, int(port), payload, args.clients, speed, args.seconds)
+        wall = time.perf_counter() - t0
+        sent = sum(int(r[1][-1]) if len(r[1]) else 0 for r in res)
+        print(f"📊 {label}：送出 {sent} 筆 ACC ({sent / wall:.0f}/s) 到 {args.connect}"
+              f"（外部伺服器，延遲與掉資料請看伺服器端統計）")
+        return {"name": label, "sent": sent, "rate": sent / wall}
+
+    bus = Bus()
+    hub = SensorHub(bus, "127.0.0.1", 0)
+    server = await hub.start()
+    port = server.sockets[0].getsockname()[1]
+    received = {}
+
+    def on_acc(topic, block):
+        received.setdefault(block.client, []).append((block.t, len(block.xyz)))
+    bus.subscribe_callback(["acc"], on_acc)
+    recorder = None
+    if args.record:
+        from recorder import Recorder
+        recorder = Recorder(args.record)
+        record_to(bus, recorder)
+
+    loop = asyncio.get_running_loop()
+    out = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_sender_process, daemon=True,
+                                   args=("127.0.0.1", port, payload, args.clients, speed, args.seconds, out))
+    c0 = time.process_time()
+    proc.start()
+    res = await loop.run_in_executor(None, out.get)
+    proc.join()
+    # 等 hub 把還在 socket 裡的資料收完
+    total = sum(r[3] for r in res)
+    last, deadline = -1, time.time() + 5.0
+    while time.time() < deadline:
+        now = sum(n for blocks in received.values() for _, n in blocks)
+        if now == last and not hub.clients:
+            break
+        last = now
+        await asyncio.sleep(0.2)
+    cpu = time.process_time() - c0
+    server.close()
+    if recorder is not None:
+        recorder.close()
+
+    sent = {r[0]: (r[1], r[2]) for r in res}
+    n_sent = sum(int(c[-1]) for c, _ in sent.values() if len(c))
+    n_recv = sum(n for blocks in received.values() for _, n in blocks)
+    t_all = [b[0] for blocks in received.values() for b in blocks]
+    wall = (max(t_all) - min(t_all)) if len(t_all) > 1 else float(args.seconds)
+    lat = _latencies(sent, received)
+    stats = hub.history
+    crc = sum(s.decoder.crc_errors for s in stats if s.decoder is not None)
+    lost = sum(s.decoder.lost for s in stats if s.decoder is not None)
+    nbytes = sum(s.bytes for s in stats)
+    p = percentiles(lat)
+    print(f"📊 {label}，{args.seconds:.0f} 秒 (送出 {total} 筆)")
+    print(f"   收到 {n_recv} / {n_sent} 筆 ACC，{n_recv / max(wall, 1e-9):9.0f} 筆/秒，"
+          f"{nbytes / max(wall, 1e-9) / 1e6:6.2f} MB/s，掉 {n_sent - n_recv}"
+          + (f"，CRC 錯 {crc}，seq 跳號 {lost}" if crc or lost else ""))
+    print(f"   延遲 {_fmt_ms(p)}")
+    print(f"   hub CPU {cpu / max(wall, 1e-9) * 100:5.1f}% (伺服器行程，不含模擬板子)")
+    return {"name": label, "rate": n_recv / max(wall, 1e-9), "drops": n_sent - n_recv,
+            "lat": p, "cpu": cpu / max(wall, 1e-9)}
+
+
+# ---------------------------------------------------
+# PTY：模擬 STM32 的 UART 輸出
+# ---------------------------------------------------
+
+def _image_messages(path):
+    """receive_image.py 的舊格式：'<size> <crc32 hex>\\n' + 檔案內容"""
+    names = sorted(f for f in os.listdir(path) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    if not names:
+        raise SystemExit(f"❌ {path} 沒有影像")
+    out = []
+    for name in names:
+        with open(os.path.join(path, name), "rb") as f:
+            data = f.read()
+        out.append(b"%d %08x\n" % (len(data), zlib.crc32(data) & 0xFFFFFFFF) + data)
+    return out
+
+
+def _prob_messages(args):
+    if args.probs:
+        with open(args.probs, "rb") as f:
+            return [line.rstrip(b"\r\n") + b"\r\n" for line in f if line.strip()]
+    _, probs = synthetic_probs(max(int(args.rate * 60), 100), rate=args.rate, seed=args.seed)
+    return format_probs(probs)
+
+
+class PtyConsumer(threading.Thread):
+    """--consume：在同一個行程讀 pty slave，量寫入到讀出的延遲 (第 k 則訊息對第 k 次寫入)"""
+
+    def __init__(self, fd):
+        super().__init__(daemon=True)
+        self.fd = fd
+        self.times = []           # (收到時間, 累計 bytes)
+        self.bytes = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError:
+                break
+            if not data:
+                break
+            self.bytes += len(data)
+            self.times.append((time.time(), self.bytes))
+
+
+def run_pty(args):
+    import fcntl
+    import termios
+    import tty
+
+    messages = _image_messages(args.images) if args.images else _prob_messages(args)
+    master, slave = os.openpty()
+    tty.setraw(slave)                    # 不要 echo、不要把 \n 換成 \r\n
+    path = os.ttyname(slave)
+    fcntl.fcntl(master, fcntl.F_SETFL, fcntl.fcntl(master, fcntl.F_GETFL) | os.O_NONBLOCK)
+    kind = "影像" if args.images else "機率行"
+    rate = "全速" if not args.rate else f"{args.rate:g} 則/秒"
+    print(f"🔌 pty: {path}  ({kind}，{rate}，{args.seconds:.0f} 秒)")
+    consumer = None
+    if args.consume:
+        consumer = PtyConsumer(slave)
+        consumer.start()
+    elif args.wait:
+        input("   接收端開好之後按 Enter 開始...")
+
+    sent, drops, backlog = [], 0, []
+    total = 0
+    t0 = time.time()
+    i = 0
+    next_poll = t0
+    while True:
+        now = time.time()
+        if now - t0 >= args.seconds:
+            break
+        due = int((now - t0) * args.rate) + 1 if args.rate else i + 1
+        while i < due:
+            msg = messages[i % len(messages)]
+            try:
+                # UART 沒有流量控制：接收端來不及讀、緩衝區滿時，整則訊息就丟了
+                k = os.write(master, msg)
+            except BlockingIOError:
+                k = 0
+            if k < len(msg):
+                if k:                          # 寫了一半：補完，避免後面的訊息錯位
+                    _write_all(master, msg[k:])
+                    k = len(msg)
+                else:
+                    drops += 1
+            if k:
+                total += k
+                sent.append((time.time(), total))
+            i += 1
+        if now >= next_poll:
+            # slave 端還沒被讀走的 bytes = 接收端落後多少
+            backlog.append(int.from_bytes(fcntl.ioctl(slave, termios.FIONREAD, b"\0\0\0\0"), "little"))
+            next_poll = now + 0.05
+        if args.rate:
+            time.sleep(min(0.002, 1.0 / args.rate))
+    wall = time.time() - t0
+    time.sleep(0.3)
+    avg = total / max(len(sent), 1)
+    ok = len(sent)
+    print(f"📊 pty {kind}：寫入 {ok} 則 ({ok / wall:.0f}/s，{total / wall / 1024:.1f} KiB/s)，"
+          f"緩衝區滿丟掉 {drops} 則")
+    result = {"name": f"pty {kind} " + rate, "rate": ok / wall, "drops": drops}
+    if backlog:
+        b = np.array(backlog)
+        rate_bps = total / wall
+        print(f"   接收端落後：平均 {b.mean() / avg:.1f} 則，最多 {b.max() / avg:.1f} 則"
+              f" (約 {b.max() / max(rate_bps, 1e-9) * 1e3:.1f} ms 的資料)")
+    if consumer is not None:
+        consumer.running = False
+        st = np.array(sent) if sent else np.zeros((0, 2))
+        rt = np.array(consumer.times) if consumer.times else np.zeros((0, 2))
+        # 每則訊息最後一個 byte 被讀到的時間 - 寫入時間
+        idx = np.searchsorted(rt[:, 1], st[:, 1], side="left")
+        good = idx < len(rt)
+        lat = rt[idx[good], 0] - st[good, 0]
+        p = percentiles(lat)
+        print(f"   延遲 {_fmt_ms(p)} (同行程讀取端)")
+        result["lat"] = p
+    os.close(master)
+    os.close(slave)
+    return result
+
+
+def _write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        try:
+            view = view[os.write(fd, view):]
+        except BlockingIOError:
+            time.sleep(0.001)
+
+
+# ---------------------------------------------------
+# BLE：假的 bleak 模組
+# ---------------------------------------------------
+
+ORI_UUIDS = ["00110000-0001-11e1-ac36-0002a5d5c51b", "00220000-0001-11e1-ac36-0002a5d5c51b",
+             "00330000-0001-11e1-ac36-0002a5d5c51b"]
+MV_UUIDS = ["aa110000-0001-11e1-ac36-0002a5d5c51b", "aa220000-0001-11e1-ac36-0002a5d5c51b",
+            "aa330000-0001-11e1-ac36-0002a5d5c51b"]
+
+
+class BleStats:
+    def __init__(self):
+        self.notifications = 0
+        self.lost = 0                # 故意丟掉的 (--loss)
+        self.handler = []            # 每次 callback 花的時間
+        self.lag = []                # 實際送出時間 - 預定時間 (收集端卡住 event loop 就會變大)
+
+
+def fake_bleak(devices=4, rate=100.0, fmt="batch", loss=0.0, name="BlueNRG", samples=None,
+               batch=2, seed=0):
+    """建立假的 bleak 模組 (BleakScanner.discover / BleakClient)，回傳 (module, BleStats)
+
+    每台裝置每秒 rate 組 XYZ：batch 格式一次 notify 帶 batch 組 (ble_batch.encode_batch)，
+    legacy 格式每軸一次 <u16 tick><i16 value>。samples 是 (n, 3) int16 樣本，None 用合成資料。
+    """
+    import random
+    import types
+
+    from ble_batch import TICK_MS, encode_batch
+
+    stats = BleStats()
+    rng = random.Random(seed)
+    if samples is None:
+        acc, _ = synthetic_samples()
+        samples = acc
+    samples = np.asarray(samples, dtype=np.int64)
+    addresses = [f"C0:FF:EE:00:00:{k:02X}" for k in range(devices)]
+
+    class Device:
+        def __init__(self, address):
+            self.name = name
+            self.address = address
+
+    class Characteristic:
+        def __init__(self, uuid):
+            self.uuid = uuid
+
+    class BleakScanner:
+        @staticmethod
+        async def discover(timeout=5.0, **kwargs):
+            await asyncio.sleep(min(timeout, 0.2))
+            return [Device(a) for a in addresses]
+
+        @staticmethod
+        async def find_device_by_address(address, timeout=10.0, **kwargs):
+            return Device(address) if address in addresses else None
+
+    class BleakClient:
+        def __init__(self, address, disconnected_callback=None, **kwargs):
+            self.address = getattr(address, "address", address)
+            self.callbacks = {}
+            self.is_connected = False
+            self._task = None
+
+        async def connect(self, **kwargs):
+            self.is_connected = True
+            self._task = asyncio.ensure_future(self._feed())
+            return True
+
+        async def disconnect(self):
+            if self._task is not None:
+                self._task.cancel()
+            self.is_connected = False
+            return True
+
+        async def __aenter__(self):
+            await self.connect()
+            return self
+
+        async def __aexit__(self, *exc):
+            await self.disconnect()
+
+        async def start_notify(self, uuid, callback, **kwargs):
+            self.callbacks[str(uuid).lower()] = (Characteristic(str(uuid).lower()), callback)
+
+        async def stop_notify(self, uuid):
+            self.callbacks.pop(str(uuid).lower(), None)
+
+        def _call(self, uuid, data):
+            entry = self.callbacks.get(uuid)
+            if entry is None:
+                return
+            if loss and rng.random() < loss:
+                stats.lost += 1
+                return
+            t = time.perf_counter()
+            entry[1](entry[0], data)
+            stats.handler.append(time.perf_counter() - t)
+            stats.notifications += 1
+
+        async def _feed(self):
+            step = batch if fmt == "batch" else 1
+            period = step / rate
+            t_next = time.perf_counter()
+            k = seq = 0
+            while True:
+                t_next += period
+                await asyncio.sleep(max(t_next - time.perf_counter(), 0))
+                stats.lag.append(time.perf_counter() - t_next)
+                tick = int(time.perf_counter() * 1000 / TICK_MS) & 0xFFFF
+                rows = [samples[(k + j) % len(samples)] for j in range(step)]
+                k += step
+                if fmt == "batch":
+                    data = encode_batch([(tick, *map(int, r)) for r in rows], seq)
+                    seq += 1
+                    for group in (ORI_UUIDS, MV_UUIDS):
+                        self._call(group[0], data)
+                else:
+                    for group in (ORI_UUIDS, MV_UUIDS):
+                        for axis, uuid in enumerate(group):
+                            self._call(uuid, int(tick).to_bytes(2, "little")
+                                       + int(rows[0][axis]).to_bytes(2, "little", signed=True))
+
+    module = types.ModuleType("bleak")
+    module.BleakScanner = BleakScanner
+    module.BleakClient = BleakClient
+    return module, stats
+
+
+def run_ble(args):
+    import runpy
+    import signal
+
+    samples = None
+    if args.recording:
+        _, samples, _ = recording_samples(args.recording, args.device)
+    module, stats = fake_bleak(args.devices, args.rate, args.ble_format, args.loss, samples=samples,
+                               seed=args.seed)
+    sys.modules["bleak"] = module
+    script = os.path.abspath(args.script)
+    sys.argv = [script] + [a for a in args.script_args if a != "--"]
+    sys.path.insert(0, os.path.dirname(script))
+    # 時間到送 SIGINT 給自己，收集程式會走它原本的 Ctrl+C 收尾流程
+    timer = threading.Timer(args.seconds, os.kill, (os.getpid(), signal.SIGINT))
+    timer.daemon = True
+    timer.start()
+    print(f"🧪 假 bleak：{args.devices} 台 x {args.rate:g} 組/秒 ({args.ble_format}，丟包 {args.loss:.0%})"
+          f" -> {os.path.basename(script)}，{args.seconds:.0f} 秒")
+    t0 = time.perf_counter()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    wall = time.perf_counter() - t0
+    timer.cancel()
+    p_handler = percentiles(stats.handler)
+    p_lag = percentiles(stats.lag)
+    print(f"📊 ble：送出 {stats.notifications} 則 notify ({stats.notifications / wall:.0f}/s)，"
+          f"故意丟掉 {stats.lost} 則")
+    print(f"   callback 耗時 {_fmt_ms(p_handler)}")
+    print(f"   排程延遲      {_fmt_ms(p_lag)} (event loop 被卡住的程度)")
+    return {"name": f"ble {args.ble_format} {args.devices} 台", "rate": stats.notifications / wall,
+            "drops": stats.lost, "lat": p_lag}
+
+
+# ---------------------------------------------------
+# suite：固定情境一次跑完
+# ---------------------------------------------------
+
+SUITE = [
+    ["tcp", "--format", "text", "--clients", "1", "--speed", "max"],
+    ["tcp", "--format", "binary", "--clients", "1", "--speed", "max"],
+    ["tcp", "--format", "text", "--clients", "16", "--speed", "max"],
+    ["tcp", "--format", "text", "--clients", "64", "--rate", "200"],
+    ["tcp", "--format", "binary", "--clients", "64", "--rate", "200"],
+    ["pty", "--rate", "1000", "--consume"],
+    ["pty", "--rate", "0", "--consume"],
+]
+
+
+def run_suite(args):
+    rows = []
+    for argv in SUITE:
+        sub = parser.parse_args(argv + ["--seconds", str(args.seconds)])
+        print()
+        rows.append(dispatch(sub))
+    print(f"\n{'情境':<34}{'筆/秒':>12}{'掉':>8}{'p50 ms':>9}{'p99 ms':>9}{'CPU':>8}")
+    for r in rows:
+        lat = r.get("lat", (float("nan"),) * 4)
+        cpu = f"{r['cpu'] * 100:6.1f}%" if "cpu" in r else ""
+        print(f"{r['name']:<34}{r['rate']:12.0f}{r.get('drops', 0):8d}"
+              f"{lat[0] * 1e3:9.2f}{lat[2] * 1e3:9.2f}{cpu:>8}")
+    # BLE 情境會執行收集程式本身 (全域狀態、自己的輸出)，放在子行程跑
+    print("\n--- ble: 8 台 x 100 組/秒 -> ble_multi_ingest.py ---", flush=True)
+    subprocess.run([sys.executable, os.path.abspath(__file__), "ble", "--devices", "8",
+                    "--seconds", str(args.seconds), ble.get_default("script"),
+                    "--interval", str(args.seconds / 2)])
+
+
+def dispatch(args):
+    if args.mode == "tcp":
+        return asyncio.run(run_tcp(args, build_payload(args)))
+    if args.mode == "pty":
+        return run_pty(args)
+    if args.mode == "ble":
+        return run_ble(args)
+    return run_suite(args)
+
+
+parser = argparse.ArgumentParser(description="重播錄製 / 合成資料，對 TCP 伺服器、UART 讀取端、BLE 收集端加壓")
+sub = parser.add_subparsers(dest="mode", required=True)
+
+tcp = sub.add_parser("tcp", help="LAB2 ACC/GYRO -> SensorHub (或 --connect 外部伺服器)")
+tcp.add_argument("--clients", type=int, default=8, help="同時連線的模擬板子數")
+tcp.add_argument("--rate", type=float, default=200.0, help="合成 / 擷取檔資料每塊板子每秒幾筆")
+tcp.add_argument("--speed", default="1", help="相對真實時間的倍數，max = 全速")
+tcp.add_argument("--seconds", type=float, default=10.0)
+tcp.add_argument("--format", choices=["text", "binary"], default="text")
+tcp.add_argument("--recording", metavar="DIR", help="recorder.Recording 資料夾 (依原本時間間隔重播)")
+tcp.add_argument("--device", help="--recording 裡的哪台裝置 (預設第一台)")
+tcp.add_argument("--capture", metavar="FILE", help="原始擷取檔，逐行重播")
+tcp.add_argument("--connect", metavar="HOST:PORT", help="送到外部伺服器 (例如 server.py)，不起內建 hub")
+tcp.add_argument("--record", metavar="DIR", help="內建 hub 同時用 recorder 錄製 (量錄製的負擔)")
+
+pty = sub.add_parser("pty", help="模擬 STM32 UART 輸出到 pty")
+pty.add_argument("--rate", type=float, default=10.0, help="每秒幾則 (0 = 全速)")
+pty.add_argument("--seconds", type=float, default=10.0)
+pty.add_argument("--probs", metavar="FILE", help="重播機率行檔案 (預設合成)")
+pty.add_argument("--images", metavar="DIR", help="改送影像 (receive_image.py 舊格式)")
+pty.add_argument("--consume", action="store_true", help="同一個行程讀 slave 端，量延遲 (測 pty 本身)")
+pty.add_argument("--wait", action="store_true", help="印出 pty 路徑後等 Enter 再開始")
+pty.add_argument("--seed", type=int, default=0)
+
+ble = sub.add_parser("ble", help="假的 bleak 模組，執行 BLE 收集程式")
+ble.add_argument("script", nargs="?",
+                 default=os.path.join(HERE, "..", "LAB7_HW", "HW7_1", "ble_multi_ingest.py"))
+ble.add_argument("script_args", nargs=argparse.REMAINDER, help="傳給收集程式的參數")
+ble.add_argument("--devices", type=int, default=4)
+ble.add_argument("--rate", type=float, default=100.0, help="每台每秒幾組 XYZ")
+ble.add_argument("--ble-format", choices=["batch", "legacy"], default="batch")
+ble.add_argument("--loss", type=float, default=0.0, help="notify 丟失機率")
+ble.add_argument("--seconds", type=float, default=10.0)
+ble.add_argument("--recording", metavar="DIR", help="用錄製的 ACC 當樣本")
+ble.add_argument("--device", help="--recording 裡的哪台裝置")
+ble.add_argument("--seed", type=int, default=0)
+
+suite = sub.add_parser("suite", help="跑一組固定情境並印出總表")
+suite.add_argument("--seconds", type=float, default=5.0, help="每個情境幾秒")
+
+
+if __name__ == "__main__":
+    dispatch(parser.parse_args())
@@ -0,0 +1,196 @@
+import asyncio
+import os
+import time
+
+import numpy as np
+
+# ===================================================
+# 預先配置的 NumPy 環形緩衝區 (每個 channel 一個，附到達時間)
+# ===================================================
+#
+# SampleRing   : 固定大小，寫滿後覆蓋最舊的資料；可選擇把資料依序寫到磁碟 (spill)
+# SampleCollector : 多個 channel，全部達到目標筆數時 set 一個 asyncio.Event，不用輪詢
+#
+# spill 檔是 RECORD_DTYPE 的原始陣列 (t float64, value int32)，用 load_spill() 讀回。
+
+RECORD_DTYPE = np.dtype([("t", "<f8"), ("value", "<i4")])
+
+
+class SampleRing:
+    def __init__(self, capacity, spill_path=None, spill_chunk=1024):
+        self.capacity = capacity
+        self.t = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.int32)
+        self.count = 0                      # 總共寫入的筆數 (不會因為覆蓋而減少)
+        self.spill_chunk = min(spill_chunk, capacity)
+        self.spilled = 0
+        self.lost = 0                       # spill 來不及寫就被覆蓋的筆數
+        self._spill = open(spill_path, "ab") if spill_path else None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, value, t):
+        i = self.count % self.capacity
+        self.values[i] = value
+        self.t[i] = t
+        self.count += 1
+        if self._spill and self.count - self.spilled >= self.spill_chunk:
+            self.flush()
+
+    def extend(self, values, t):
+        """values: 一串值，t: 到達時間 (同一個 notification 的多筆共用)"""
+        n = len(values)
+        if n > self.capacity:
+            values = values[-self.capacity:]
+            self.count += n - self.capacity
+            n = self.capacity
+        start = self.count % self.capacity
+        first = min(n, self.capacity - start)
+        self.values[start:start + first] = values[:first]
+        self.t[start:start + first] = t
+        if first < n:
+            self.values[:n - first] = values[first:]
+            self.t[:n - first] = t
+        self.count += n
+        if self._spill and self.count - self.spilled >= self.spill_chunk:
+            self.flush()
+
+    def latest(self, n=None):
+        """依時間順序回傳最後 n 筆 (預設全部保留的資料) 的 (t, values)；會複製"""
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % self.capacity
+        if n <= end:
+            return self.t[end - n:end].copy(), self.values[end - n:end].copy()
+        start = self.capacity - (n - end)
+        return (np.concatenate((self.t[start:], self.t[:end])),
+                np.concatenate((self.values[start:], self.values[:end])))
+
+    def flush(self):
+        """把還沒寫到磁碟的資料寫出去；超過 capacity 沒寫到的部分已被覆蓋，算進 lost"""
+        if not self._spill:
+            return
+        pending = self.count - self.spilled
+        if pending > self.capacity:
+            self.lost += pending - self.capacity
+            pending = self.capacity
+        rec = np.empty(pending, dtype=RECORD_DTYPE)
+        rec["t"], rec["value"] = self.latest(pending)
+        rec.tofile(self._spill)
+        self._spill.flush()
+        self.spilled = self.count
+
+    def close(self):
+        if self._spill:
+            self.flush()
+            self._spill.close()
+            self._spill = None
+
+
+def load_spill(path):
+    return np.fromfile(path, dtype=RECORD_DTYPE)
+
+
+class SampleCollector:
+    """target 模式：每個 channel 收滿 target 筆就不再收，全部收滿時 done 被 set
+    stream 模式 (target=None)：不停止，ring 只保留最近 capacity 筆，其餘寫到 spill_dir"""
+
+    def __init__(self, channels, target=None, capacity=None, spill_dir=None, clock=time.perf_counter):
+        if target is None and capacity is None:
+            raise ValueError("stream 模式需要指定 capacity")
+        self.target = target
+        self.clock = clock
+        capacity = capacity or target
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self.rings = {
+            ch: SampleRing(capacity, os.path.join(spill_dir, f"{ch}.bin") if spill_dir else None)
+            for ch in channels
+        }
+        self.spill_dir = spill_dir
+        self.done = asyncio.Event()
+        self._ready = 0
+
+    def add(self, channel, values, t=None):
+        ring = self.rings.get(channel)
+        if ring is None:
+            return
+        t = self.clock() if t is None else t
+        scalar = isinstance(values, (int, float, np.generic))
+        if self.target is not None:
+            room = self.target - ring.count
+            if room <= 0:
+                return
+            if not scalar:
+                values = values[:room]
+        if scalar:
+            ring.append(values, t)
+        else:
+            ring.extend(values, t)
+        if self.target is None:
+            return
+        # 只在 channel 剛好跨過 target 時計數一次，判斷是否全部完成是 O(1)
+        if ring.count >= self.target:
+            self._ready += 1
+            if self._ready == len(self.rings):
+                self.done.set()
+
+    def counts(self):
+        return {ch: ring.count for ch, ring in self.rings.items()}
+
+    def series(self, channel):
+        """(到達時間, 值)，依時間排序；target 模式就是前 target 筆"""
+        return self.rings[channel].latest()
+
+    def close(self):
+        for ring in self.rings.values():
+            ring.close()
+
+
+# ===================================================
+# 自我檢查 + 與 list.append / 輪詢寫法的比較
+# ===================================================
+
+if __name__ == "__main__":
+    import tempfile
+
+    ring = SampleRing(5)
+    for i in range(7):
+        ring.append(i, float(i))
+    assert ring.latest()[1].tolist() == [2, 3, 4, 5, 6]
+    ring.extend([7, 8, 9], 7.0)
+    assert ring.latest(4)[1].tolist() == [6, 7, 8, 9]
+
+    with tempfile.TemporaryDirectory() as d:
+        col = SampleCollector(["x", "y"], capacity=8, spill_dir=d)
+        for i in range(0, 100, 2):
+            col.add("x", [i, i + 1], t=float(i))
+        col.close()
+        assert load_spill(os.path.join(d, "x.bin"))["value"].tolist() == list(range(100))
+    print("✅ 自我檢查通過")
+
+    async def bench(channels=6, target=100_000, per_notify=1):
+        col = SampleCollector([str(c) for c in range(channels)], target=target)
+        values = np.arange(per_notify) if per_notify > 1 else 1
+        t0 = time.perf_counter()
+        i = 0
+        while not col.done.is_set():
+            col.add(str(i % channels), values, t=0.0)
+            i += 1
+        await col.done.wait()
+        return (time.perf_counter() - t0) / (target * channels) * 1e9
+
+    def bench_lists(channels=6, target=100_000):
+        data = {str(c): [] for c in range(channels)}
+        t0 = time.perf_counter()
+        i = 0
+        while not all(len(v) >= target for v in data.values()):
+            lst = data[str(i % channels)]
+            if len(lst) < target:
+                lst.append(i)
+            i += 1
+        return (time.perf_counter() - t0) / (target * channels) * 1e9
+
+    print(f"list + 每筆檢查 all(): {bench_lists():6.0f} ns/sample")
+    print(f"SampleCollector     : {asyncio.run(bench()):6.0f} ns/sample (每次 notify 1 筆)")
+    print(f"SampleCollector     : {asyncio.run(bench(per_notify=18)):6.0f} ns/sample (批次 18 筆)")
@@ -0,0 +1,312 @@
+import asyncio
+import time
+from collections import namedtuple
+
+from telemetry import (LineFramer, RecordDecoder, RECORD_MAGIC, SampleBlock, TextLine,
+                       iter_lines, parse_block, records_to_samples)
+
+# ===================================================
+# 多板子 TCP 感測資料伺服器 (asyncio) + pub/sub bus
+# ===================================================
+#
+# 每個 STM32 連線是一個 coroutine，不需要一個連線一個執行緒；
+# 每次 recv 的完整行整塊解析 (telemetry.parse_block) 後 publish 到 Bus，
+# 繪圖 / 紀錄 / 顯示各自 subscribe。
+#
+#   topic "line"   : TextLine(client, t, text)               每一行原文 (顯示用，有人訂閱才 decode)
+#   topic "acc"    : SampleBlock(client, t, "acc", xyz)      xyz 是 (n, 3) int64，同一次 recv 的樣本
+#   topic "gyro"   : SampleBlock(client, t, "gyro", xyz)     xyz 是 (n, 3) float64 (dps)
+#   topic "record" : RecordBlock(client, t, records)         只有二進位連線：RECORD_DTYPE 陣列 (含 seq、tick)
+#   topic "client" : ClientEvent(client, t, "connect" / "disconnect", stats)
+#
+# client 是 "ip:port" 字串，t 是 time.time()。
+# 每個連線看第一個 byte 決定格式：0xA5 是二進位紀錄 (telemetry.RECORD_DTYPE)，其他當文字行。
+
+ClientEvent = namedtuple("ClientEvent", "client t event stats")
+RecordBlock = namedtuple("RecordBlock", "client t records")
+
+
+class Subscription:
+    """asyncio 端的訂閱：有上限的佇列，滿了丟掉最舊的 (慢的訂閱者不會拖慢伺服器)"""
+
+    def __init__(self, topics, maxsize):
+        self.topics = topics
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def _put(self, item):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(item)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class Bus:
+    def __init__(self):
+        self._subs = {}          # topic -> [Subscription 或 callback]
+
+    def subscribe(self, topics, maxsize=10000):
+        """回傳 Subscription，在 event loop 裡用 async for 取資料"""
+        sub = Subscription(tuple(topics), maxsize)
+        for topic in sub.topics:
+            self._subs.setdefault(topic, []).append(sub)
+        return sub
+
+    def subscribe_callback(self, topics, fn):
+        """fn(topic, record) 在 event loop 執行緒直接呼叫；要快，適合 append 到 ring buffer"""
+        for topic in topics:
+            self._subs.setdefault(topic, []).append(fn)
+        return fn
+
+    def unsubscribe(self, sub):
+        for subs in self._subs.values():
+            if sub in subs:
+                subs.remove(sub)
+
+    def publish(self, topic, record):
+        for sub in self._subs.get(topic, ()):
+            if isinstance(sub, Subscription):
+                sub._put(record)
+            else:
+                sub(topic, record)
+
+    def has_subscribers(self, topic):
+        return bool(self._subs.get(topic))
+
+
+class ClientStats:
+    def __init__(self, client):
+        self.client = client
+        self.connected_at = time.time()
+        self.last_seen = self.connected_at
+        self.bytes = 0
+        self.lines = 0
+        self.samples = 0
+        self.other_lines = 0     # 不是 ACC/GYRO 的行
+        self.mode = "?"          # "text" / "binary"，收到第一個 byte 後決定
+        self.decoder = None      # 二進位連線的 RecordDecoder (CRC 錯誤、掉包數)
+
+    def __str__(self):
+        dt = max(self.last_seen - self.connected_at, 1.0)
+        if self.decoder is not None:
+            d = self.decoder
+            return (f"{self.client:<21} binary {d.records:8d} 筆 {d.records / dt:8.1f} 筆/秒 "
+                    f"掉 {d.lost}  CRC 錯 {d.crc_errors}  {self.bytes / 1024:8.1f} KiB")
+        return (f"{self.client:<21} text   {self.lines:8d} 行 {self.lines / dt:8.1f} 行/秒 "
+                f"{self.samples:8d} 筆樣本  其他 {self.other_lines}  {self.bytes / 1024:8.1f} KiB")
+
+
+class SensorHub:
+    """asyncio.start_server 的多連線伺服器，每個連線有自己的緩衝區與統計"""
+
+    def __init__(self, bus, host="0.0.0.0", port=8002, encoding="utf-8"):
+        self.bus = bus
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.clients = {}        # client -> ClientStats (目前連線中)
+        self.history = []        # 已斷線的 ClientStats
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self.server
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        client = f"{peer[0]}:{peer[1]}" if peer else "?"
+        stats = ClientStats(client)
+        self.clients[client] = stats
+        self.bus.publish("client", ClientEvent(client, stats.connected_at, "connect", stats))
+        framer = LineFramer()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                t = time.time()
+                if stats.mode == "?":
+                    stats.mode = "binary" if data[:1] == RECORD_MAGIC[:1] else "text"
+                    if stats.mode == "binary":
+                        stats.decoder = RecordDecoder()
+                stats.bytes += len(data)
+                stats.last_seen = t
+                if stats.decoder is not None:
+                    self._records(stats, t, stats.decoder.feed(data))
+                    continue
+                # 只處理到最後一個 \n；沒有換行的尾巴留在 framer 等下一次 recv
+                block = framer.feed(data)
+                if block is not None:
+                    self._block(stats, t, block)
+        except (ConnectionResetError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            tail = framer.flush()
+            if stats.decoder is None and tail.strip():
+                self._block(stats, time.time(), tail)
+            writer.close()
+            del self.clients[client]
+            self.history.append(stats)
+            self.bus.publish("client", ClientEvent(client, time.time(), "disconnect", stats))
+
+    def _block(self, stats, t, block):
+        client = stats.client
+        if self.bus.has_subscribers("line"):
+            for line in iter_lines(block, self.encoding):
+                self.bus.publish("line", TextLine(client, t, line))
+        acc, gyro, sample_lines = parse_block(block)
+        lines = block.count(b"\n") or 1
+        stats.lines += lines
+        stats.other_lines += max(lines - sample_lines, 0)
+        stats.samples += len(acc) + len(gyro)
+        if len(acc):
+            self.bus.publish("acc", SampleBlock(client, t, "acc", acc))
+        if len(gyro):
+            self.bus.publish("gyro", SampleBlock(client, t, "gyro", gyro))
+
+    def _records(self, stats, t, rec):
+        if not len(rec):
+            return
+        client = stats.client
+        acc, gyro = records_to_samples(rec)
+        stats.lines += len(rec)
+        stats.samples += len(acc) + len(gyro)
+        if self.bus.has_subscribers("record"):
+            self.bus.publish("record", RecordBlock(client, t, rec))
+        self.bus.publish("acc", SampleBlock(client, t, "acc", acc))
+        if len(gyro):
+            self.bus.publish("gyro", SampleBlock(client, t, "gyro", gyro))
+
+    def report(self):
+        lines = [f"📈 {len(self.clients)} 個連線"]
+        lines += [f"   {s}" for s in self.clients.values()]
+        return "\n".join(lines)
+
+
+def record_to(bus, recorder):
+    """把 acc / gyro 寫進 recorder.Recorder；裝置名稱用 IP (重連後 port 會變)"""
+    def on_samples(topic, block):
+        recorder.append(block.client.rsplit(":", 1)[0], block.kind, block.t, block.xyz)
+
+    def on_client(topic, ev):
+        if ev.event == "disconnect":
+            recorder.flush()      # 板子斷線後可能很久沒有新資料，先寫出去
+    bus.subscribe_callback(["acc", "gyro"], on_samples)
+    bus.subscribe_callback(["client"], on_client)
+    return on_samples
+
+
+async def report_loop(hub, interval=10.0):
+    while True:
+        await asyncio.sleep(interval)
+        if hub.clients:
+            print(hub.report())
+
+
+# ===================================================
+# Benchmark：N 個模擬板子同時連線，量測總吞吐量與 CPU
+# ===================================================
+#
+#   python sensor_hub.py [板子數=32] [每塊每秒樣本數=200] [秒數=5] [text|binary|both]
+#
+# 模擬板子送的是事先產生好的資料 (只做切片)，CPU 主要是 hub 自己的解析與轉發。
+
+def _payload(fmt, n=4096):
+    import numpy as np
+    from telemetry import encode_records
+    i = np.arange(n)
+    acc = np.stack([i % 1000, -(i % 300), np.full(n, 1000)], axis=1)
+    gyro = np.stack([(i % 100) / 100, np.full(n, -1.5), np.full(n, 2.25)], axis=1)
+    if fmt == "binary":
+        data = encode_records(i, i * 10, acc, gyro)
+        return data, [k * 24 for k in range(n + 1)]
+    lines = [(b"STM32 : Panda!" if k % 97 == 0 else b"")
+             + b"ACC XYZ = [%d, %d, %d]  GYRO dps = [%.2f, %.2f, %.2f]\n" % (*acc[k], *gyro[k])
+             for k in range(n)]
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return b"".join(lines), offsets
+
+
+async def _fake_board(port, rate, stop, payload):
+    data, offsets = payload
+    n = len(offsets) - 1
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    period = 1.0 / rate
+    t_next = time.perf_counter()
+    i = 0
+    while not stop.is_set():
+        now = time.perf_counter()
+        start = i
+        while t_next <= now:
+            i += 1
+            t_next += period
+        # 一次送出到目前為止該送的樣本 (資料循環使用)
+        while start < i:
+            a = start % n
+            b = min(a + (i - start), n)
+            writer.write(data[offsets[a]:offsets[b]])
+            start += b - a
+        await writer.drain()
+        await asyncio.sleep(0.005)
+    writer.close()
+    return i
+
+
+async def _bench(boards, rate, seconds, fmt):
+    bus = Bus()
+    hub = SensorHub(bus, "127.0.0.1", 0)
+    server = await hub.start()
+    port = server.sockets[0].getsockname()[1]
+    received = {"acc": 0}
+
+    def count(topic, block):
+        received["acc"] += len(block.xyz)
+    bus.subscribe_callback(["acc"], count)
+    slow = bus.subscribe(["gyro"], maxsize=10)       # 沒人讀的訂閱者：只會丟資料，不會卡住
+
+    payload = _payload(fmt)
+    stop = asyncio.Event()
+    tasks = [asyncio.ensure_future(_fake_board(port, rate, stop, payload)) for _ in range(boards)]
+    await asyncio.sleep(0.5)
+    c0, t0, n0 = time.process_time(), time.perf_counter(), received["acc"]
+    b0 = sum(c.bytes for c in hub.clients.values())
+    await asyncio.sleep(seconds)
+    wall, cpu, n = time.perf_counter() - t0, time.process_time() - c0, received["acc"] - n0
+    nbytes = sum(c.bytes for c in hub.clients.values()) - b0
+    stop.set()
+    await asyncio.gather(*tasks)
+    await asyncio.sleep(0.2)
+    server.close()
+    print(f"{fmt:>6}: {boards} 塊板子 x {rate:.0f} 筆/秒：收到 {n / wall:8.0f} 筆/秒 "
+          f"(目標 {boards * rate:.0f})，{nbytes / max(n, 1):5.1f} bytes/筆，"
+          f"CPU {cpu / wall * 100:5.1f}% (含模擬板子)，慢訂閱者丟掉 {slow.dropped} 批")
+    for stats in hub.history[:2]:
+        print(f"   {stats}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    boards = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 200.0
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+    fmt = sys.argv[4] if len(sys.argv) > 4 else "both"
+    for f in (("text", "binary") if fmt == "both" else (fmt,)):
+        asyncio.run(_bench(boards, rate, seconds, f))
@@ -0,0 +1,366 @@
+import re
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+# ===================================================
+# LAB2 感測資料解析：bytes 層級的逐行切割 + 整塊解析成 NumPy 陣列
+# ===================================================
+#
+# 板子每一行長這樣 (main.c)：
+#   ACC XYZ = [12, -34, 1000]  GYRO dps = [0.35, -1.40, 0.00]\n
+#   ACC XYZ = [12, -34, 1000]  GYRO dps = [NA, NA, NA]\n          (陀螺儀讀取失敗)
+# 按鈕的 "STM32 : Panda!" 沒有換行，會黏在下一行前面。
+#
+# LineFramer 把每次 recv 的資料接到 bytearray，只切出「到最後一個 \n 為止」的整塊；
+# parse_block 一次解析整塊，回傳 ACC / GYRO 的 (n, 3) 陣列，不會每筆樣本建一個 Python 物件：
+#   快速路徑：整塊都是板子固定格式的行 (GYRO 一律 %.2f 或 NA) -> 一次 translate 刪掉標籤與小數點，
+#             np.fromstring 一次讀成整數，GYRO 再除以 100
+#   一般路徑：有其他文字或格式不同 -> 兩個正則 findall，一樣整批轉成陣列
+
+SampleBlock = namedtuple("SampleBlock", "client t kind xyz")   # xyz: (n, 3) 陣列，同一次 recv 共用 t
+TextLine = namedtuple("TextLine", "client t text")
+
+ACC_RE  = re.compile(rb"ACC XYZ = \[(-?\d+),\s*(-?\d+),\s*(-?\d+)\]")
+GYRO_RE = re.compile(rb"GYRO dps = \[(-?\d+(?:\.\d+)?),\s*(-?\d+(?:\.\d+)?),\s*(-?\d+(?:\.\d+)?)\]")
+
+PANDA = b"STM32 : Panda!"
+_ACC_TAG = b"ACC XYZ = ["
+_GYRO_TAG = b"GYRO dps = ["
+_NA_GYRO = b"[NA, NA, NA]"
+_NA_RE = re.compile(re.escape(_NA_GYRO))
+_BAD_DOT_RE = re.compile(rb"\.(?![0-9][0-9][,\]])")      # 不是剛好兩位小數的 '.'
+# 快速路徑用：",[]" 變空白，標籤的字母、'=' 與小數點直接刪掉
+_TABLE = bytes.maketrans(b",[]", b"   ")
+_DELETE = b"ACXYZGROdps=."
+_EMPTY_ACC = np.zeros((0, 3), dtype=np.int64)
+_EMPTY_GYRO = np.zeros((0, 3), dtype=np.float64)
+
+
+class LineFramer:
+    """累積 recv 的 bytes，每次 feed 回傳完整行組成的一整塊 (含結尾 \\n)，沒有就回傳 None
+
+    max_line：一直沒有換行時 (垃圾資料) 最多累積幾個 byte，超過就整段當成一行送出。
+    """
+
+    def __init__(self, max_line=65536):
+        self.buf = bytearray()
+        self.max_line = max_line
+
+    def feed(self, data):
+        buf = self.buf
+        start = len(buf)
+        buf += data
+        end = buf.rfind(b"\n", start)      # 只掃新進來的部分
+        if end < 0:
+            if len(buf) <= self.max_line:
+                return None
+            end = len(buf) - 1
+        block = bytes(buf[:end + 1])
+        del buf[:end + 1]
+        return block
+
+    def flush(self):
+        """連線結束時取出沒有換行的最後一段"""
+        block = bytes(self.buf)
+        self.buf.clear()
+        return block
+
+
+def _parse_fast(block, lines):
+    """整塊都是固定格式時回傳 (acc, gyro)，否則回傳 None"""
+    if block.count(_ACC_TAG) != lines or block.count(_GYRO_TAG) != lines:
+        return None
+    na_rows = None
+    if b"NA" in block:
+        # 陀螺儀讀取失敗的行：先填 0 一起解析，最後從 gyro 拿掉 (與一般路徑結果相同)
+        na_rows = [block.count(b"\n", 0, m.start()) for m in _NA_RE.finditer(block)]
+        block = block.replace(_NA_GYRO, b"[0.00, 0.00, 0.00]")
+    # 每個 GYRO 值都要剛好兩位小數，刪掉小數點後才等於 值 x 100
+    if block.count(b".") != 3 * lines or _BAD_DOT_RE.search(block):
+        return None
+    try:
+        values = np.fromstring(block.translate(_TABLE, _DELETE), dtype=np.int64, sep=" ")
+    except ValueError:
+        return None
+    if values.size != 6 * lines:
+        return None
+    values = values.reshape(lines, 6)
+    gyro = values[:, 3:] / 100.0
+    if na_rows:
+        gyro = np.delete(gyro, na_rows, axis=0)
+    return values[:, :3], gyro
+
+
+def parse_block(block):
+    """整塊 bytes (一行或多行) -> (acc (n, 3) int64, gyro (m, 3) float64, 有樣本的行數)"""
+    if PANDA in block:
+        block = block.replace(PANDA, b"")
+    lines = block.count(b"\n")
+    if lines and block.endswith(b"\n"):
+        fast = _parse_fast(block, lines)
+        if fast is not None:
+            return fast[0], fast[1], lines
+    acc = ACC_RE.findall(block)
+    gyro = GYRO_RE.findall(block)
+    acc = np.array(acc).astype(np.int64) if acc else _EMPTY_ACC
+    gyro = np.array(gyro).astype(np.float64) if gyro else _EMPTY_GYRO
+    return acc, gyro, max(len(acc), len(gyro))
+
+
+def iter_lines(block, encoding="utf-8"):
+    """整塊 -> 逐行字串 (去掉 \\r 與空行)；只有需要顯示原文時才用"""
+    for raw in block.split(b"\n"):
+        if raw:
+            line = raw.decode(encoding, "replace").rstrip("\r")
+            if line:
+                yield line
+
+
+# ===================================================
+# 二進位格式 (可選)：每筆樣本固定 24 bytes，取代約 60 bytes 的文字行
+# ===================================================
+#
+#   offset  欄位     型別        說明
+#   0       magic    u8[2]       0xA5 0x5A (文字格式不會出現 0xA5，用來判斷連線是哪一種格式)
+#   2       seq      u16         每筆 +1，用來算掉了幾筆
+#   4       tick     u32         HAL_GetTick() (ms)
+#   8       acc      i16 x 3     BSP_ACCELERO_AccGetXYZ 原始值
+#   14      gyro     i16 x 3     0.01 dps (245 dps 量程放得下)；INT16_MIN = 讀取失敗 (NA)
+#   20      crc32    u32         前 20 bytes 的 CRC32 (IEEE，與 frame_codec / zlib.crc32 相同)
+#
+# 全部 little-endian。板子端見 main.c 的 TELEMETRY_BINARY。
+
+RECORD_MAGIC = b"\xA5\x5A"
+RECORD_DTYPE = np.dtype([("magic", "<u2"), ("seq", "<u2"), ("tick", "<u4"),
+                         ("acc", "<i2", (3,)), ("gyro", "<i2", (3,)), ("crc", "<u4")])
+RECORD_SIZE = RECORD_DTYPE.itemsize                 # 24
+GYRO_NA = -32768
+_EMPTY_RECORDS = np.zeros(0, dtype=RECORD_DTYPE)
+_MAGIC_U16 = int.from_bytes(RECORD_MAGIC, "little")
+
+_CRC_TABLE = np.zeros(256, dtype=np.uint32)
+for _i in range(256):
+    _c = _i
+    for _ in range(8):
+        _c = (_c >> 1) ^ (0xEDB88320 if _c & 1 else 0)
+    _CRC_TABLE[_i] = _c
+
+
+def records_crc(data, n):
+    """data: n 筆連續紀錄的 bytes -> 每筆前 20 bytes 的 CRC32 (uint32 陣列)
+
+    筆數少時逐筆呼叫 zlib.crc32 比較快；上千筆時改成整批查表 (每個 byte 位置一次，n 筆一起算)。
+    """
+    if n < 1024:
+        mv = memoryview(data)
+        size = RECORD_SIZE
+        return np.fromiter((zlib.crc32(mv[o:o + size - 4]) for o in range(0, n * size, size)),
+                           dtype=np.uint32, count=n)
+    raw = np.frombuffer(data, dtype=np.uint8, count=n * RECORD_SIZE).reshape(n, RECORD_SIZE)
+    crc = np.full(n, 0xFFFFFFFF, dtype=np.uint32)
+    for k in range(RECORD_SIZE - 4):
+        crc = _CRC_TABLE[(crc ^ raw[:, k]) & 0xFF] ^ (crc >> 8)
+    return crc ^ np.uint32(0xFFFFFFFF)
+
+
+def encode_records(seq, tick, acc, gyro_dps):
+    """產生二進位紀錄 (模擬板子 / 測試用)；gyro_dps 可含 NaN 表示 NA"""
+    acc = np.asarray(acc).reshape(-1, 3)
+    rec = np.zeros(len(acc), dtype=RECORD_DTYPE)
+    rec["magic"] = _MAGIC_U16
+    rec["seq"] = np.asarray(seq) & 0xFFFF
+    rec["tick"] = np.asarray(tick) & 0xFFFFFFFF
+    rec["acc"] = acc
+    g = np.asarray(gyro_dps, dtype=np.float64).reshape(-1, 3)
+    rec["gyro"] = np.where(np.isnan(g), GYRO_NA, np.round(np.nan_to_num(g) * 100)).astype(np.int16)
+    rec["crc"] = records_crc(rec.tobytes(), len(rec))
+    return rec.tobytes()
+
+
+class RecordDecoder:
+    """二進位紀錄的串流解碼：feed(bytes) -> 通過檢查的紀錄 (RECORD_DTYPE 陣列)
+
+    一般情況整段直接 np.frombuffer；magic 或 CRC 不對時丟掉已確認的部分，
+    從下一個 magic 重新對齊。lost 以 seq 的跳號計算 (u16 會繞回)。
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.records = 0
+        self.crc_errors = 0
+        self.resyncs = 0
+        self.lost = 0
+        self._next_seq = None
+
+    def feed(self, data):
+        self.buf += data
+        out = []
+        while len(self.buf) >= RECORD_SIZE:
+            if self.buf[:2] != RECORD_MAGIC:
+                self._resync(0)
+                continue
+            n = len(self.buf) // RECORD_SIZE
+            chunk = bytes(self.buf[:n * RECORD_SIZE])
+            rec = np.frombuffer(chunk, dtype=RECORD_DTYPE)
+            bad = (rec["magic"] != _MAGIC_U16) | (records_crc(chunk, n) != rec["crc"])
+            good = n if not bad.any() else int(np.argmax(bad))
+            if good:
+                out.append(rec[:good])
+                self._count(rec[:good])
+            if good == n:
+                del self.buf[:n * RECORD_SIZE]
+                break
+            # 第 good 筆壞了：跳過它的 magic，往後找下一個
+            if chunk[good * RECORD_SIZE:good * RECORD_SIZE + 2] == RECORD_MAGIC:
+                self.crc_errors += 1
+            self._resync(good * RECORD_SIZE)
+        if not out:
+            return _EMPTY_RECORDS
+        return out[0] if len(out) == 1 else np.concatenate(out)
+
+    def _resync(self, start):
+        nxt = self.buf.find(RECORD_MAGIC, start + 1)
+        self.resyncs += 1
+        if nxt < 0:
+            # 留下最後一個 byte，可能是下一個 magic 的開頭
+            del self.buf[:max(len(self.buf) - 1, start)]
+        else:
+            del self.buf[:nxt]
+
+    def _count(self, rec):
+        # TCP 不會亂序：一段連續通過檢查的紀錄只看頭尾的 seq 就知道中間掉了幾筆
+        first, last = int(rec["seq"][0]), int(rec["seq"][-1])
+        gap = 0 if self._next_seq is None else (first - self._next_seq) & 0xFFFF
+        inside = ((last - first) & 0xFFFF) - (len(rec) - 1)
+        if gap < 0x8000:                 # 很大的跳號視為板子重新開機，不算掉包
+            self.lost += gap
+        self.lost += max(inside, 0)
+        self._next_seq = (last + 1) & 0xFFFF
+        self.records += len(rec)
+
+
+def records_to_samples(rec):
+    """紀錄 -> (acc (n, 3) int64, gyro (m, 3) float64)；gyro 去掉 NA，與文字格式的 parse_block 相同"""
+    gyro = rec["gyro"]
+    if (gyro == GYRO_NA).any():
+        gyro = gyro[(gyro != GYRO_NA).all(axis=1)]
+    return rec["acc"].astype(np.int64), gyro / 100.0
+
+
+# ===================================================
+# Benchmark：原本 str 緩衝 + split + 兩個正則 vs LineFramer + parse_block
+# ===================================================
+#
+#   python telemetry.py                  # 用合成的資料 (與板子輸出格式相同)
+#   python telemetry.py capture.txt      # 用錄下來的原始資料 (例如 nc -l 8002 > capture.txt)
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    ACC_STR_RE = re.compile(ACC_RE.pattern.decode())
+    GYRO_STR_RE = re.compile(GYRO_RE.pattern.decode())
+
+    def legacy(chunks):
+        """原本 handle_client + parse_line 的做法 (str 緩衝、逐行 split、每行兩個正則)"""
+        acc, gyro = [], []
+        buf = ""
+        for data in chunks:
+            buf += data.decode("utf-8", "replace")
+            while "\n" in buf:
+                line, buf = buf.split("\n", 1)
+                line = line.rstrip("\r")
+                if not line:
+                    continue
+                m = ACC_STR_RE.search(line)
+                if m:
+                    acc.append(tuple(map(int, m.groups())))
+                g = GYRO_STR_RE.search(line)
+                if g:
+                    gyro.append(tuple(map(float, g.groups())))
+        return acc, gyro
+
+    def framed(chunks):
+        acc, gyro = [], []
+        framer = LineFramer()
+        for data in chunks:
+            block = framer.feed(data)
+            if block is not None:
+                a, g, _ = parse_block(block)
+                acc.append(a)
+                gyro.append(g)
+        return np.concatenate(acc or [_EMPTY_ACC]), np.concatenate(gyro or [_EMPTY_GYRO])
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "rb") as f:
+            capture = f.read()
+        variants = (("capture", capture),)
+    else:
+        def synth(n, na_every=0):
+            parts = []
+            for i in range(n):
+                if i % 50 == 0:
+                    parts.append(PANDA)
+                if na_every and i % na_every == 7:
+                    parts.append(b"ACC XYZ = [%d, %d, %d]  GYRO dps = [NA, NA, NA]\n" % (i % 997, -i % 311, 1000))
+                else:
+                    parts.append(b"ACC XYZ = [%d, %d, %d]  GYRO dps = [%.2f, %.2f, %.2f]\n"
+                                 % (i % 997, -i % 311, 1000, (i % 300) / 7, -(i % 200) / 3, 0.0))
+            return b"".join(parts)
+        variants = (("板子格式", synth(200000)),
+                    ("每 500 行一次 GYRO NA", synth(200000, na_every=500)))
+
+    for title, capture in variants:
+        n_lines = capture.count(b"\n")
+        print(f"--- {title}: {n_lines} 行，{len(capture) / 1e6:.1f} MB ---")
+        cases = [(1460, "每次 recv 1 個 TCP 封包"), (65536, "每次 recv 64 KiB")]
+        for size, label in cases:
+            chunks = [capture[i:i + size] for i in range(0, len(capture), size)]
+            rates = {}
+            for name, fn in (("legacy", legacy), ("framer", framed)):
+                t0 = time.perf_counter()
+                acc, gyro = fn(chunks)
+                dt = time.perf_counter() - t0
+                rates[name] = n_lines / dt
+                print(f"  {label:<20} {name:>6}: {n_lines / dt / 1e3:8.1f} k 行/秒  "
+                      f"(ACC {len(acc)}，GYRO {len(gyro)})")
+            print(f"  {'':<20} 加速 {rates['framer'] / rates['legacy']:.1f}x")
+
+        # 正確性：與原本的結果一致，逐 byte 餵也一樣
+        acc0, gyro0 = legacy([capture])
+        acc1, gyro1 = framed([capture])
+        assert np.array_equal(acc1, np.array(acc0)) and np.allclose(gyro1, np.array(gyro0))
+        head = capture[:20000]
+        acc2, gyro2 = framed([head[i:i + 1] for i in range(len(head))])
+        acc3, gyro3 = framed([head])
+        assert np.array_equal(acc2, acc3) and np.array_equal(gyro2, gyro3)
+        print("  ✅ 解析結果與原本相同")
+
+    # 連線卡住後一次讀到大量 backlog：原本的 split("\n", 1) 每行都複製剩下的整個緩衝區 (O(n²))
+    backlog = variants[0][1][:1 << 20]
+    n_lines = backlog.count(b"\n")
+    for name, fn in (("legacy", legacy), ("framer", framed)):
+        t0 = time.perf_counter()
+        fn([backlog])
+        dt = time.perf_counter() - t0
+        print(f"  一次讀到 1 MiB backlog {name:>6}: {n_lines / dt / 1e3:8.1f} k 行/秒")
+
+    # 二進位紀錄：同樣的樣本數，比較每筆大小與解碼速度 (含 CRC 檢查)
+    n = 200000
+    i = np.arange(n)
+    binary = encode_records(i, i * 8, np.stack([i % 997, -i % 311, np.full(n, 1000)], axis=1),
+                            np.stack([(i % 300) / 7, -(i % 200) / 3, np.zeros(n)], axis=1))
+    text_size = len(variants[0][1]) / variants[0][1].count(b"\n")
+    print(f"--- 二進位紀錄: {n} 筆，{len(binary) / 1e6:.1f} MB "
+          f"({RECORD_SIZE} bytes/筆，文字約 {text_size:.0f} bytes/筆) ---")
+    for size, label in ((1460, "每次 recv 1 個 TCP 封包"), (65536, "每次 recv 64 KiB")):
+        chunks = [binary[k:k + size] for k in range(0, len(binary), size)]
+        decoder = RecordDecoder()
+        t0 = time.perf_counter()
+        for data in chunks:
+            records_to_samples(decoder.feed(data))
+        dt = time.perf_counter() - t0
+        assert decoder.records == n and decoder.lost == 0 and decoder.crc_errors == 0
+        print(f"  {label:<20} binary: {n / dt / 1e3:8.1f} k 筆/秒")
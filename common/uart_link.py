@@ -0,0 +1,490 @@
+import os
+import random
+import select
+import struct
+import threading
+import time
+import zlib
+
+# ===================================================
+# UART 可靠傳輸層：分塊 + 序號 + CRC32 + 視窗式 ACK/NAK + 選擇性重傳
+# ===================================================
+#
+# 封包 (little-endian)：
+#   sync    : uint16  0xAA55
+#   type    : uint8   START / DATA / ACK / NAK
+#   xfer    : uint8   傳輸編號 (每個 blob 加 1，起始值隨機)，用來分辨重複的舊封包
+#   seq     : uint16  DATA 的區塊編號；START 與其 ACK 固定為 0xFFFF
+#   length  : uint16  payload 長度
+#   hcrc    : uint16  type..length 的 CRC32 低 16 位元 (先驗證 header，壞的 length 不會卡住解析)
+#   payload : length bytes
+#   crc32   : uint32  payload 的 CRC32
+#
+# 流程：START(total, chunk_size, blob_crc) -> ACK -> DATA x N (最多 window 個未確認)
+#      接收端每收到一塊就 ACK；發現序號跳號就 NAK 缺的那幾塊；
+#      傳送端收到 NAK 或逾時只重傳那一塊。
+#
+# 接收端用 (xfer, START payload) 分辨傳輸：傳送端重開時編號從隨機值開始，就算剛好撞到
+# 上一個完成的編號，START 的 (total, chunk_size, blob_crc) 不同也會當成新的傳輸。
+#
+# port 只要有 pyserial 風格的 write(data) / read(n)；read 會依 port 自己的 timeout 回傳，
+# 建議設成 0.01~0.05 秒 (例如 serial.Serial(..., timeout=0.02))，逾時重傳才準確。
+
+SYNC = 0xAA55
+HEADER_FMT = "<HBBHHH"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+TRAILER_SIZE = 4
+START_FMT = "<IHI"
+START_SEQ = 0xFFFF
+
+PKT_START = 1
+PKT_DATA = 2
+PKT_ACK = 3
+PKT_NAK = 4
+
+MAX_PAYLOAD = 1024
+
+
+class LinkError(IOError):
+    """重傳次數用完或對方沒有回應"""
+
+
+def read_available(port, n=4096):
+    """有資料就一次讀完，沒有就等 port 的 timeout 讀 1 byte"""
+    waiting = getattr(port, "in_waiting", 0)
+    return port.read(min(n, waiting) if waiting else 1)
+
+
+def build_packet(ptype, xfer, seq, payload=b""):
+    fields = struct.pack("<BBHH", ptype, xfer, seq, len(payload))
+    hcrc = zlib.crc32(fields) & 0xFFFF
+    return (struct.pack("<H", SYNC) + fields + struct.pack("<H", hcrc) + payload
+            + struct.pack("<I", zlib.crc32(payload) & 0xFFFFFFFF))
+
+
+class PacketParser:
+    """逐段餵入位元組，吐出 (type, xfer, seq, payload)；壞封包會重新找 sync"""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.crc_errors = 0
+
+    def feed(self, data):
+        self.buf += data
+        packets = []
+        buf = self.buf
+        while True:
+            start = buf.find(b"\x55\xAA")
+            if start < 0:
+                # 保留最後一個位元組，可能是被切開的 sync
+                del buf[:max(0, len(buf) - 1)]
+                break
+            if start:
+                del buf[:start]
+            if len(buf) < HEADER_SIZE:
+                break
+            _, ptype, xfer, seq, length, hcrc = struct.unpack_from(HEADER_FMT, buf)
+            if length > MAX_PAYLOAD or zlib.crc32(buf[2:8]) & 0xFFFF != hcrc:
+                self.crc_errors += 1
+                del buf[:2]
+                continue
+            end = HEADER_SIZE + length
+            if len(buf) < end + TRAILER_SIZE:
+                break
+            payload = bytes(buf[HEADER_SIZE:end])
+            if zlib.crc32(payload) & 0xFFFFFFFF != struct.unpack_from("<I", buf, end)[0]:
+                self.crc_errors += 1
+                del buf[:2]
+                continue
+            packets.append((ptype, xfer, seq, payload))
+            del buf[:end + TRAILER_SIZE]
+        return packets
+
+
+class LinkStats:
+    def __init__(self):
+        self.payload_bytes = 0
+        self.wire_bytes = 0
+        self.chunks = 0
+        self.retransmits = 0
+        self.naks = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        rate = self.payload_bytes / self.elapsed if self.elapsed else 0.0
+        eff = self.payload_bytes / self.wire_bytes if self.wire_bytes else 0.0
+        return (f"{self.payload_bytes} bytes / {self.elapsed:.2f}s = {rate / 1024:.1f} KiB/s goodput, "
+                f"{self.chunks} chunks, {self.retransmits} 重傳, {self.naks} NAK, 效率 {eff * 100:.0f}%")
+
+
+# ---------------------------------------------------
+# 傳送端
+# ---------------------------------------------------
+
+class LinkSender:
+    def __init__(self, port, chunk_size=256, window=8, timeout=0.5, max_retries=20):
+        if not 0 < chunk_size <= MAX_PAYLOAD:
+            raise ValueError(f"chunk_size 必須在 1..{MAX_PAYLOAD}")
+        self.port = port
+        self.chunk_size = chunk_size
+        self.window = window
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.parser = PacketParser()
+        # 每個 sender 從隨機編號開始：程式重開時不會跟接收端上一個完成的傳輸同號
+        self.xfer = random.randrange(256)
+
+    def _write(self, pkt, stats):
+        self.port.write(pkt)
+        stats.wire_bytes += len(pkt)
+
+    def _poll(self):
+        data = read_available(self.port)
+        return self.parser.feed(data) if data else []
+
+    def send(self, blob):
+        """傳一個 blob，全部區塊都被確認後回傳 LinkStats；失敗丟出 LinkError"""
+        stats = LinkStats()
+        t0 = time.perf_counter()
+        self.xfer = (self.xfer + 1) & 0xFF
+        xfer = self.xfer
+        n = (len(blob) + self.chunk_size - 1) // self.chunk_size
+        if n >= START_SEQ:
+            raise ValueError("blob 太大，請加大 chunk_size")
+
+        # 1) START，直到收到 ACK
+        start = build_packet(PKT_START, xfer, START_SEQ,
+                             struct.pack(START_FMT, len(blob), self.chunk_size,
+                                         zlib.crc32(blob) & 0xFFFFFFFF))
+        for _ in range(self.max_retries):
+            self._write(start, stats)
+            deadline = time.perf_counter() + self.timeout
+            acked = False
+            while not acked and time.perf_counter() < deadline:
+                acked = any(p[0] == PKT_ACK and p[1] == xfer and p[2] == START_SEQ for p in self._poll())
+            if acked:
+                break
+        else:
+            raise LinkError("START 沒有收到 ACK")
+
+        # 2) DATA：滑動視窗 + 選擇性重傳
+        view = memoryview(blob)
+        pending = {}          # seq -> (上次送出時間, 已重傳次數)
+        acked = set()
+        next_seq = 0
+
+        def send_chunk(seq):
+            chunk = view[seq * self.chunk_size:(seq + 1) * self.chunk_size]
+            self._write(build_packet(PKT_DATA, xfer, seq, bytes(chunk)), stats)
+
+        while len(acked) < n:
+            while len(pending) < self.window and next_seq < n:
+                send_chunk(next_seq)
+                pending[next_seq] = (time.perf_counter(), 0)
+                next_seq += 1
+
+            for ptype, pxfer, seq, _ in self._poll():
+                if pxfer != xfer or seq not in pending:
+                    continue
+                if ptype == PKT_ACK:
+                    del pending[seq]
+                    acked.add(seq)
+                elif ptype == PKT_NAK:
+                    stats.naks += 1
+                    sent_at, retries = pending[seq]
+                    send_chunk(seq)
+                    stats.retransmits += 1
+                    pending[seq] = (time.perf_counter(), retries + 1)
+
+            now = time.perf_counter()
+            for seq, (sent_at, retries) in list(pending.items()):
+                if now - sent_at < self.timeout:
+                    continue
+                if retries >= self.max_retries:
+                    raise LinkError(f"區塊 {seq} 重傳 {retries} 次仍失敗")
+                send_chunk(seq)
+                stats.retransmits += 1
+                pending[seq] = (now, retries + 1)
+
+        stats.payload_bytes = len(blob)
+        stats.chunks = n
+        stats.elapsed = time.perf_counter() - t0
+        return stats
+
+
+# ---------------------------------------------------
+# 接收端
+# ---------------------------------------------------
+
+class LinkReceiver:
+    """on_start(total) / on_chunk(offset, data) 可用來邊收邊寫檔；沒給就在記憶體中組回 blob
+
+    邊收邊寫時區塊可能不照順序到，CRC 依序累計 (先到的後面區塊暫存到前面補齊)，
+    整體 CRC 不符一樣丟出 LinkError。
+    """
+
+    def __init__(self, port, nak_interval=0.2):
+        self.port = port
+        self.nak_interval = nak_interval
+        self.parser = PacketParser()
+        self.done_xfer = None      # 上一個完成的傳輸編號 (重複封包只回 ACK)
+        self.done_start = None     # 上一個完成傳輸的 START payload
+        self.last_stats = None
+
+    def _send(self, ptype, xfer, seq, stats):
+        pkt = build_packet(ptype, xfer, seq)
+        self.port.write(pkt)
+        stats.wire_bytes += len(pkt)
+
+    def receive(self, timeout=None, on_start=None, on_chunk=None, idle_timeout=None):
+        """收一個完整 blob；timeout 秒內沒有開始新的傳輸就回傳 None，
+        傳到一半超過 idle_timeout 秒完全沒有資料則丟出 LinkError"""
+        stats = LinkStats()
+        deadline = time.perf_counter() + timeout if timeout else None
+        xfer = None
+        start = None               # 目前傳輸的 START payload
+        total = chunk_size = blob_crc = n = 0
+        crc = crc_seq = 0          # 邊收邊寫：依序累計的 CRC 與下一個要算的區塊
+        early = {}                 # 邊收邊寫：比 crc_seq 先到的區塊
+        buf = None
+        got = None
+        highest = -1
+        nak_sent = {}
+        last_rx = time.perf_counter()
+        last_data = last_rx
+        t0 = None
+
+        while True:
+            data = read_available(self.port)
+            now = time.perf_counter()
+            if data:
+                last_rx = last_data = now
+                stats.wire_bytes += len(data)
+            elif xfer is None and deadline and now > deadline:
+                return None
+            elif xfer is not None and idle_timeout and now - last_data > idle_timeout:
+                raise LinkError(f"傳輸中斷：{idle_timeout:.0f} 秒沒有資料 ({stats.chunks}/{n} 塊)")
+
+            for ptype, pxfer, seq, payload in (self.parser.feed(data) if data else []):
+                if ptype == PKT_START:
+                    key = (pxfer, payload)
+                    if key != (xfer, start) and key != (self.done_xfer, self.done_start):
+                        xfer, start = key
+                        if xfer == self.done_xfer:
+                            self.done_xfer = self.done_start = None   # 同號但不同的傳輸
+                        total, chunk_size, blob_crc = struct.unpack(START_FMT, payload)
+                        n = (total + chunk_size - 1) // chunk_size
+                        got = bytearray(n)
+                        buf = None if on_chunk else bytearray(total)
+                        crc = crc_seq = 0
+                        early.clear()
+                        highest = -1
+                        nak_sent.clear()
+                        t0 = now
+                        if on_start:
+                            on_start(total)
+                    self._send(PKT_ACK, pxfer, START_SEQ, stats)
+                elif ptype == PKT_DATA:
+                    if pxfer != xfer and pxfer == self.done_xfer:
+                        self._send(PKT_ACK, pxfer, seq, stats)
+                        continue
+                    if pxfer != xfer or seq >= n:
+                        continue
+                    self._send(PKT_ACK, pxfer, seq, stats)
+                    if got[seq]:
+                        continue
+                    got[seq] = 1
+                    stats.chunks += 1
+                    offset = seq * chunk_size
+                    if on_chunk:
+                        on_chunk(offset, payload)
+                        early[seq] = payload
+                        while crc_seq in early:
+                            crc = zlib.crc32(early.pop(crc_seq), crc)
+                            crc_seq += 1
+                    else:
+                        buf[offset:offset + len(payload)] = payload
+                    stats.payload_bytes += len(payload)
+                    # 跳號：缺的那幾塊立刻 NAK
+                    for missing in range(highest + 1, seq):
+                        if not got[missing] and now - nak_sent.get(missing, 0) > self.nak_interval:
+                            self._send(PKT_NAK, xfer, missing, stats)
+                            nak_sent[missing] = now
+                            stats.naks += 1
+                    highest = max(highest, seq)
+
+            if xfer is not None and stats.chunks == n:
+                self.done_xfer, self.done_start = xfer, start
+                stats.elapsed = time.perf_counter() - t0
+                self.last_stats = stats
+                if buf is not None:
+                    crc = zlib.crc32(buf)
+                if crc & 0xFFFFFFFF != blob_crc:
+                    raise LinkError(f"整體 CRC 錯誤: 收到 {crc & 0xFFFFFFFF:08x}，應為 {blob_crc:08x}")
+                return bytes(buf) if buf is not None else blob_crc
+
+            # 一段時間沒收到東西：把還缺的區塊 NAK 一次
+            if xfer is not None and now - last_rx > self.nak_interval:
+                for missing in range(n):
+                    if not got[missing] and now - nak_sent.get(missing, 0) > self.nak_interval:
+                        self._send(PKT_NAK, xfer, missing, stats)
+                        nak_sent[missing] = now
+                        stats.naks += 1
+                last_rx = now
+
+
+# ===================================================
+# 模擬的有損 pty 鏈路 + throughput / goodput benchmark
+# ===================================================
+
+class LossyPtyBridge:
+    """兩個 pty 中間夾一個轉送執行緒，依機率丟掉或翻轉位元組，並依 baud 限速
+
+    a_name / b_name 可以直接給 serial.Serial() 開啟。
+    """
+
+    def __init__(self, loss=0.0, corrupt=0.0, baud=None, seed=0):
+        import pty
+        import tty
+        self.loss = loss
+        self.corrupt = corrupt
+        self.baud = baud
+        self.rng = random.Random(seed)
+        self.fds = []
+        names = []
+        for _ in range(2):
+            master, slave = pty.openpty()
+            tty.setraw(master)
+            tty.setraw(slave)
+            self.fds.append((master, slave))
+            names.append(os.ttyname(slave))
+        self.a_name, self.b_name = names
+        self._stop = False
+        for src, dst in ((0, 1), (1, 0)):
+            threading.Thread(target=self._relay, args=(self.fds[src][0], self.fds[dst][0]),
+                             daemon=True).start()
+
+    def _relay(self, src, dst):
+        while not self._stop:
+            r, _, _ = select.select([src], [], [], 0.1)
+            if not r:
+                continue
+            try:
+                data = bytearray(os.read(src, 4096))
+            except OSError:
+                return
+            if self.loss or self.corrupt:
+                out = bytearray()
+                for b in data:
+                    x = self.rng.random()
+                    if x < self.loss:
+                        continue
+                    if x < self.loss + self.corrupt:
+                        b ^= 1 << self.rng.randrange(8)
+                    out.append(b)
+                data = out
+            if self.baud:
+                time.sleep(len(data) * 10 / self.baud)
+            try:
+                os.write(dst, data)
+            except OSError:
+                return
+
+    def close(self):
+        self._stop = True
+        time.sleep(0.15)
+        for master, slave in self.fds:
+            os.close(master)
+            os.close(slave)
+
+
+if __name__ == "__main__":
+    import serial
+
+    blob = os.urandom(4110)    # 一張 64x64 u8 影像 + frame_codec header
+    baud = 115200
+    print(f"blob {len(blob)} bytes @ {baud} bps (8N1 理論上限 {baud / 10 / 1024:.1f} KiB/s)")
+    # 丟失 / 翻轉機率是「每個位元組」的；256 bytes 的區塊在 1e-3 時約有 1/3 會壞掉
+    for loss in (0.0, 1e-4, 1e-3):
+        bridge = LossyPtyBridge(loss=loss, corrupt=loss / 2, baud=baud, seed=1)
+        a = serial.Serial(bridge.a_name, timeout=0.01)
+        b = serial.Serial(bridge.b_name, timeout=0.01)
+        received = []
+        done = threading.Event()
+
+        def rx():
+            # 收完之後繼續跑，讓最後幾個遺失的 ACK 能被重送的 DATA 補回來
+            r = LinkReceiver(b)
+            while not done.is_set():
+                data = r.receive(timeout=0.2)
+                if data is not None:
+                    received.append(data)
+
+        t = threading.Thread(target=rx)
+        t.start()
+        sender = LinkSender(a, chunk_size=256, window=8)
+        total = LinkStats()
+        for _ in range(3):
+            s = sender.send(blob)
+            for k in ("payload_bytes", "wire_bytes", "chunks", "retransmits", "naks", "elapsed"):
+                setattr(total, k, getattr(total, k) + getattr(s, k))
+        done.set()
+        t.join()
+        assert received == [blob] * 3
+        print(f"丟失 {loss:.0e} + 翻轉 {loss / 2:.0e}: {total}")
+        a.close()
+        b.close()
+        bridge.close()
+
+    # 傳送端重開 (新的 LinkSender) 而接收端一直開著，邊收邊寫 (有遺失 -> 區塊不照順序到)：
+    # 第二個 sender 的編號故意撞上一個完成的傳輸，仍然要收到新的 blob
+    bridge = LossyPtyBridge(loss=1e-3, corrupt=5e-4, baud=baud, seed=2)
+    a = serial.Serial(bridge.a_name, timeout=0.01)
+    b = serial.Serial(bridge.b_name, timeout=0.01)
+    receiver = LinkReceiver(b)
+    received = []
+    done = threading.Event()
+
+    def rx_stream():
+        while not done.is_set():
+            out = bytearray()
+            crc = receiver.receive(timeout=0.2, on_start=lambda total: out.extend(bytes(total)),
+                                   on_chunk=lambda off, data: out.__setitem__(slice(off, off + len(data)), data))
+            if crc is not None:
+                received.append((bytes(out), crc))
+
+    t = threading.Thread(target=rx_stream)
+    t.start()
+    blobs = [os.urandom(4110), os.urandom(4110)]
+    LinkSender(a).send(blobs[0])
+    while receiver.done_xfer is None:
+        time.sleep(0.01)
+    restarted = LinkSender(a)
+    restarted.xfer = (receiver.done_xfer - 1) & 0xFF      # 下一個編號 = 上一個完成的編號
+    restarted.send(blobs[1])
+    time.sleep(0.5)
+    done.set()
+    t.join()
+    assert [r for r, _ in received] == blobs, "傳送端重開後同號的新傳輸沒有收到"
+    assert [c for _, c in received] == [zlib.crc32(x) for x in blobs]
+    print("✅ 傳送端重開、傳輸編號相同：新的 blob 照樣收到 (邊收邊寫，CRC 依序累計)")
+    a.close()
+    b.close()
+    bridge.close()
+
+    # 邊收邊寫時 START 的 blob_crc 跟資料不符 -> LinkError (跟整塊收的行為一樣)
+    bridge = LossyPtyBridge()
+    a = serial.Serial(bridge.a_name, timeout=0.01)
+    b = serial.Serial(bridge.b_name, timeout=0.01)
+    blob = os.urandom(1000)
+    a.write(build_packet(PKT_START, 7, START_SEQ, struct.pack(START_FMT, len(blob), 256, zlib.crc32(blob) ^ 1)))
+    for seq in range(4):
+        a.write(build_packet(PKT_DATA, 7, seq, blob[seq * 256:(seq + 1) * 256]))
+    try:
+        LinkReceiver(b).receive(timeout=2, on_chunk=lambda off, data: None)
+        raise AssertionError("邊收邊寫沒有檢查整體 CRC")
+    except LinkError as e:
+        print(f"✅ 邊收邊寫也檢查整體 CRC ({e})")
+    a.close()
+    b.close()
+    bridge.close()